@@ -0,0 +1,42 @@
+"""Scaling benchmark of the preprocessing pipelines over worker processes.
+
+Run from the root of the repository with:
+
+    python -m benchmarks.parallel [number of tweets]
+"""
+import sys
+from time import perf_counter
+
+import pandas as pd
+
+from src.text.pipelines import get_pipeline
+from tests.domain_objects_for_testing import create_dataframe_of_labeled_tweets
+
+WORKERS = [1, 2, 4, 8]
+
+
+def main():
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    tweets = create_dataframe_of_labeled_tweets()["text"]
+    batch = pd.Series(list(tweets) * (size // len(tweets)))
+    print(f"{len(batch)} tweets")
+    print(f"{'pipeline':<12}{'workers':>8}{'time (s)':>10}{'speed-up':>10}")
+    for name in ["clean", "tokenize"]:
+        pipeline = get_pipeline(name)
+        serial = None
+        for n_jobs in WORKERS:
+            start = perf_counter()
+            processed = pipeline.process_batch(batch, n_jobs=n_jobs)
+            duration = perf_counter() - start
+            if serial is None:
+                serial, serial_duration = processed, duration
+            elif not processed.equals(serial):
+                raise AssertionError(f"{n_jobs} workers changed the output.")
+            print(
+                f"{name:<12}{n_jobs:>8}{duration:>10.2f}"
+                f"{serial_duration / duration:>9.1f}x"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""Benchmark of the constant per-tweet cost saved by sharing the tokenizer,
+normalizer and pipelines across calls, and of processing tweets in batches
+rather than row by row. Ends with the time spent in each processor.
+
+Run from the root of the repository with:
+
+    python -m benchmarks.pipelines [clean] [normalize] [tokenize]
+
+The normalize pipeline needs the ekphrasis word statistics on disk.
+"""
+import sys
+import timeit
+from typing import Callable, Dict, List
+
+import pandas as pd
+
+from ekphrasis.classes.preprocessor import TextPreProcessor
+from ekphrasis.classes.tokenizer import SocialTokenizer
+
+from src.text.pipelines import (
+    FUSED_PROCESSORS,
+    PIPELINE_PROCESSORS,
+    TextPreProcessingPipeline,
+    build_pipelines,
+    get_pipeline,
+)
+from src.text.profiling import ProfileReport
+from src.text.utils import normalize_tweet, tokenizer
+from tests.domain_objects_for_testing import create_dataframe_of_labeled_tweets
+
+
+def legacy_tokenizer(tweet: str) -> str:
+    """The tokenizer as it was before the social tokenizer was shared."""
+    social_tokenizer = SocialTokenizer(lowercase=False).tokenize
+    return " ".join(s for s in social_tokenizer(tweet))
+
+
+def legacy_normalize_tweet(tweet: str) -> str:
+    """The normalizer as it was before the ekphrasis preprocessor was shared."""
+    preprocesser = TextPreProcessor(
+        normalize=[
+            "url",
+            "email",
+            "percent",
+            "money",
+            "phone",
+            "user",
+            "time",
+            "date",
+            "hashtag",
+        ]
+    )
+    return preprocesser.pre_process_doc(tweet)
+
+
+LEGACY_PROCESSORS: Dict[Callable[[str], str], Callable[[str], str]] = {
+    tokenizer: legacy_tokenizer,
+    normalize_tweet: legacy_normalize_tweet,
+}
+
+
+def legacy_process(name: str, tweets: List[str]) -> List[str]:
+    """Processes the tweets the way the pipeline functions used to: a new
+    pipeline per call, unfused processors, and a new tokenizer and normalizer
+    per tweet."""
+    pipeline = TextPreProcessingPipeline()
+    for fused in PIPELINE_PROCESSORS[name]:
+        for processor in FUSED_PROCESSORS.get(fused, [fused]):
+            pipeline.register_processor(LEGACY_PROCESSORS.get(processor, processor))
+    return [pipeline.process_text(tweet) for tweet in tweets]
+
+
+def shared_process(name: str, tweets: List[str]) -> List[str]:
+    pipeline = get_pipeline(name)
+    return [pipeline.process_text(tweet) for tweet in tweets]
+
+
+def time_per_tweet(
+    process: Callable[[str, List[str]], List[str]], name: str, number: int = 20
+) -> float:
+    """Returns the best per-tweet time in microseconds over the sample tweets."""
+    tweets = list(create_dataframe_of_labeled_tweets()["text"])
+    best = min(timeit.repeat(lambda: process(name, tweets), number=number, repeat=3))
+    return best / (number * len(tweets)) * 1e6
+
+
+def time_batch_per_tweet(name: str, size: int = 10000) -> Dict[str, float]:
+    """Returns the per-tweet time in microseconds of processing a batch of
+    tweets row by row and with process_batch."""
+    tweets = create_dataframe_of_labeled_tweets()["text"]
+    batch = pd.Series(list(tweets) * (size // len(tweets)))
+    pipeline = get_pipeline(name)
+    timings = {
+        "row by row": min(
+            timeit.repeat(lambda: batch.apply(pipeline.process_text), number=1)
+        ),
+        "batch": min(timeit.repeat(lambda: pipeline.process_batch(batch), number=1)),
+    }
+    return {key: value / len(batch) * 1e6 for key, value in timings.items()}
+
+
+def main():
+    names = sys.argv[1:] or list(PIPELINE_PROCESSORS)
+    build_pipelines(normalizer="normalize" in names)
+    print(f"{'pipeline':<12}{'before (us)':>14}{'after (us)':>14}{'saved (us)':>14}")
+    for name in names:
+        before = time_per_tweet(legacy_process, name)
+        after = time_per_tweet(shared_process, name)
+        print(f"{name:<12}{before:>14.1f}{after:>14.1f}{before - after:>14.1f}")
+    print()
+    print(f"{'pipeline':<12}{'row by row (us)':>18}{'batch (us)':>14}")
+    for name in names:
+        timings = time_batch_per_tweet(name)
+        print(f"{name:<12}{timings['row by row']:>18.1f}{timings['batch']:>14.1f}")
+    tweets = create_dataframe_of_labeled_tweets()["text"]
+    batch = pd.Series(list(tweets) * (10000 // len(tweets)))
+    for name in names:
+        report = ProfileReport()
+        get_pipeline(name).process_batch(batch, report=report)
+        print()
+        print(f"{name} pipeline, {len(batch)} tweets")
+        print(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""Load test of the inference server.
+
+Start the server, then run from the root of the repository:
+
+    python -m src.serve models/misog-model.pkl --port 8000
+    python -m benchmarks.serving --port 8000 --concurrency 32 --requests 2000
+
+Each client sends single-tweet requests one after the other over a
+keep-alive connection. The client-side latency percentiles and throughput
+are printed, along with the metrics reported by the server.
+"""
+import argparse
+import asyncio
+import json
+from itertools import cycle
+from time import perf_counter
+
+import numpy as np
+
+from tests.domain_objects_for_testing import create_dataframe_of_labeled_tweets
+
+
+async def request(reader, writer, method, path, payload=None):
+    body = json.dumps(payload).encode("utf-8") if payload is not None else b""
+    writer.write(
+        f"{method} {path} HTTP/1.1\r\nHost: localhost\r\n"
+        f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n"
+        .encode("latin-1")
+        + body
+    )
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        if name.lower() == "content-length":
+            length = int(value)
+    response = json.loads(await reader.readexactly(length))
+    if status != 200:
+        raise RuntimeError(f"{method} {path} answered {status}: {response}")
+    return response
+
+
+async def client(host, port, tweets, count, latencies):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        for _ in range(count):
+            start = perf_counter()
+            await request(reader, writer, "POST", "/predict", dict(text=next(tweets)))
+            latencies.append(perf_counter() - start)
+    finally:
+        writer.close()
+
+
+async def load_test(host, port, concurrency, requests):
+    tweets = cycle(create_dataframe_of_labeled_tweets()["text"].tolist())
+    latencies = []
+    per_client = max(requests // concurrency, 1)
+    start = perf_counter()
+    await asyncio.gather(
+        *(client(host, port, tweets, per_client, latencies) for _ in range(concurrency))
+    )
+    duration = perf_counter() - start
+    p50, p95, p99 = np.percentile(np.array(latencies) * 1000, [50, 95, 99])
+    print(f"{len(latencies)} requests from {concurrency} clients in {duration:.2f} s")
+    print(f"throughput: {len(latencies) / duration:.1f} requests/s")
+    print(f"latency (ms): p50 {p50:.2f}, p95 {p95:.2f}, p99 {p99:.2f}")
+
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        metrics = await request(reader, writer, "GET", "/metrics")
+    finally:
+        writer.close()
+    print("server metrics:", json.dumps(metrics, indent=4))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the inference server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+    asyncio.run(load_test(args.host, args.port, args.concurrency, args.requests))
+
+
+if __name__ == "__main__":
+    main()
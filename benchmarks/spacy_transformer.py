@@ -0,0 +1,53 @@
+"""Benchmark of the SpacyTransformer throughput and per-tweet latency with
+the full spaCy pipeline, the vectors-only configurations and the NumPy fast
+path.
+
+Run from the root of the repository with:
+
+    python -m benchmarks.spacy_transformer [dataset file] [number of tweets]
+
+The dataset defaults to the test set, data/prepared-data-test.csv.
+"""
+import sys
+from time import perf_counter
+
+import numpy as np
+
+from src.dataset import read_table
+from src.transformers import SpacyTransformer
+
+CONFIGURATIONS = {
+    "full pipeline": dict(disable=()),
+    "vectors only": dict(),
+    "vectors only, batch 4000": dict(batch_size=4000),
+    "vectors only, 2 processes": dict(n_process=2),
+    "fast vectors": dict(fast_vectors=True),
+}
+
+
+def main():
+    dataset = sys.argv[1] if len(sys.argv) > 1 else "data/prepared-data-test.csv"
+    texts = read_table(dataset, columns=["text"])["text"]
+    if len(sys.argv) > 2:
+        texts = texts.sample(int(sys.argv[2]), replace=True, random_state=0)
+    print(f"{len(texts)} tweets")
+    print(f"{'configuration':<28}{'load (s)':>10}{'tweets/s':>12}{'us/tweet':>10}")
+    reference = None
+    for name, params in CONFIGURATIONS.items():
+        start = perf_counter()
+        transformer = SpacyTransformer(**params).fit(texts, None)
+        loaded = perf_counter()
+        features = transformer.transform(texts)
+        duration = perf_counter() - loaded
+        if reference is None:
+            reference = features
+        elif not np.allclose(features, reference, atol=1e-6):
+            raise AssertionError(f"{name} changed the features.")
+        print(
+            f"{name:<28}{loaded - start:>10.2f}{len(texts) / duration:>12.0f}"
+            f"{duration / len(texts) * 1e6:>10.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+"""Benchmark of the load time and disk size of the dataset formats.
+
+Run from the root of the repository with:
+
+    python -m benchmarks.table_formats [dataset file]
+
+The dataset defaults to the gold dataset, data/gold_data_en.csv.
+"""
+import sys
+import tempfile
+import timeit
+from pathlib import Path
+
+from src.dataset import FORMATS, read_table, write_table
+
+
+def main():
+    dataset = Path(sys.argv[1] if len(sys.argv) > 1 else "data/gold_data_en.csv")
+    dataframe = read_table(dataset)
+    print(f"{dataset}: {len(dataframe)} rows, columns {list(dataframe.columns)}")
+    print(
+        f"{'format':<10}{'size (MB)':>11}{'load (ms)':>11}"
+        f"{'load text/label (ms)':>22}"
+    )
+    with tempfile.TemporaryDirectory() as directory:
+        for extension, name in FORMATS.items():
+            path = Path(directory) / f"dataset{extension}"
+            write_table(dataframe, path)
+            size = path.stat().st_size / 2 ** 20
+            load = min(timeit.repeat(lambda: read_table(path), number=1, repeat=5))
+            projected = min(
+                timeit.repeat(
+                    lambda: read_table(path, columns=["text", "label"]),
+                    number=1,
+                    repeat=5,
+                )
+            )
+            print(f"{name:<10}{size:>11.2f}{load * 1e3:>11.1f}{projected * 1e3:>22.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""Micro-benchmark of the per-tweet cost of the text helpers.
+
+Run from the root of the repository with:
+
+    python -m benchmarks.text_utils
+"""
+import re
+import timeit
+import tracemalloc
+from typing import Callable, Dict, List
+
+from src.text.utils import (
+    clean_tweet,
+    contractions,
+    contractions_unpacker,
+    get_social_tokenizer,
+    lowercase,
+    punctuation_cleaner,
+    remove_stopwords,
+    stopwords,
+    tokenizer,
+    _clean_tokens,
+)
+from tests.domain_objects_for_testing import create_dataframe_of_labeled_tweets
+
+
+def legacy_contractions_unpacker(tweet: str) -> str:
+    """The contractions unpacker as it was before the lookup tables were
+    compiled once per process."""
+    contractions_list = contractions()
+    pattern = re.compile(
+        r"\b(?:%s)\b" % "|".join(contractions_list.keys()), flags=re.IGNORECASE
+    )
+    return pattern.sub(lambda match: contractions_list[match.group(0).lower()], tweet)
+
+
+def legacy_remove_stopwords(tweet: str) -> str:
+    """The stopword filter as it was before the stopwords became a frozenset."""
+    return " ".join(word for word in tweet.split(" ") if word not in stopwords())
+
+
+def chained_clean(tweet: str) -> str:
+    """The clean pipeline as it was before its processors were fused."""
+    tweet = tokenizer(contractions_unpacker(tweet))
+    return lowercase(remove_stopwords(punctuation_cleaner(tweet)))
+
+
+def chained_clean_tokens(tokens: List[str]) -> str:
+    """What the chained clean pipeline does once the tweet is tokenized: a
+    new string per processor, split twice."""
+    return lowercase(remove_stopwords(punctuation_cleaner(" ".join(tokens))))
+
+
+def time_per_tweet(function: Callable[[str], str], repeat: int = 5) -> float:
+    """Returns the best per-tweet time in microseconds over the sample tweets."""
+    tweets = list(create_dataframe_of_labeled_tweets()["text"])
+    number = 200
+    best = min(
+        timeit.repeat(
+            lambda: [function(tweet) for tweet in tweets], number=number, repeat=repeat
+        )
+    )
+    return best / (number * len(tweets)) * 1e6
+
+
+def peak_bytes_per_tweet(function: Callable, tweets: List) -> float:
+    """Returns the mean over the tweets of the peak memory traced while
+    processing one of them, which counts the intermediate strings."""
+    function(tweets[0])
+    peaks = []
+    for tweet in tweets:
+        tracemalloc.start()
+        function(tweet)
+        peaks.append(tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    return sum(peaks) / len(peaks)
+
+
+def main():
+    benchmarks: Dict[str, Dict[str, Callable[[str], str]]] = {
+        "contractions_unpacker": {
+            "before": legacy_contractions_unpacker,
+            "after": contractions_unpacker,
+        },
+        "remove_stopwords": {
+            "before": legacy_remove_stopwords,
+            "after": remove_stopwords,
+        },
+        "clean (fused)": {"before": chained_clean, "after": clean_tweet},
+    }
+    get_social_tokenizer()
+    timings: Dict[str, float] = {}
+    print(f"{'helper':<24}{'before (us)':>14}{'after (us)':>14}{'speed-up':>10}")
+    for name, functions in benchmarks.items():
+        before = time_per_tweet(functions["before"])
+        after = time_per_tweet(functions["after"])
+        print(f"{name:<24}{before:>14.1f}{after:>14.1f}{before / after:>9.1f}x")
+    tokenized = [
+        get_social_tokenizer().tokenize(contractions_unpacker(tweet))
+        for tweet in create_dataframe_of_labeled_tweets()["text"]
+    ]
+    for name, function in [
+        ("before", chained_clean_tokens),
+        ("after", _clean_tokens),
+    ]:
+        best = min(
+            timeit.repeat(
+                lambda: [function(tokens) for tokens in tokenized], number=2000
+            )
+        )
+        timings[name] = best / (2000 * len(tokenized)) * 1e6
+    before, after = timings["before"], timings["after"]
+    print(
+        f"{'clean after tokenizing':<24}{before:>14.1f}{after:>14.1f}"
+        f"{before / after:>9.1f}x"
+    )
+    tweets = list(create_dataframe_of_labeled_tweets()["text"])
+    print(f"{'peak memory':<24}{'before (B)':>14}{'after (B)':>14}{'saving':>10}")
+    for name, functions, inputs in [
+        ("clean (fused)", (chained_clean, clean_tweet), tweets),
+        ("clean after tokenizing", (chained_clean_tokens, _clean_tokens), tokenized),
+    ]:
+        before, after = (
+            peak_bytes_per_tweet(function, inputs) for function in functions
+        )
+        print(f"{name:<24}{before:>14.0f}{after:>14.0f}{before / after:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""Serialization of the trained pipelines.
+
+An artifact is a cloudpickled dictionary holding a header and the sklearn
+pipeline. The pipeline does not contain the spaCy language model, only a
+reference to it (name, version and vectors checksum, see SpacyTransformer),
+so artifacts stay small and the language model is loaded from the installed
+package, once per process, when the pipeline is first used.
+"""
+from pathlib import Path
+from typing import List, Union
+
+import cloudpickle
+import sklearn
+
+FORMAT = "misog-model"
+FORMAT_VERSION = 1
+
+PathLike = Union[str, Path]
+
+
+def language_model_references(pipeline) -> List[dict]:
+    """Returns the references of the language models used by the steps of
+    a pipeline."""
+    return [
+        step.language_model_
+        for _, step in pipeline.steps
+        if hasattr(step, "language_model_")
+    ]
+
+
+def load_language_models(pipeline):
+    """Loads the language models of the steps of a pipeline which need one,
+    so that the first prediction does not pay for it."""
+    for _, step in pipeline.steps:
+        if hasattr(step, "load_language_model"):
+            step.load_language_model()
+
+
+def save_model(pipeline, path: PathLike):
+    """Writes a trained pipeline to an artifact file.
+
+    Args:
+        pipeline (sklearn pipeline) : the trained pipeline.
+        path (str or Path) : the artifact file.
+
+    """
+    artifact = dict(
+        format=FORMAT,
+        format_version=FORMAT_VERSION,
+        sklearn_version=sklearn.__version__,
+        language_models=language_model_references(pipeline),
+        pipeline=pipeline,
+    )
+    with open(path, "wb") as handler:
+        cloudpickle.dump(artifact, handler)
+
+
+def load_model(path: PathLike):
+    """Returns the trained pipeline stored in an artifact file.
+
+    The language models are not loaded yet, see load_language_models.
+
+    Args:
+        path (str or Path) : the artifact file.
+
+    Returns:
+        pipeline (sklearn pipeline) : the trained pipeline.
+
+    """
+    with open(path, "rb") as handler:
+        artifact = cloudpickle.load(handler)
+    if not isinstance(artifact, dict) or artifact.get("format") != FORMAT:
+        raise ValueError(f"{path} is not a {FORMAT} artifact, retrain the model.")
+    if artifact["format_version"] > FORMAT_VERSION:
+        raise ValueError(
+            f"{path} has format version {artifact['format_version']}, this code "
+            f"reads up to version {FORMAT_VERSION}."
+        )
+    return artifact["pipeline"]
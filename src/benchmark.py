@@ -0,0 +1,168 @@
+"""Latency, throughput and memory benchmark of a trained model.
+
+Measures, on tweets of the test set:
+
+- the cold start: loading the artifact and the language model and
+  predicting a first tweet, in a fresh process,
+- for each stage of the pipeline (featurize, classify) and for the whole
+  pipeline (end_to_end): the latency of single tweets once warm (p50, p95
+  and p99), the throughput at several batch sizes and the peak memory.
+
+Every measure runs in its own process, so that the cold start is really
+cold and the peak resident set size of a stage does not include the
+memory of the others. The model is a pipeline whose last step is the
+classifier; the steps before it make up the featurize stage. The results
+are written to a JSON file tracked by DVC as a metric.
+"""
+import argparse
+import json
+import multiprocessing
+import resource
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from time import perf_counter
+
+import numpy as np
+import pandas as pd
+
+from src.artifacts import load_language_models, load_model
+from src.dataset import read_table
+
+STAGES = ["featurize", "classify", "end_to_end"]
+BATCH_SIZES = [1, 16, 128, 1024]
+
+
+def peak_rss_mb() -> float:
+    """Returns the peak resident set size of the process, in MB."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes.
+    return peak / 2 ** 20 if sys.platform == "darwin" else peak / 2 ** 10
+
+
+def cold_start(model_file, tweet: str) -> dict:
+    """Returns the time taken to answer a first prediction from scratch."""
+    start = perf_counter()
+    model = load_model(model_file)
+    artifact_loaded = perf_counter()
+    load_language_models(model)
+    language_model_loaded = perf_counter()
+    model.predict_proba(pd.Series([tweet]))
+    predicted = perf_counter()
+    return dict(
+        load_artifact_s=artifact_loaded - start,
+        load_language_model_s=language_model_loaded - artifact_loaded,
+        first_prediction_s=predicted - language_model_loaded,
+        total_s=predicted - start,
+        peak_rss_mb=peak_rss_mb(),
+    )
+
+
+def stage_function(model, stage: str, tweets: pd.Series):
+    """Returns the function running a stage of the model on a batch of
+    tweets, given as indices into a precomputed input of the stage."""
+    featurizer, classifier = model[:-1], model[-1]
+    if stage == "featurize":
+        return lambda rows: featurizer.transform(tweets.iloc[rows])
+    if stage == "classify":
+        features = featurizer.transform(tweets)
+        return lambda rows: classifier.predict_proba(features[rows])
+    if stage == "end_to_end":
+        return lambda rows: model.predict_proba(tweets.iloc[rows])
+    raise ValueError(f"Unknown stage {stage!r}, expected one of {STAGES}.")
+
+
+def benchmark_stage(
+    model_file, stage: str, tweets: pd.Series, iterations: int, batch_sizes
+) -> dict:
+    """Returns the warm latency percentiles, the throughput at each batch
+    size and the peak memory of a stage."""
+    model = load_model(model_file)
+    load_language_models(model)
+    run = stage_function(model, stage, tweets)
+    rss_before = peak_rss_mb()
+    random = np.random.RandomState(42)
+
+    for row in random.randint(len(tweets), size=min(iterations, 20)):
+        run([row])
+    latencies = []
+    for row in random.randint(len(tweets), size=iterations):
+        start = perf_counter()
+        run([row])
+        latencies.append(perf_counter() - start)
+    p50, p95, p99 = np.percentile(np.array(latencies) * 1000, [50, 95, 99])
+
+    throughput = {}
+    for batch_size in batch_sizes:
+        batches = max(iterations // batch_size, 3)
+        rows = random.randint(len(tweets), size=(batches, batch_size))
+        start = perf_counter()
+        for batch in rows:
+            run(batch)
+        throughput[str(batch_size)] = rows.size / (perf_counter() - start)
+
+    return dict(
+        latency_ms=dict(p50=p50, p95=p95, p99=p99),
+        throughput_per_s=throughput,
+        peak_rss_mb=peak_rss_mb(),
+        peak_rss_increase_mb=peak_rss_mb() - rss_before,
+    )
+
+
+def in_fresh_process(function, *args):
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+        return executor.submit(function, *args).result()
+
+
+def main():
+    """Benchmark a trained model and write the results to a JSON file"""
+    parser = argparse.ArgumentParser(description="Benchmark the trained model.")
+    parser.add_argument("test_set_file")
+    parser.add_argument("trained_model_file")
+    parser.add_argument("output_file")
+    parser.add_argument(
+        "--iterations",
+        type=int,
+        default=500,
+        help="the number of single tweets timed per stage",
+    )
+    parser.add_argument(
+        "--batch-sizes",
+        type=int,
+        nargs="+",
+        default=BATCH_SIZES,
+        help="the batch sizes the throughput is measured at",
+    )
+    args = parser.parse_args()
+
+    tweets = read_table(args.test_set_file, columns=["text"])["text"]
+    tweets = tweets.reset_index(drop=True)
+    results = dict(
+        tweets=len(tweets),
+        cold_start=in_fresh_process(cold_start, args.trained_model_file, tweets[0]),
+    )
+    print(f"Cold start: {results['cold_start']['total_s']:.2f} s")
+    for stage in STAGES:
+        results[stage] = in_fresh_process(
+            benchmark_stage,
+            args.trained_model_file,
+            stage,
+            tweets,
+            args.iterations,
+            args.batch_sizes,
+        )
+        latency = results[stage]["latency_ms"]
+        print(
+            f"{stage}: p50 {latency['p50']:.2f} ms, p95 {latency['p95']:.2f} ms, "
+            f"p99 {latency['p99']:.2f} ms, peak RSS "
+            f"{results[stage]['peak_rss_mb']:.0f} MB"
+        )
+
+    Path(args.output_file).parent.mkdir(parents=True, exist_ok=True)
+    with open(args.output_file, "w") as file:
+        json.dump(results, file, ensure_ascii=False, indent=4)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""Pruning and quantization of the word vectors of the spaCy language model.
+
+The vectors of en_core_web_md take hundreds of megabytes and seconds to
+load, most of them for words the tweets never use. This keeps only the
+vectors of the words of the training set. Each word dropped still gets the
+kept vector nearest to its own (by cosine similarity), unless --no-fallback
+is given. The table can also be quantized to float16, or to int8 with a
+scale per row. The output directory holds the table as memory-mapped .npy
+files, the tokenizer of the language model and meta.json. A
+SpacyTransformer given it as vectors_dir never loads the language model.
+
+    python src/build_vectors.py data/prepared-data-train.csv models/vectors-int8 \\
+        --quantization int8
+"""
+import argparse
+import json
+from pathlib import Path
+from typing import Iterable
+
+import numpy as np
+import spacy
+from spacy.attrs import ORTH
+
+from src.dataset import read_table
+from src.transformers import language_model_reference
+from src.vectors import QUANTIZATIONS, VectorTable
+
+
+def corpus_keys(nlp, texts: Iterable[str], batch_size: int = 1000) -> np.ndarray:
+    """Returns the distinct lexeme IDs of the tokens of the texts."""
+    docs = nlp.tokenizer.pipe(texts, batch_size=batch_size)
+    keys = [doc.to_array(ORTH) for doc in docs]
+    if not keys:
+        return np.zeros(0, dtype=np.uint64)
+    return np.unique(np.concatenate(keys))
+
+
+def build_vectors(
+    nlp,
+    model_name: str,
+    texts: Iterable[str],
+    output_dir: str,
+    quantization: str = "float32",
+    fallback: bool = True,
+) -> dict:
+    """Writes the word vectors of a language model pruned to the words of the
+    texts and quantized, with its tokenizer.
+
+    Args:
+        nlp (spaCy language model) : the language model.
+        model_name (str) : its name, as given to SpacyTransformer.
+        texts (iterable) : the texts whose words are kept.
+        output_dir (str) : the directory written.
+        quantization (str) : float32, float16 or int8.
+        fallback (bool) : whether the words dropped get the nearest kept
+        vector rather than none.
+
+    Returns:
+        summary (dict) : the numbers of keys and vectors and the memory
+        taken by the vectors, before and after.
+
+    """
+    table = VectorTable.from_vocab(nlp.vocab)
+    built = table.prune(corpus_keys(nlp, texts), fallback).quantize(quantization)
+    source = language_model_reference(model_name, nlp)
+    reference = dict(
+        name=f"{model_name}-pruned-{quantization}",
+        version=source["version"],
+        vectors_checksum=built.checksum(),
+        source=source,
+    )
+    output_dir = Path(output_dir)
+    built.save(output_dir, lang=nlp.lang, reference=reference, fallback=fallback)
+    nlp.tokenizer.to_disk(output_dir / "tokenizer")
+    return dict(
+        keys=dict(before=len(table.keys), after=len(built.keys)),
+        vectors=dict(before=len(np.unique(table.rows)), after=built.oov_row),
+        vectors_mb=dict(before=table.nbytes / 2**20, after=built.nbytes / 2**20),
+    )
+
+
+def main():
+    """Build the pruned word vectors from the training set"""
+    parser = argparse.ArgumentParser(description="Prune and quantize word vectors.")
+    parser.add_argument("train_set_file")
+    parser.add_argument("output_dir")
+    parser.add_argument("--model-name", default="en_core_web_md")
+    parser.add_argument("--quantization", choices=QUANTIZATIONS, default="float32")
+    parser.add_argument(
+        "--no-fallback",
+        dest="fallback",
+        action="store_false",
+        help="leave the words dropped without a vector",
+    )
+    args = parser.parse_args()
+
+    nlp = spacy.load(args.model_name, disable=["tagger", "parser", "ner"])
+    texts = read_table(args.train_set_file, columns=["text"])["text"]
+    summary = build_vectors(
+        nlp, args.model_name, texts, args.output_dir, args.quantization, args.fallback
+    )
+    print(json.dumps(summary, indent=4))
+
+
+if __name__ == "__main__":
+    main()
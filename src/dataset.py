@@ -0,0 +1,304 @@
+"""Reading and writing the datasets exchanged by the pipeline stages.
+
+The format of a dataset is chosen by the extension of its file name:
+
+- ``.csv`` for comma-separated values,
+- ``.parquet`` for Apache Parquet, compressed with zstd,
+- ``.feather`` for Feather (Arrow IPC) files, compressed with zstd.
+
+The columnar formats store dtypes, so they are loaded without re-parsing
+the text, and can load only the requested columns.
+"""
+from pathlib import Path
+from typing import Dict, Iterator, Optional, Sequence, Union
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+import pyarrow.parquet as pq
+
+PathLike = Union[str, Path]
+
+FORMATS = {".csv": "csv", ".parquet": "parquet", ".feather": "feather"}
+COMPRESSION = "zstd"
+# The rows of a Parquet row group or Feather record batch written by
+# write_table, the unit read_chunks can stream.
+ROW_GROUP_SIZE = 10_000
+
+
+def table_format(path: PathLike) -> str:
+    """Returns the format of a dataset file from its extension.
+
+    Args:
+        path (str or Path) : the dataset file.
+
+    Returns:
+        format (str) : one of "csv", "parquet" or "feather".
+
+    """
+    suffix = Path(path).suffix.lower()
+    if suffix not in FORMATS:
+        raise ValueError(
+            f"Unsupported dataset extension {suffix!r} for {path}, "
+            f"expected one of {sorted(FORMATS)}."
+        )
+    return FORMATS[suffix]
+
+
+def read_table(path: PathLike, columns: Optional[Sequence[str]] = None) -> pd.DataFrame:
+    """Returns a whole dataset.
+
+    Args:
+        path (str or Path) : the dataset file.
+        columns (list) : the columns to read, by default all of them.
+
+    Returns:
+        dataframe (pandas df) : the dataset.
+
+    """
+    file_format = table_format(path)
+    columns = list(columns) if columns is not None else None
+    if file_format == "parquet":
+        return pd.read_parquet(path, columns=columns)
+    if file_format == "feather":
+        return pd.read_feather(path, columns=columns)
+    return pd.read_csv(path, usecols=columns)
+
+
+def write_table(
+    dataframe: pd.DataFrame, path: PathLike, row_group_size: int = ROW_GROUP_SIZE
+):
+    """Writes a whole dataset, without its index.
+
+    Args:
+        dataframe (pandas df) : the dataset.
+        path (str or Path) : the dataset file.
+        row_group_size (int) : the number of rows of each row group of a
+        Parquet file or record batch of a Feather file, so that read_chunks
+        streams the dataset.
+
+    """
+    file_format = table_format(path)
+    if file_format == "csv":
+        dataframe.to_csv(path, index=False)
+        return
+
+    table = pa.Table.from_pandas(dataframe, preserve_index=False)
+    if file_format == "parquet":
+        pq.write_table(
+            table, str(path), row_group_size=row_group_size, compression=COMPRESSION
+        )
+    else:
+        feather.write_feather(
+            table, str(path), compression=COMPRESSION, chunksize=row_group_size
+        )
+
+
+def read_chunks(
+    path: PathLike, chunksize: int, columns: Optional[Sequence[str]] = None
+) -> Iterator[pd.DataFrame]:
+    """Yields the rows of a dataset a chunk at a time, so that only one
+    chunk is held in memory.
+
+    Args:
+        path (str or Path) : the dataset file.
+        chunksize (int) : the maximum number of rows per chunk.
+        columns (list) : the columns to read, by default all of them.
+
+    Returns:
+        chunks (iterator) : the chunks of the dataset, as dataframes.
+
+    """
+    file_format = table_format(path)
+    columns = list(columns) if columns is not None else None
+    if file_format == "csv":
+        yield from pd.read_csv(path, chunksize=chunksize, usecols=columns)
+        return
+
+    for batch in _read_arrow_batches(path, file_format, columns):
+        for start in range(0, batch.num_rows, chunksize):
+            yield batch.slice(start, chunksize).to_pandas()
+
+
+def _read_arrow_batches(path: PathLike, file_format: str, columns):
+    """Yields the row groups of a Parquet file or record batches of a
+    Feather file, the unit these formats can be read by."""
+    if file_format == "parquet":
+        parquet_file = pq.ParquetFile(str(path))
+        for index in range(parquet_file.num_row_groups):
+            yield parquet_file.read_row_group(index, columns=columns)
+    else:
+        reader = pa.ipc.open_file(str(path))
+        for index in range(reader.num_record_batches):
+            batch = reader.get_batch(index)
+            if columns is not None:
+                batch = pa.RecordBatch.from_arrays(
+                    [batch.column(batch.schema.get_field_index(c)) for c in columns],
+                    names=columns,
+                )
+            yield batch
+
+
+class TableWriter:
+    """Writes a dataset incrementally, one chunk of rows at a time.
+
+    Use as a context manager:
+
+        with TableWriter("data/prepared-data.parquet") as writer:
+            for chunk in chunks:
+                writer.write(chunk)
+
+    Each chunk becomes a row group of a Parquet file and a record batch of
+    a Feather file. The record batches of a Feather file are compressed with
+    zstd only from pyarrow 2.0: the writer of the pinned pyarrow 0.17 cannot
+    compress them, so chunked Feather files are then written uncompressed.
+    Prefer Parquet for chunked output.
+    """
+
+    def __init__(self, path: PathLike):
+        self.path = Path(path)
+        self.format = table_format(path)
+        self.rows_written = 0
+        self._started = False
+        self._schema = None
+        self._writer = None
+        self._empty_chunk: Optional[pd.DataFrame] = None
+
+    def write(self, chunk: pd.DataFrame):
+        if self.format == "csv":
+            chunk.to_csv(
+                self.path,
+                mode="a" if self._started else "w",
+                header=not self._started,
+                index=False,
+            )
+            self._started = True
+        elif chunk.empty and not self._started:
+            # An empty chunk has no values to infer the column types from.
+            self._empty_chunk = chunk
+        else:
+            self._write_arrow(chunk)
+        self.rows_written += len(chunk)
+
+    def _write_arrow(self, chunk: pd.DataFrame):
+        table = pa.Table.from_pandas(chunk, schema=self._schema, preserve_index=False)
+        if not self._started:
+            self._schema = table.schema
+            if self.format == "parquet":
+                self._writer = pq.ParquetWriter(
+                    str(self.path), self._schema, compression=COMPRESSION
+                )
+            elif hasattr(pa.ipc, "IpcWriteOptions"):
+                options = pa.ipc.IpcWriteOptions(compression=COMPRESSION)
+                self._writer = pa.ipc.new_file(
+                    str(self.path), self._schema, options=options
+                )
+            else:
+                # pyarrow before 2.0 cannot compress record batches.
+                self._writer = pa.RecordBatchFileWriter(str(self.path), self._schema)
+            self._started = True
+        self._writer.write_table(table)
+
+    def close(self):
+        if not self._started:
+            # Still create the file, so that downstream stages find it.
+            if self.format == "csv":
+                self.path.write_text("")
+            elif self._empty_chunk is not None:
+                write_table(self._empty_chunk, self.path)
+            else:
+                write_table(pd.DataFrame(), self.path)
+        elif self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    def __enter__(self) -> "TableWriter":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class HashSplitter:
+    """Splits a labeled dataset into train and test sets chunk by chunk, so
+    that the full dataset never needs to be in memory.
+
+    A row goes to the train set when a hash of its text, as a fraction of
+    the largest hash, is below train_size, so the split is a function of
+    the row whatever the chunks. The split is stratified: the rows of each
+    label are counted, in the order of the file, and a row is only given
+    to the other set when its hash would take the train rows of its label
+    more than max_deviation rows away from train_size of them. The rows
+    without a label are split as one more label. The split is the same for
+    a given file and random_state, whatever the chunk size.
+
+    Args:
+        train_size (float) : the proportion of train rows of each label.
+        random_state (int) : the seed of the hash.
+        max_deviation (float) : how many rows the train rows of a label may
+        differ from train_size of them.
+
+    """
+
+    def __init__(
+        self, train_size: float = 0.8, random_state: int = 42, max_deviation: float = 1.0
+    ):
+        self.train_size = train_size
+        self.random_state = random_state
+        self.max_deviation = max_deviation
+        self.label_counts: Dict[object, int] = {}
+        self.train_counts: Dict[object, int] = {}
+
+    def split(self, chunk: pd.DataFrame) -> np.ndarray:
+        """Returns which rows of the next chunk belong to the train set.
+
+        Args:
+            chunk (pandas df) : the rows to split, with text and label
+            columns.
+
+        Returns:
+            is_train (numpy array) : boolean mask of the train rows.
+
+        """
+        hashes = pd.util.hash_pandas_object(
+            chunk["text"], index=False, hash_key=f"{self.random_state:016d}"[-16:]
+        ).to_numpy(dtype=np.uint64)
+        # The 53 high bits of the hash, as a fraction in [0, 1).
+        by_hash = (hashes >> np.uint64(11)).astype(np.float64) / 2.0 ** 53
+        by_hash = by_hash < self.train_size
+        labels = chunk["label"].to_numpy()
+        missing = pd.isna(labels)
+        groups = [(label, labels == label) for label in pd.unique(labels[~missing])]
+        if missing.any():
+            groups.append((None, missing))
+        is_train = np.zeros(len(chunk), dtype=bool)
+        for label, of_label in groups:
+            rows = np.flatnonzero(of_label)
+            is_train[rows] = self._stratify(label, by_hash[rows])
+        return is_train
+
+    def _stratify(self, label, by_hash: np.ndarray) -> np.ndarray:
+        """Returns the assignment of the next rows of a label, that of their
+        hash unless it takes the train rows too far from train_size."""
+        seen = self.label_counts.get(label, 0)
+        train = self.train_counts.get(label, 0)
+        is_train = by_hash.tolist()
+        for position, row_is_train in enumerate(is_train):
+            seen += 1
+            deviation = train + row_is_train - seen * self.train_size
+            if abs(deviation) > self.max_deviation:
+                row_is_train = not row_is_train
+                is_train[position] = row_is_train
+            train += row_is_train
+        self.label_counts[label] = seen
+        self.train_counts[label] = train
+        return np.array(is_train, dtype=bool)
+
+
+def hash_split(
+    dataframe: pd.DataFrame, train_size: float = 0.8, random_state: int = 42
+) -> np.ndarray:
+    """Returns which rows of a labeled dataset belong to the train set, see
+    HashSplitter."""
+    return HashSplitter(train_size, random_state).split(dataframe)
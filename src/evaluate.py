@@ -1,13 +1,16 @@
+import copy
 import sys
-from time import time
 from pathlib import Path
 import json
-import cloudpickle
+from time import perf_counter
 import matplotlib.pyplot as plt
 import numpy as np
-import pandas as pd
-from sklearn.metrics import f1_score, roc_curve, auc
-import spacy
+from sklearn.metrics import f1_score, roc_curve, auc, roc_auc_score
+
+from src.artifacts import language_model_references, load_language_models, load_model
+from src.dataset import read_table
+from src.feature_store import is_feature_store, load_features, read_meta
+from src.transformers import SpacyTransformer
 
 
 np.random.seed(42)
@@ -32,15 +35,114 @@ def plot_roc_auc_f1(y_test, y_proba, title=None):
 
 
 def load_artifacts(test_set_file, trained_model_file):
-    test_data = pd.read_csv(test_set_file)
-    print("Loading language model...")
-    nlp = spacy.load("en_core_web_md")
+    """Load the test set and the trained model with its language models,
+    and return them with the times taken to load the model artifact and its
+    language models. The test set may be given as a feature store, whose
+    test texts are loaded"""
+    if is_feature_store(test_set_file):
+        test_set_file = read_meta(test_set_file)["test_set_file"]
+    test_data = read_table(test_set_file, columns=["text", "label"])
+    start = perf_counter()
     print("Loading machine-learning model...")
-    model = cloudpickle.load(trained_model_file)
-    return model, nlp, test_data
-
-
-def write_results(output_folder, y_test, y_prob):
+    model = load_model(trained_model_file)
+    artifact_loaded = perf_counter()
+    print("Loading language model...")
+    load_language_models(model)
+    timings = dict(
+        load_artifact_s=artifact_loaded - start,
+        load_language_model_s=perf_counter() - artifact_loaded,
+    )
+    return model, test_data, timings
+
+
+def load_compared_model(model, compared_file):
+    """Load a model compared with the trained model and its language models,
+    and return it with the times taken to load them. A directory holds word
+    vectors built by src/build_vectors.py, which the trained model is
+    evaluated with: loading them is loading its language model"""
+    start = perf_counter()
+    if not compared_file.is_dir():
+        model = load_model(compared_file)
+    artifact_loaded = perf_counter()
+    if compared_file.is_dir():
+        model = with_vectors(model, compared_file)
+    load_language_models(model)
+    return model, dict(
+        load_artifact_s=artifact_loaded - start,
+        load_language_model_s=perf_counter() - artifact_loaded,
+    )
+
+
+def with_vectors(model, vectors_dir):
+    """Return a copy of a model whose spaCy featurizer takes its word vectors
+    from a directory written by src/build_vectors.py"""
+    featurizer = model.steps[0][1]
+    if not isinstance(featurizer, SpacyTransformer):
+        raise ValueError(f"{vectors_dir} needs a model featurized with spaCy.")
+    variant = copy.copy(model)
+    variant.steps = [(model.steps[0][0], featurizer.with_vectors(vectors_dir))]
+    variant.steps += model.steps[1:]
+    return variant
+
+
+def vectors_mb(model):
+    """Return the memory taken by the word vectors of a model, if it has any"""
+    featurizer = model.steps[0][1]
+    if not isinstance(featurizer, SpacyTransformer):
+        return None
+    if featurizer.vectors_dir is not None:
+        return featurizer.vector_table().nbytes / 2**20
+    return featurizer.load_language_model().vocab.vectors.data.nbytes / 2**20
+
+
+def stored_test_features(model, store_dir, test_data):
+    """Return the test features of a feature store, checking that they are
+    those of the test set and of the language models of the model"""
+    features, labels = load_features(store_dir, "test")
+    if not np.array_equal(labels, test_data["label"].to_numpy()):
+        raise ValueError(f"The features of {store_dir} are not those of the test set.")
+    stored_references = read_meta(store_dir)["language_models"]
+    if stored_references != language_model_references(model):
+        raise ValueError(
+            f"The features of {store_dir} were computed with the language models "
+            f"{stored_references}, not those of the model."
+        )
+    return features
+
+
+def measure_model(model, test_data, latency_samples=200, features=None):
+    """Predict the test set and return the probabilities with the F1, the
+    AUC, the time taken to predict it and the time taken per tweet, in batch
+    and one tweet at a time, featurizing included. Given the features of the
+    test set, the time per tweet of the classifier alone is also returned"""
+    texts = test_data["text"].reset_index(drop=True)
+    start = perf_counter()
+    y_prob = model.predict_proba(texts)
+    batch_s = perf_counter() - start
+
+    rows = np.random.RandomState(42).randint(len(texts), size=latency_samples)
+    latencies = []
+    for row in rows:
+        start = perf_counter()
+        model.predict_proba(texts.iloc[[row]])
+        latencies.append(perf_counter() - start)
+    p50, p95 = np.percentile(np.array(latencies) * 1000, [50, 95])
+
+    metrics = dict(
+        f1=f1_score(test_data["label"], y_prob[:, 1] > 0.5),
+        AUC=roc_auc_score(test_data["label"], y_prob[:, 1]),
+        predict_s=batch_s,
+        batch_ms_per_tweet=batch_s * 1000 / len(texts),
+        latency_ms=dict(p50=p50, p95=p95),
+    )
+    if features is not None:
+        start = perf_counter()
+        model[-1].predict_proba(features)
+        metrics["classify_ms_per_tweet"] = (perf_counter() - start) * 1000 / len(texts)
+    return y_prob, metrics
+
+
+def write_results(output_folder, y_test, y_prob, comparison=None):
     """Save to disk results of model evaluation"""
     roc_img_file_png = output_folder / "roc_auc_f1.png"
     metrics_file = output_folder / "eval.json"
@@ -52,12 +154,17 @@ def write_results(output_folder, y_test, y_prob):
         plt.savefig(handler, dpi=150, format="png")
 
     metrics = dict(f1=f1_test, AUC=auc_test)
+    if comparison is not None:
+        metrics["comparison"] = comparison
     with open(metrics_file, "w") as file:
         json.dump(metrics, file, ensure_ascii=False, indent=4)
 
 
 def main():
-    """Load test set and trained model and evaluate performance"""
+    """Load test set and trained model and evaluate performance, comparing it
+    with the other trained models given after the output folder, and with
+    the trained model using the word vectors of the directories given
+    there"""
     print("Command-line arguments:")
     for arg in sys.argv[1:]:
         print(arg)
@@ -70,18 +177,37 @@ def main():
     except (IndexError, ValueError) as error:
         print(f"Error: {error}. Please specify all input and output files!")
         sys.exit()
-    test_data = pd.read_csv(test_set_file)
-    x_test, y_test = test_data["text"], test_data["label"]
-    # Prediction
-    # ## Start recording prediction time from here ##
-    start_time = time()
-
-    with open(trained_model_file, "rb") as handler:
-        model = cloudpickle.load(handler)
-    y_prob = model.predict_proba(x_test)
-    duration = time() - start_time
-    print(f"Avg. single prediction time: {duration/len(y_prob)} s")
-    write_results(output_folder, y_test, y_prob)
+    compared_files = [Path(arg) for arg in sys.argv[4:]]
+    model, test_data, timings = load_artifacts(test_set_file, trained_model_file)
+    features = None
+    if is_feature_store(test_set_file):
+        features = stored_test_features(model, test_set_file, test_data)
+    y_prob, metrics = measure_model(model, test_data, features=features)
+    metrics.update(timings, vectors_mb=vectors_mb(model))
+    comparison = {trained_model_file.stem: metrics}
+    for compared_file in compared_files:
+        compared_model, timings = load_compared_model(model, compared_file)
+        comparison[compared_file.stem] = dict(
+            measure_model(compared_model, test_data)[1],
+            **timings,
+            vectors_mb=vectors_mb(compared_model),
+        )
+    for name, model_metrics in comparison.items():
+        classify = ""
+        if "classify_ms_per_tweet" in model_metrics:
+            classify = (
+                f" ({model_metrics['classify_ms_per_tweet']:.3f} ms classifying "
+                "the stored features)"
+            )
+        print(
+            f"{name}: F1 {model_metrics['f1']:.4f}, AUC {model_metrics['AUC']:.4f}, "
+            f"{model_metrics['batch_ms_per_tweet']:.3f} ms per tweet in batch"
+            f"{classify}, "
+            f"{model_metrics['latency_ms']['p50']:.2f} ms for a single tweet, "
+            f"model loaded in {model_metrics['load_artifact_s']:.2f} s, "
+            f"language models in {model_metrics['load_language_model_s']:.2f} s"
+        )
+    write_results(output_folder, test_data["label"], y_prob, comparison)
 
 
 if __name__ == "__main__":
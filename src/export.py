@@ -0,0 +1,275 @@
+"""Export of a trained pipeline to a portable format, for scoring without
+Python, sklearn or spaCy (e.g. in the browser extension).
+
+The pipeline must chain a SpacyTransformer and a
+HistGradientBoostingClassifier. The export is a single uncompressed .npz
+file holding only arrays:
+
+- the words of the training set which have a vector, as their UTF-8 bytes
+  one after the other (words) and the offset of each (word_offsets), and
+  their vectors (vectors, float32). Words outside the training vocabulary
+  count as words without a vector.
+- the trees of the classifier, flattened: every node of every tree
+  numbered one after the other, with its feature, threshold, children,
+  whether missing values go left, whether it is a leaf and its value
+  (feature, threshold, left, right, missing_left, is_leaf, value), the
+  root of each tree (roots), the raw prediction the trees add up from
+  (baseline) and the number of levels to walk down (max_depth).
+- the regular expression tokenizing tweets (token_pattern): every match,
+  from left to right, is a token.
+
+Scoring a tweet means tokenizing it, averaging the vectors of its tokens
+(words without a vector counting as zeros), walking each tree from its
+root, going left while the feature is at most the threshold, adding the
+values of the leaves reached to the baseline and taking the sigmoid.
+ExportedModel does that with NumPy.
+
+The pipeline tokenizes with spaCy's English tokenizer, whose rules do not
+fit in a regular expression. token_pattern is a simplified version of
+them: it splits off punctuation, hashtag signs and the clitics of
+contractions ("do", "n't"; "she", "'s") and keeps URLs, e-mail addresses,
+mentions, ellipses and common emoticons whole. It differs from spaCy on
+rarer cases, e.g. "gonna", "y'all", runs of symbols or abbreviations
+ending with a period. reports/export.json measures how much that changes
+the predictions.
+
+    python src/export.py data/prepared-data-train.csv data/prepared-data-test.csv \\
+        models/misog-model.pkl models/misog-model-export.npz reports/export.json
+"""
+
+import argparse
+import json
+import os
+import re
+from pathlib import Path
+from time import perf_counter
+from typing import Dict, Iterable, List, Sequence, Union
+
+import numpy as np
+from sklearn.experimental import enable_hist_gradient_boosting  # noqa
+from sklearn.ensemble import HistGradientBoostingClassifier
+
+from src.artifacts import load_model
+from src.dataset import read_table
+from src.transformers import SpacyTransformer
+from src.trees import FlatTreeClassifier, flatten_trees
+from src.vectors import mean_rows
+
+FORMAT = "misog-export"
+FORMAT_VERSION = 2
+
+# The simplified spaCy English tokenizer of the export, see the docstring of
+# the module. It ignores case.
+TOKEN_PATTERN = (
+    r"(?i)https?://\S+|www\.\S+"
+    r"|[\w.+-]+@\w+(?:\.\w+)+"
+    r"|@\w+"
+    r"|\w+(?=n't\b)|n't\b"
+    r"|(?<=\w)'(?:s|m|re|ve|ll|d)\b"
+    r"|\w+(?:\.\w+)*"
+    r"|\.{2,}|[:;=]-?[()\[\]DPp/|]|<3"
+    r"|\S"
+)
+
+PathLike = Union[str, Path]
+
+
+def training_vocabulary(nlp, texts: Iterable[str], batch_size: int = 1000) -> List[str]:
+    """Returns the distinct tokens of the texts which have a vector, in the
+    order they first appear."""
+    vocabulary: Dict[str, None] = {}
+    for doc in nlp.tokenizer.pipe(texts, batch_size=batch_size):
+        for token in doc:
+            vocabulary[token.text] = None
+    return [word for word in vocabulary if nlp.vocab.has_vector(word)]
+
+
+def export_model(pipeline, texts: Iterable[str], path: PathLike) -> dict:
+    """Writes the export of a trained pipeline, its word vectors pruned to the
+    tokens of texts.
+
+    Args:
+        pipeline (sklearn pipeline) : a SpacyTransformer followed by a
+        HistGradientBoostingClassifier.
+        texts (iterable) : the texts the pipeline was trained on.
+        path (str or Path) : the .npz file written.
+
+    Returns:
+        summary (dict) : the number of words and trees exported.
+
+    """
+    steps = [step for _, step in pipeline.steps]
+    if len(steps) != 2 or not (
+        isinstance(steps[0], SpacyTransformer)
+        and isinstance(steps[1], HistGradientBoostingClassifier)
+    ):
+        raise ValueError(
+            "Only a SpacyTransformer followed by a HistGradientBoostingClassifier "
+            f"can be exported, got {[type(step).__name__ for step in steps]}."
+        )
+    featurizer, classifier = steps
+    nlp = featurizer.load_language_model()
+    words = training_vocabulary(nlp, texts, featurizer.batch_size)
+    vectors = np.zeros((len(words), nlp.vocab.vectors_length), dtype=np.float32)
+    for row, word in enumerate(words):
+        vectors[row] = nlp.vocab.get_vector(word)
+    encoded = [word.encode("utf-8") for word in words]
+    word_offsets = np.concatenate([[0], np.cumsum([len(word) for word in encoded])])
+    trees = flatten_trees(classifier)
+    with open(path, "wb") as handler:
+        np.savez(
+            handler,
+            format=np.array(FORMAT),
+            format_version=np.array(FORMAT_VERSION),
+            words=np.frombuffer(b"".join(encoded), dtype=np.uint8),
+            word_offsets=word_offsets.astype(np.int64),
+            vectors=vectors,
+            token_pattern=np.array(TOKEN_PATTERN),
+            **trees,
+        )
+    return dict(words=len(words), trees=len(trees["roots"]), nodes=len(trees["value"]))
+
+
+class ExportedModel:
+    """Scores tweets with an exported model, without sklearn or spaCy.
+
+    Args:
+        path (str or Path) : the .npz file written by export_model.
+
+    """
+
+    def __init__(self, path: PathLike):
+        with np.load(path) as arrays:
+            if str(arrays["format"]) != FORMAT:
+                raise ValueError(f"{path} is not a {FORMAT} file.")
+            if int(arrays["format_version"]) > FORMAT_VERSION:
+                raise ValueError(
+                    f"{path} has format version {int(arrays['format_version'])}, "
+                    f"this code reads up to version {FORMAT_VERSION}."
+                )
+            arrays = {name: arrays[name] for name in arrays.files}
+        blob, offsets = arrays.pop("words").tobytes(), arrays.pop("word_offsets")
+        self.rows = {
+            blob[start:end].decode("utf-8"): row
+            for row, (start, end) in enumerate(zip(offsets[:-1], offsets[1:]))
+        }
+        # Version 1 exports have no token pattern: they were scored from the
+        # tokens of spaCy, which the current pattern approximates.
+        self.token_pattern = re.compile(str(arrays.pop("token_pattern", TOKEN_PATTERN)))
+        vectors = arrays.pop("vectors")
+        # The last row stands for the words without a vector.
+        self.vectors = np.vstack([vectors, np.zeros((1, vectors.shape[1]), np.float32)])
+        self.classifier = FlatTreeClassifier(arrays)
+
+    def doc_vectors(self, token_lists: Sequence[Sequence[str]]) -> np.ndarray:
+        """Returns the average vector of the tokens of each tweet, as
+        SpacyTransformer does."""
+        oov_row = len(self.vectors) - 1
+        lengths = np.array([len(tokens) for tokens in token_lists], dtype=np.int64)
+        rows = np.array(
+            [
+                self.rows.get(token, oov_row)
+                for tokens in token_lists
+                for token in tokens
+            ],
+            dtype=np.int64,
+        )
+        return mean_rows(self.vectors, rows, lengths)
+
+    def predict_proba(self, token_lists: Sequence[Sequence[str]]) -> np.ndarray:
+        """Returns the probabilities of both classes of each tweet, given as
+        its tokens."""
+        return self.classifier.predict_proba(self.doc_vectors(token_lists))
+
+    def tokenize(self, text: str) -> List[str]:
+        """Returns the tokens of a tweet, split by the token pattern."""
+        return self.token_pattern.findall(text)
+
+    def predict_proba_texts(self, texts: Sequence[str]) -> np.ndarray:
+        """Returns the probabilities of both classes of each tweet, tokenized
+        by the token pattern."""
+        return self.predict_proba([self.tokenize(text) for text in texts])
+
+
+def _median_latency_ms(function, inputs: Sequence, samples: int = 200) -> float:
+    rows = np.random.RandomState(42).randint(len(inputs), size=samples)
+    latencies = []
+    for row in rows:
+        start = perf_counter()
+        function(inputs[row : row + 1])
+        latencies.append(perf_counter() - start)
+    return float(np.median(latencies) * 1000)
+
+
+def _max_difference(probabilities: np.ndarray, expected: np.ndarray) -> float:
+    return float(np.abs(probabilities - expected).max())
+
+
+def _label_agreement(probabilities: np.ndarray, expected: np.ndarray) -> float:
+    return float(np.mean((probabilities > 0.5) == (expected > 0.5)))
+
+
+def main():
+    """Export the trained model and compare it with the pipeline"""
+    parser = argparse.ArgumentParser(description="Export the trained model.")
+    parser.add_argument("train_set_file")
+    parser.add_argument("test_set_file")
+    parser.add_argument("trained_model_file")
+    parser.add_argument("export_file")
+    parser.add_argument("report_file")
+    args = parser.parse_args()
+
+    pipeline = load_model(args.trained_model_file)
+    train_texts = read_table(args.train_set_file, columns=["text"])["text"]
+    summary = export_model(pipeline, train_texts, args.export_file)
+    featurizer = pipeline[0]
+    nlp = featurizer.load_language_model()
+
+    test_texts = read_table(args.test_set_file, columns=["text"])["text"]
+    test_texts = test_texts.reset_index(drop=True)
+    token_lists = [
+        [token.text for token in doc]
+        for doc in nlp.tokenizer.pipe(test_texts, batch_size=featurizer.batch_size)
+    ]
+    exported = ExportedModel(args.export_file)
+    expected = pipeline.predict_proba(test_texts)[:, 1]
+    probabilities = exported.predict_proba(token_lists)[:, 1]
+    from_texts = exported.predict_proba_texts(test_texts)[:, 1]
+    report = dict(
+        **summary,
+        size_mb=dict(
+            pipeline=os.path.getsize(args.trained_model_file) / 2**20,
+            language_model_vectors=nlp.vocab.vectors.data.nbytes / 2**20,
+            export=os.path.getsize(args.export_file) / 2**20,
+        ),
+        # Both from the raw text of a tweet, tokenizing included.
+        latency_ms=dict(
+            pipeline=_median_latency_ms(pipeline.predict_proba, test_texts),
+            export=_median_latency_ms(exported.predict_proba_texts, test_texts),
+        ),
+        # Given the tokens of spaCy, test tweets may still hold words outside
+        # the training vocabulary, which the export has no vector for.
+        max_probability_difference=_max_difference(probabilities, expected),
+        label_agreement=_label_agreement(probabilities, expected),
+        # Given the raw text, tokenized by the token pattern of the export.
+        token_pattern=dict(
+            token_agreement=float(
+                np.mean(
+                    [
+                        exported.tokenize(text) == tokens
+                        for text, tokens in zip(test_texts, token_lists)
+                    ]
+                )
+            ),
+            max_probability_difference=_max_difference(from_texts, expected),
+            label_agreement=_label_agreement(from_texts, expected),
+        ),
+    )
+    print(json.dumps(report, indent=4))
+    Path(args.report_file).parent.mkdir(parents=True, exist_ok=True)
+    with open(args.report_file, "w") as file:
+        json.dump(report, file, ensure_ascii=False, indent=4)
+
+
+if __name__ == "__main__":
+    main()
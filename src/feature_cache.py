@@ -0,0 +1,266 @@
+"""Persistent on-disk cache of document vectors, keyed by text."""
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Iterable, List, Tuple, Union
+
+import numpy as np
+
+PathLike = Union[str, Path]
+
+_KEY_DTYPE = np.dtype("S16")
+_RETAINED_AFTER_EVICTION = 0.9
+
+
+def text_key(text: str) -> bytes:
+    """Returns the 16-byte content hash a text is cached under."""
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+
+
+class CacheStats:
+    """Counts of the lookups made in a cache since it was opened."""
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def as_dict(self) -> dict:
+        return dict(
+            hits=self.hits,
+            misses=self.misses,
+            evictions=self.evictions,
+            hit_rate=self.hit_rate,
+        )
+
+    def __repr__(self) -> str:
+        return (
+            f"CacheStats(hits={self.hits}, misses={self.misses}, "
+            f"evictions={self.evictions}, hit_rate={self.hit_rate:.1%})"
+        )
+
+
+class DocVectorCache:
+    """Cache of document vectors stored in a directory, so that texts seen by
+    a previous fit, evaluation or retraining are not run through the language
+    model again.
+
+    Vectors are keyed by a hash of their text and stored in a memory-mapped
+    float32 matrix. The cache belongs to one model: opening it for another
+    model (or another vector size) empties it. When it grows over max_entries,
+    the least recently used vectors are evicted on flush, down to 90% of
+    max_entries so that the next flushes can append again.
+
+    The cache is meant to be used by one process at a time:
+
+        cache = DocVectorCache("cache/doc-vectors", "en_core_web_md-2.2.5", 300)
+        vectors, found = cache.get_many(texts)
+        vectors[~found] = compute(texts[~found])
+        cache.put_many(texts[~found], vectors[~found])
+        cache.flush()
+    """
+
+    def __init__(
+        self,
+        directory: PathLike,
+        model_id: str,
+        dimension: int,
+        max_entries: int = 1_000_000,
+    ):
+        self.directory = Path(directory)
+        self.model_id = model_id
+        self.dimension = dimension
+        self.max_entries = max_entries
+        self.stats = CacheStats()
+        self._pending_keys: List[bytes] = []
+        self._pending_vectors: List[np.ndarray] = []
+        self._recency_changed = False
+        self._load()
+
+    @property
+    def _paths(self) -> Tuple[Path, Path, Path, Path]:
+        return (
+            self.directory / "meta.json",
+            self.directory / "keys.npy",
+            self.directory / "vectors.f32",
+            self.directory / "last_used.npy",
+        )
+
+    def _load(self):
+        meta_path, keys_path, vectors_path, last_used_path = self._paths
+        self._clock = 0
+        self._keys = np.empty(0, dtype=_KEY_DTYPE)
+        self._order = np.empty(0, dtype=np.int64)
+        self._vectors: np.ndarray = np.empty((0, self.dimension), dtype=np.float32)
+        self._last_used = np.empty(0, dtype=np.int64)
+        if not meta_path.exists():
+            return
+        with open(meta_path) as file:
+            meta = json.load(file)
+        if meta["model_id"] != self.model_id or meta["dimension"] != self.dimension:
+            # Vectors computed by another model: start over.
+            return
+        self._clock = meta["clock"]
+        entries = meta["entries"]
+        if entries == 0:
+            return
+        # The files may hold rows appended by a flush that was interrupted
+        # before updating the metadata, which are ignored.
+        self._keys = np.load(keys_path)[:entries]
+        self._last_used = np.load(last_used_path)[:entries]
+        self._vectors = np.memmap(
+            vectors_path, dtype=np.float32, mode="r", shape=(entries, self.dimension)
+        )
+        self._order = np.argsort(self._keys, kind="stable")
+
+    def __len__(self) -> int:
+        return len(self._keys) + len(self._pending_keys)
+
+    def _find(self, keys: np.ndarray) -> np.ndarray:
+        """Returns the row of each key, or -1 for the keys not stored."""
+        rows = np.full(len(keys), -1, dtype=np.int64)
+        if not len(self._keys):
+            return rows
+        sorted_keys = self._keys[self._order]
+        positions = np.searchsorted(sorted_keys, keys)
+        positions = np.minimum(positions, len(sorted_keys) - 1)
+        found = sorted_keys[positions] == keys
+        rows[found] = self._order[positions[found]]
+        return rows
+
+    def get_many(self, texts: Iterable[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """Returns the cached vectors of the texts.
+
+        Args:
+            texts (iterable) : the texts to look up.
+
+        Returns:
+            vectors (numpy array) : float32 matrix with one row per text,
+            zero for the texts not in the cache.
+            found (numpy array) : boolean mask of the texts in the cache.
+
+        """
+        keys = np.array([text_key(text) for text in texts], dtype=_KEY_DTYPE)
+        rows = self._find(keys)
+        found = rows >= 0
+        vectors = np.zeros((len(keys), self.dimension), dtype=np.float32)
+        vectors[found] = self._vectors[rows[found]]
+        self._clock += 1
+        self._last_used[rows[found]] = self._clock
+        self._recency_changed |= bool(found.any())
+        self.stats.hits += int(found.sum())
+        self.stats.misses += int((~found).sum())
+        return vectors, found
+
+    def put_many(self, texts: Iterable[str], vectors: np.ndarray):
+        """Adds the vectors of the texts to the cache. They are written to
+        disk on flush.
+
+        Args:
+            texts (iterable) : the texts.
+            vectors (numpy array) : matrix with one row per text.
+
+        """
+        keys = [text_key(text) for text in texts]
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dimension)
+        if len(keys) != len(vectors):
+            raise ValueError(f"Got {len(keys)} texts but {len(vectors)} vectors.")
+        self._pending_keys.extend(keys)
+        self._pending_vectors.append(vectors)
+
+    def flush(self):
+        """Writes the vectors added since the last flush and the recency of
+        the vectors found to disk. If the cache then holds more than
+        max_entries, the least recently used vectors are evicted."""
+        if not self._pending_keys and not self._recency_changed:
+            return
+        self._recency_changed = False
+        new_keys = np.array(self._pending_keys, dtype=_KEY_DTYPE)
+        # Texts put twice, or already stored, keep their first vector.
+        _, first = np.unique(new_keys, return_index=True)
+        new = np.sort(first)
+        new = new[self._find(new_keys[new]) < 0]
+        new_keys = new_keys[new]
+        if self._pending_vectors:
+            new_vectors = np.concatenate(self._pending_vectors)[new]
+        else:
+            new_vectors = np.empty((0, self.dimension), dtype=np.float32)
+        self._pending_keys, self._pending_vectors = [], []
+
+        keys = np.concatenate([self._keys, new_keys])
+        last_used = np.concatenate(
+            [self._last_used, np.full(len(new_keys), self._clock, dtype=np.int64)]
+        )
+        self.directory.mkdir(parents=True, exist_ok=True)
+        if len(keys) > self.max_entries:
+            self._compact(keys, new_vectors, last_used)
+        else:
+            self._append(keys, new_vectors, last_used)
+        self._load()
+
+    def _append(self, keys: np.ndarray, new_vectors: np.ndarray, last_used):
+        """Appends the new vectors to the vectors file, which only has to be
+        written in proportion to what was added."""
+        _, keys_path, vectors_path, last_used_path = self._paths
+        entries = len(keys) - len(new_vectors)
+        with open(vectors_path, "r+b" if vectors_path.exists() else "wb") as file:
+            file.seek(entries * self.dimension * 4)
+            file.write(new_vectors.tobytes())
+            file.truncate()
+        _atomic_save(keys_path, keys)
+        _atomic_save(last_used_path, last_used)
+        self._write_meta(len(keys))
+
+    def _compact(self, keys: np.ndarray, new_vectors: np.ndarray, last_used):
+        """Rewrites the cache with only its most recently used vectors."""
+        _, keys_path, vectors_path, last_used_path = self._paths
+        retained = int(self.max_entries * _RETAINED_AFTER_EVICTION)
+        # Most recently used first, and most recently added among equals.
+        recency = np.lexsort((-np.arange(len(keys)), -last_used))
+        keep = np.sort(recency[:retained])
+        self.stats.evictions += len(keys) - len(keep)
+        vectors = np.concatenate([np.asarray(self._vectors), new_vectors])[keep]
+        # Mark the cache empty while its files are rewritten, so that an
+        # interrupted compaction cannot pair keys with the wrong vectors.
+        self._write_meta(0)
+        self._vectors = np.empty((0, self.dimension), dtype=np.float32)
+        temporary = vectors_path.with_suffix(".tmp")
+        vectors.tofile(temporary)
+        os.replace(temporary, vectors_path)
+        _atomic_save(keys_path, keys[keep])
+        _atomic_save(last_used_path, last_used[keep])
+        self._write_meta(len(keep))
+
+    def _write_meta(self, entries: int):
+        meta_path = self._paths[0]
+        meta = dict(
+            model_id=self.model_id,
+            dimension=self.dimension,
+            clock=self._clock,
+            entries=entries,
+        )
+        temporary = meta_path.with_suffix(".tmp")
+        with open(temporary, "w") as file:
+            json.dump(meta, file, indent=4)
+        os.replace(temporary, meta_path)
+
+    def clear(self):
+        """Removes every vector from the cache, on disk too."""
+        for path in self._paths:
+            if path.exists():
+                path.unlink()
+        self._pending_keys, self._pending_vectors = [], []
+        self._recency_changed = False
+        self._load()
+
+
+def _atomic_save(path: Path, array: np.ndarray):
+    temporary = path.with_name(path.stem + ".tmp.npy")
+    np.save(temporary, array)
+    os.replace(temporary, path)
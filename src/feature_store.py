@@ -0,0 +1,65 @@
+"""Feature stores: datasets featurized once by src/featurize.py.
+
+A feature store is a directory holding:
+
+- featurizer.pkl, the fitted featurizer as a one-step pipeline artifact,
+- one directory per split (train, test), each with the features
+  (features.npy, or features.npz for sparse features) and labels.npy,
+- meta.json, with the featurizer name, the input files, the references of
+  the language models and the shape of each split.
+"""
+import json
+from pathlib import Path
+from typing import Tuple, Union
+
+import numpy as np
+import scipy.sparse as sp
+
+from src.artifacts import load_model
+
+PathLike = Union[str, Path]
+
+SPLITS = ["train", "test"]
+
+
+def is_feature_store(path: PathLike) -> bool:
+    """Returns whether a path is a feature store."""
+    return (Path(path) / "meta.json").is_file()
+
+
+def read_meta(store_dir: PathLike) -> dict:
+    with open(Path(store_dir) / "meta.json") as file:
+        return json.load(file)
+
+
+def write_meta(store_dir: PathLike, meta: dict):
+    with open(Path(store_dir) / "meta.json", "w") as file:
+        json.dump(meta, file, ensure_ascii=False, indent=4)
+
+
+def save_features(features, labels: np.ndarray, split_dir: PathLike):
+    """Writes the features and labels of a split, dense features as .npy and
+    sparse ones as .npz."""
+    split_dir = Path(split_dir)
+    split_dir.mkdir(parents=True, exist_ok=True)
+    if sp.issparse(features):
+        sp.save_npz(split_dir / "features.npz", features.tocsr())
+    else:
+        np.save(split_dir / "features.npy", features)
+    np.save(split_dir / "labels.npy", labels)
+
+
+def load_features(store_dir: PathLike, split: str) -> Tuple[object, np.ndarray]:
+    """Returns the features and labels of a split, dense features
+    memory-mapped."""
+    split_dir = Path(store_dir) / split
+    if (split_dir / "features.npz").exists():
+        features = sp.load_npz(split_dir / "features.npz")
+    else:
+        features = np.load(split_dir / "features.npy", mmap_mode="r")
+    return features, np.load(split_dir / "labels.npy")
+
+
+def load_featurizer(store_dir: PathLike):
+    """Returns the fitted featurizer the features were computed with."""
+    return load_model(Path(store_dir) / "featurizer.pkl")[0]
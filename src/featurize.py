@@ -0,0 +1,96 @@
+"""Featurization of the training and test sets into a feature store (see
+src/feature_store.py), once for the stages after split.
+
+A featurizer of src/featurizers.py, the one train.py would build, is
+fitted on the training set, then both sets are featurized chunk by chunk.
+train.py, evaluate.py and tune.py take the store in place of the datasets
+and memory-map the features, so that experimenting with the classifier
+does not run spaCy again.
+
+    python src/featurize.py data/prepared-data-train.csv data/prepared-data-test.csv \\
+        data/features
+"""
+import argparse
+import json
+from pathlib import Path
+from typing import Optional, Union
+
+from sklearn.pipeline import make_pipeline
+
+from src.artifacts import language_model_references, save_model
+from src.feature_store import SPLITS, save_features, write_meta
+from src.featurizers import build_featurizer, featurize_chunks, fit_featurizer
+
+PathLike = Union[str, Path]
+
+
+def featurize(
+    train_set_file: PathLike,
+    test_set_file: PathLike,
+    store_dir: PathLike,
+    featurizer_name: str = "spacy",
+    chunksize: int = 10_000,
+    cache_dir: Optional[str] = None,
+) -> dict:
+    """Fits a featurizer on the training set and writes the
+    features of both sets to a feature store.
+
+    Args:
+        train_set_file (str or Path) : the training set.
+        test_set_file (str or Path) : the test set.
+        store_dir (str or Path) : the directory written.
+        featurizer_name (str) : spacy or hashing, see
+        featurizers.build_featurizer.
+        chunksize (int) : the number of rows featurized at a time.
+        cache_dir (str) : optional directory caching the document vectors.
+
+    Returns:
+        meta (dict) : the content of meta.json.
+
+    """
+    store_dir = Path(store_dir)
+    featurizer = build_featurizer(featurizer_name, cache_dir)
+    featurizer = fit_featurizer(featurizer, train_set_file, chunksize)
+    meta = dict(
+        featurizer=featurizer_name,
+        train_set_file=str(train_set_file),
+        test_set_file=str(test_set_file),
+        language_models=language_model_references(make_pipeline(featurizer)),
+    )
+    for split, input_file in zip(SPLITS, [train_set_file, test_set_file]):
+        features, labels = featurize_chunks(featurizer, input_file, chunksize)
+        save_features(features, labels, store_dir / split)
+        meta[split] = dict(rows=features.shape[0], columns=features.shape[1])
+    save_model(make_pipeline(featurizer), store_dir / "featurizer.pkl")
+    write_meta(store_dir, meta)
+    return meta
+
+
+def main():
+    """Featurize the training and test sets into a feature store"""
+    parser = argparse.ArgumentParser(description="Featurize the datasets once.")
+    parser.add_argument("train_set_file")
+    parser.add_argument("test_set_file")
+    parser.add_argument("store_dir")
+    parser.add_argument("--featurizer", choices=["spacy", "hashing"], default="spacy")
+    parser.add_argument("--chunksize", type=int, default=10_000)
+    parser.add_argument(
+        "--cache-dir",
+        help="directory caching the document vectors between runs, "
+        "e.g. cache/doc-vectors",
+    )
+    args = parser.parse_args()
+
+    meta = featurize(
+        args.train_set_file,
+        args.test_set_file,
+        args.store_dir,
+        args.featurizer,
+        args.chunksize,
+        args.cache_dir,
+    )
+    print(json.dumps(meta, indent=4))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+"""The featurizers of the models of train.py, and their fitting and
+featurizing of a dataset chunk by chunk.
+
+featurize.py featurizes the datasets into a feature store with them, and
+train.py trains on the datasets directly with them. Keeping them apart
+from the classifiers means changing the classifiers does not featurize the
+datasets again.
+"""
+import numpy as np
+import scipy.sparse as sp
+
+from src.dataset import read_chunks
+from src.transformers import HashingTextTransformer, SpacyTransformer
+
+
+def build_featurizer(featurizer_name, cache_dir=None):
+    """Returns the featurizer of a model: spaCy document vectors, or hashed
+    n-grams"""
+    if featurizer_name == "spacy":
+        return SpacyTransformer(cache_dir=cache_dir)
+    if featurizer_name == "hashing":
+        return HashingTextTransformer()
+    raise ValueError(f"Unknown featurizer {featurizer_name!r}.")
+
+
+def fit_featurizer(featurizer, input_file, chunksize):
+    """Fit the featurizer chunk by chunk, for the featurizers learning
+    statistics of the texts"""
+    if not hasattr(featurizer, "partial_fit"):
+        return featurizer.fit(None, None)
+    for chunk in read_chunks(input_file, chunksize, columns=["text"]):
+        featurizer.partial_fit(chunk["text"])
+    return featurizer
+
+
+def featurize_chunks(featurizer, input_file, chunksize):
+    """Featurize the dataset chunk by chunk, so that only the feature matrix
+    and not the text is held in memory"""
+    features, labels = [], []
+    for chunk in read_chunks(input_file, chunksize, columns=["text", "label"]):
+        features.append(featurizer.transform(chunk["text"]).astype(np.float32))
+        labels.append(chunk["label"].to_numpy())
+    if sp.issparse(features[0]):
+        return sp.vstack(features, format="csr"), np.concatenate(labels)
+    return np.concatenate(features), np.concatenate(labels)
@@ -1,23 +1,54 @@
-import sys
+import argparse
+from typing import Iterable, Iterator
+
 import pandas as pd
 
+from src.dataset import TableWriter, read_chunks, read_table, write_table
+
+
+def prepare(chunks: Iterable[pd.DataFrame]) -> Iterator[pd.DataFrame]:
+    """Here one wold implement preliminary operations e.g. removing NAs.
+
+    Operations must only need the rows of the current chunk, so that the
+    stage can stream datasets larger than memory.
+    """
+    for chunk in chunks:
+        yield chunk
+
 
 def main():
-    """Here one wold implement preliminary operations e.g. removing NAs"""
-    args = sys.argv[1:]
-    input_file = args[0]
-    output_file = args[1]
+    parser = argparse.ArgumentParser(
+        description="Run preliminary operations on the dataset."
+    )
+    parser.add_argument("input_file")
+    parser.add_argument("output_file")
+    parser.add_argument(
+        "--chunksize",
+        type=int,
+        help="stream the dataset this many rows at a time instead of loading it whole",
+    )
+    args = parser.parse_args()
+    input_file = args.input_file
+    output_file = args.output_file
     print(f"Input: {input_file}")
     print(f"Output: {output_file}")
-    df_in = pd.read_csv(input_file)
+
+    if args.chunksize:
+        with TableWriter(output_file) as writer:
+            for chunk in prepare(read_chunks(input_file, args.chunksize)):
+                writer.write(chunk)
+        print(f"Output rows: {writer.rows_written}")
+        return
+
+    df_in = read_table(input_file)
     print("Input DF info:")
     df_in.info()
 
-    df_balanced = df_in
+    df_balanced = pd.concat(list(prepare([df_in])))
     print("Output DF info:")
     df_balanced.info()
 
-    df_balanced.to_csv(output_file, index=False)
+    write_table(df_balanced, output_file)
 
 
 if __name__ == "__main__":
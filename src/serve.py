@@ -0,0 +1,401 @@
+"""Local HTTP inference server for the trained misogyny model.
+
+The pipeline is loaded once, with its language model, when the server
+starts. Its gradient boosting classifier is replaced by a FlatTreeClassifier,
+which predicts the same probabilities much faster for small batches. The
+classifier still predicts the batches large enough for it to be faster,
+measured when the server starts.
+Predictions requested concurrently are grouped into micro-batches
+so that the model runs one predict_proba call for many tweets. The server
+only uses the standard library and runs offline.
+
+Run from the root of the repository with:
+
+    python -m src.serve models/misog-model.pkl --port 8000
+
+Endpoints:
+
+- ``POST /predict`` with ``{"text": "..."}`` returns ``{"probability": p}``,
+  and with ``{"texts": ["...", ...]}`` returns ``{"probabilities": [...]}``,
+  the probabilities of the tweets being misogynistic.
+- ``GET /metrics`` returns the number of requests and tweets served, the
+  latency percentiles of the recent requests and the average batch size.
+- ``GET /health`` returns ``{"status": "ok"}``.
+"""
+import argparse
+import asyncio
+import json
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
+from typing import Deque, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from src.artifacts import load_language_models, load_model
+from src.trees import flatten_pipeline
+
+logger = logging.getLogger(__name__)
+
+MAX_BODY_SIZE = 1 << 20
+REASONS = {
+    200: "OK",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    413: "Payload Too Large",
+    431: "Request Header Fields Too Large",
+    500: "Internal Server Error",
+}
+
+
+class HTTPError(Exception):
+    """Error answered to the client with an HTTP status."""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+class LatencyRecorder:
+    """Keeps the latencies of the most recent requests.
+
+    Args:
+        size (int) : the number of latencies kept.
+
+    """
+
+    def __init__(self, size: int = 10000):
+        self.latencies: Deque[float] = deque(maxlen=size)
+
+    def record(self, seconds: float):
+        self.latencies.append(seconds)
+
+    def percentiles(self) -> dict:
+        """Returns the p50, p95 and p99 latencies, in milliseconds."""
+        if not self.latencies:
+            return dict(p50=None, p95=None, p99=None)
+        p50, p95, p99 = np.percentile(np.array(self.latencies) * 1000, [50, 95, 99])
+        return dict(p50=p50, p95=p95, p99=p99)
+
+
+class MicroBatcher:
+    """Groups the texts of concurrent requests into batches predicted by one
+    predict_proba call.
+
+    A batch is started by the first text waiting and closed when it holds
+    max_batch_size texts or max_wait seconds after it was started, whichever
+    comes first. The model runs in a worker thread, so that requests keep
+    being read while a batch is predicted.
+
+    Args:
+        model (sklearn pipeline) : the trained pipeline.
+        max_batch_size (int) : the maximum number of texts per batch.
+        max_wait (float) : the longest a text waits for others, in seconds.
+
+    """
+
+    def __init__(self, model, max_batch_size: int = 64, max_wait: float = 0.005):
+        self.model = model
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.batches = 0
+        self.texts = 0
+        self._queue: Optional[asyncio.Queue] = None
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        self._queue = asyncio.Queue()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._executor.shutdown(wait=True)
+
+    async def predict(self, texts: List[str]) -> np.ndarray:
+        """Returns the probabilities of the texts being misogynistic."""
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((texts, future))
+        return await future
+
+    async def _next_batch(self) -> List[Tuple[List[str], asyncio.Future]]:
+        batch = [await self._queue.get()]
+        size = len(batch[0][0])
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.max_wait
+        while size < self.max_batch_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                request = await asyncio.wait_for(self._queue.get(), timeout)
+            except asyncio.TimeoutError:
+                break
+            batch.append(request)
+            size += len(request[0])
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._next_batch()
+            texts = [text for request_texts, _ in batch for text in request_texts]
+            try:
+                probabilities = await loop.run_in_executor(
+                    self._executor, self._predict, texts
+                )
+            except Exception as error:  # pylint: disable=broad-except
+                logger.exception("Prediction failed")
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(error)
+                continue
+            self.batches += 1
+            self.texts += len(texts)
+            start = 0
+            for request_texts, future in batch:
+                end = start + len(request_texts)
+                if not future.done():
+                    future.set_result(probabilities[start:end])
+                start = end
+
+    def _predict(self, texts: List[str]) -> np.ndarray:
+        return self.model.predict_proba(pd.Series(texts))[:, 1]
+
+
+class InferenceServer:
+    """HTTP/1.1 server answering predictions with a MicroBatcher.
+
+    Args:
+        model (sklearn pipeline) : the trained pipeline.
+        max_batch_size (int) : the maximum number of texts per batch.
+        max_wait (float) : the longest a text waits for others, in seconds.
+
+    """
+
+    def __init__(self, model, max_batch_size: int = 64, max_wait: float = 0.005):
+        self.batcher = MicroBatcher(model, max_batch_size, max_wait)
+        self.latencies = LatencyRecorder()
+        self.requests = 0
+        self.errors = 0
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self, host: str = "127.0.0.1", port: int = 8000):
+        self.batcher.start()
+        self._server = await asyncio.start_server(self._handle, host, port)
+        return self._server
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        await self.batcher.stop()
+
+    def metrics(self) -> dict:
+        batches = self.batcher.batches
+        return dict(
+            requests=self.requests,
+            errors=self.errors,
+            tweets=self.batcher.texts,
+            batches=batches,
+            mean_batch_size=self.batcher.texts / batches if batches else None,
+            latency_ms=self.latencies.percentiles(),
+        )
+
+    async def _handle(self, reader, writer):
+        try:
+            keep_alive = True
+            while keep_alive:
+                request = await _read_request(reader)
+                if request is None:
+                    break
+                method, path, headers, body = request
+                keep_alive = headers.get("connection", "").lower() != "close"
+                status, payload = await self._respond(method, path, body)
+                _write_response(writer, status, payload, keep_alive)
+                await writer.drain()
+        except HTTPError as error:
+            _write_response(writer, error.status, dict(error=str(error)), False)
+            await _discard_input(reader, writer)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _respond(self, method: str, path: str, body: bytes) -> Tuple[int, dict]:
+        path = path.split("?", 1)[0]
+        if path == "/health":
+            return 200, dict(status="ok")
+        if path == "/metrics":
+            return 200, self.metrics()
+        if path != "/predict":
+            return 404, dict(error=f"No endpoint {path}.")
+        if method != "POST":
+            return 405, dict(error="Use POST to request predictions.")
+
+        start = perf_counter()
+        self.requests += 1
+        try:
+            texts, single = _parse_texts(body)
+            probabilities = (await self.batcher.predict(texts)).tolist()
+        except HTTPError as error:
+            self.errors += 1
+            return error.status, dict(error=str(error))
+        except Exception as error:  # pylint: disable=broad-except
+            self.errors += 1
+            return 500, dict(error=str(error))
+        self.latencies.record(perf_counter() - start)
+        if single:
+            return 200, dict(probability=probabilities[0])
+        return 200, dict(probabilities=probabilities)
+
+
+def _parse_texts(body: bytes) -> Tuple[List[str], bool]:
+    """Returns the texts of a /predict request and whether a single text was
+    sent."""
+    try:
+        payload = json.loads(body)
+    except ValueError:
+        raise HTTPError(400, "The body must be JSON.")
+    if isinstance(payload, dict) and isinstance(payload.get("text"), str):
+        return [payload["text"]], True
+    if isinstance(payload, dict) and isinstance(payload.get("texts"), list):
+        texts = payload["texts"]
+        if texts and all(isinstance(text, str) for text in texts):
+            return texts, False
+    raise HTTPError(400, 'Send {"text": "..."} or a non-empty {"texts": [...]}.')
+
+
+async def _discard_input(reader, writer, timeout: float = 1.0):
+    """Sends the response and reads what is left of a rejected request for
+    a moment before the connection is closed. Closing with unread input
+    resets the connection, and the client may lose the response."""
+    try:
+        await writer.drain()
+        writer.write_eof()
+        await asyncio.wait_for(_read_until_closed(reader), timeout)
+    except (ConnectionError, asyncio.TimeoutError):
+        pass
+
+
+async def _read_until_closed(reader):
+    while await reader.read(1 << 16):
+        pass
+
+
+async def _read_line(reader) -> bytes:
+    """Returns the next line of a request, which must fit in the buffer of
+    the stream."""
+    try:
+        return await reader.readline()
+    except (ValueError, asyncio.LimitOverrunError):
+        raise HTTPError(431, "The request line and headers must be under 64 KiB.")
+
+
+async def _read_request(reader):
+    """Returns the method, path, headers and body of the next request on a
+    connection, or None once the client closed it."""
+    request_line = await _read_line(reader)
+    if not request_line.strip():
+        return None
+    try:
+        method, path, _ = request_line.decode("latin-1").split(" ", 2)
+    except ValueError:
+        raise HTTPError(400, "Malformed request line.")
+    headers = {}
+    while True:
+        line = await _read_line(reader)
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    length = headers.get("content-length", "0") or "0"
+    if not length.isdecimal():
+        raise HTTPError(400, "Content-Length must be a non-negative integer.")
+    length = int(length)
+    if length > MAX_BODY_SIZE:
+        raise HTTPError(413, f"The body must be under {MAX_BODY_SIZE} bytes.")
+    body = await reader.readexactly(length) if length else b""
+    return method.upper(), path, headers, body
+
+
+def _write_response(writer, status: int, payload: dict, keep_alive: bool):
+    body = json.dumps(payload).encode("utf-8")
+    head = (
+        f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+        "Content-Type: application/json\r\n"
+        f"Content-Length: {len(body)}\r\n"
+        f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+    )
+    writer.write(head.encode("latin-1") + body)
+
+
+async def serve(model_file, host, port, max_batch_size, max_wait, flat_trees=True):
+    start = perf_counter()
+    model = load_model(model_file)
+    load_language_models(model)
+    if flat_trees:
+        model = flatten_pipeline(model, measure=True)
+    # The first prediction pays for lazy initializations, not a client.
+    model.predict_proba(pd.Series(["warm up"]))
+    logger.info("Model loaded in %.2f s", perf_counter() - start)
+    server = InferenceServer(model, max_batch_size, max_wait)
+    await server.start(host, port)
+    logger.info("Serving predictions on http://%s:%d", host, port)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.stop()
+
+
+def main():
+    """Serve the predictions of a trained model over HTTP"""
+    parser = argparse.ArgumentParser(description="Serve the misogyny classifier.")
+    parser.add_argument("model_file")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument(
+        "--max-batch-size",
+        type=int,
+        default=64,
+        help="the maximum number of tweets predicted together",
+    )
+    parser.add_argument(
+        "--max-wait-ms",
+        type=float,
+        default=5.0,
+        help="how long a request waits for others to batch with, in ms",
+    )
+    parser.add_argument(
+        "--sklearn-trees",
+        action="store_true",
+        help="predict with the gradient boosting classifier itself rather "
+        "than with its flattened trees",
+    )
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    try:
+        asyncio.run(
+            serve(
+                args.model_file,
+                args.host,
+                args.port,
+                args.max_batch_size,
+                args.max_wait_ms / 1000,
+                not args.sklearn_trees,
+            )
+        )
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
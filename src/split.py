@@ -1,32 +1,70 @@
-import sys
+import argparse
 from pathlib import Path
-import pandas as pd
-from sklearn.model_selection import train_test_split
+
+from src.dataset import (
+    HashSplitter,
+    TableWriter,
+    hash_split,
+    read_chunks,
+    read_table,
+    write_table,
+)
+
+
+def output_names(file):
+    """Return the names of the train and test files for a dataset file"""
+    path = Path(file)
+    stem = path.stem
+    suffix = path.suffix
+    train_name = path.parent.as_posix() + "/" + stem + "-train" + suffix
+    test_name = path.parent.as_posix() + "/" + stem + "-test" + suffix
+    return train_name, test_name
+
+
+def split_in_memory(file):
+    """Split the dataset loaded whole, into the same sets as split_streaming"""
+    df_in = read_table(file)
+    is_train = hash_split(df_in, train_size=0.8, random_state=42)
+    df_train, df_test = df_in[is_train], df_in[~is_train]
+    for df_out, out_name in zip((df_train, df_test), output_names(file)):
+        print(f"Output: {out_name}")
+        write_table(df_out, out_name)
+
+
+def split_streaming(file, chunksize):
+    """Split the dataset chunk by chunk, stratified by label with a
+    HashSplitter"""
+    train_name, test_name = output_names(file)
+    print(f"Output: {train_name}")
+    print(f"Output: {test_name}")
+    with TableWriter(train_name) as train_writer, TableWriter(test_name) as test_writer:
+        splitter = HashSplitter(train_size=0.8, random_state=42)
+        for chunk in read_chunks(file, chunksize):
+            is_train = splitter.split(chunk)
+            train_writer.write(chunk[is_train])
+            test_writer.write(chunk[~is_train])
+    print(f"Train rows: {train_writer.rows_written}")
+    print(f"Test rows: {test_writer.rows_written}")
 
 
 def main():
     """Split dataset into train and test sets"""
-    input_files = sys.argv[1:]
-    if not input_files:
-        raise ValueError("No arguments provided, provide input file as argument.")
-    for file in input_files:
-        df_in = pd.read_csv(file)
-        df_train, df_test = train_test_split(
-            df_in,
-            train_size=0.8,
-            shuffle=True,
-            stratify=df_in["label"].to_numpy(),
-            random_state=42,
-        )
-        path = Path(file)
-        stem = path.stem
-        suffix = path.suffix
-        out_name = path.parent.as_posix() + "/" + stem + "-train" + suffix
-        print(f"Output: {out_name}")
-        df_train.to_csv(out_name, index=False)
-        out_name = path.parent.as_posix() + "/" + stem + "-test" + suffix
-        print(f"Output: {out_name}")
-        df_test.to_csv(out_name, index=False)
+    parser = argparse.ArgumentParser(
+        description="Split datasets into train and test sets."
+    )
+    parser.add_argument("input_files", nargs="+")
+    parser.add_argument(
+        "--chunksize",
+        type=int,
+        help="stream the datasets this many rows at a time instead of loading "
+        "them whole, which splits them the same way",
+    )
+    args = parser.parse_args()
+    for file in args.input_files:
+        if args.chunksize:
+            split_streaming(file, args.chunksize)
+        else:
+            split_in_memory(file)
 
 
 if __name__ == "__main__":
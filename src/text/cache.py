@@ -0,0 +1,195 @@
+"""Persistent cache of preprocessed tweets, so that re-running a pipeline
+over a dataset only processes the rows added or changed since the last run.
+
+The cache is a SQLite database. Processed texts are keyed by a hash of the
+original text and by the fingerprint of the pipeline that processed them,
+so changing a processor (or the code of its module) never reuses stale
+results:
+
+    cache = PreprocessingCache("cache/preprocessing.sqlite")
+    clean(dataframe, cache=cache)
+    print(cache.stats)
+
+Entries of rows removed from the dataset, or of outdated pipelines, stay
+in the database until collected:
+
+    python -m src.text.cache cache/preprocessing.sqlite gc data/gold_data_en.csv
+"""
+import argparse
+import sqlite3
+from pathlib import Path
+from typing import Iterable, Optional, Sequence, Union
+
+import pandas as pd
+
+from src.feature_cache import CacheStats, text_key
+
+PathLike = Union[str, Path]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS processed (
+    pipeline TEXT NOT NULL,
+    key BLOB NOT NULL,
+    text TEXT NOT NULL,
+    PRIMARY KEY (pipeline, key)
+) WITHOUT ROWID
+"""
+
+
+class PreprocessingCache:
+    """Cache of the texts processed by preprocessing pipelines, stored in a
+    SQLite database.
+
+    Args:
+        path (str or Path) : the database file, created if needed.
+
+    """
+
+    def __init__(self, path: PathLike):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.stats = CacheStats()
+        self._connection = sqlite3.connect(str(self.path))
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute(_SCHEMA)
+        self._connection.execute(
+            "CREATE TEMP TABLE lookup (position INTEGER PRIMARY KEY, key BLOB)"
+        )
+
+    def get_many(self, pipeline: str, texts: pd.Series) -> pd.Series:
+        """Returns the cached processed texts.
+
+        Args:
+            pipeline (str) : the fingerprint of the pipeline.
+            texts (pandas series) : the original texts.
+
+        Returns:
+            processed (pandas series) : the processed texts, with the index of
+            texts, None for the texts not in the cache.
+
+        """
+        processed = [None] * len(texts)
+        with self._connection:
+            self._connection.executemany(
+                "INSERT INTO temp.lookup VALUES (?, ?)",
+                enumerate(text_key(text) for text in texts),
+            )
+            rows = self._connection.execute(
+                "SELECT lookup.position, processed.text FROM temp.lookup "
+                "JOIN processed ON processed.pipeline = ? "
+                "AND processed.key = lookup.key",
+                (pipeline,),
+            )
+            for position, text in rows:
+                processed[position] = text
+            self._connection.execute("DELETE FROM temp.lookup")
+        hits = len(texts) - processed.count(None)
+        self.stats.hits += hits
+        self.stats.misses += len(texts) - hits
+        return pd.Series(processed, index=texts.index, dtype=object)
+
+    def put_many(self, pipeline: str, texts: Iterable[str], processed: Iterable[str]):
+        """Stores the processed texts.
+
+        Args:
+            pipeline (str) : the fingerprint of the pipeline.
+            texts (iterable) : the original texts.
+            processed (iterable) : the processed texts, in the same order.
+
+        """
+        with self._connection:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO processed VALUES (?, ?, ?)",
+                (
+                    (pipeline, text_key(text), processed_text)
+                    for text, processed_text in zip(texts, processed)
+                ),
+            )
+
+    def collect_garbage(
+        self, texts: Iterable[str], pipelines: Optional[Sequence[str]] = None
+    ) -> int:
+        """Removes the entries of the texts no longer in the dataset and, if
+        pipelines is given, of every other pipeline.
+
+        Args:
+            texts (iterable) : the texts of the current dataset.
+            pipelines (list) : the fingerprints of the pipelines to keep.
+
+        Returns:
+            removed (int) : the number of entries removed.
+
+        """
+        with self._connection:
+            self._connection.execute(
+                "CREATE TEMP TABLE live (key BLOB PRIMARY KEY) WITHOUT ROWID"
+            )
+            self._connection.executemany(
+                "INSERT OR IGNORE INTO temp.live VALUES (?)",
+                ((text_key(text),) for text in texts),
+            )
+            removed = self._connection.execute(
+                "DELETE FROM processed WHERE key NOT IN (SELECT key FROM temp.live)"
+            ).rowcount
+            if pipelines is not None:
+                placeholders = ", ".join("?" * len(pipelines))
+                removed += self._connection.execute(
+                    f"DELETE FROM processed WHERE pipeline NOT IN ({placeholders})",
+                    tuple(pipelines),
+                ).rowcount
+            self._connection.execute("DROP TABLE temp.live")
+        self._connection.execute("VACUUM")
+        self.stats.evictions += removed
+        return removed
+
+    def __len__(self) -> int:
+        return self._connection.execute("SELECT COUNT(*) FROM processed").fetchone()[0]
+
+    def pipelines(self) -> dict:
+        """Returns the number of entries of each pipeline fingerprint."""
+        return dict(
+            self._connection.execute(
+                "SELECT pipeline, COUNT(*) FROM processed GROUP BY pipeline"
+            )
+        )
+
+    def close(self):
+        self._connection.close()
+
+    def __enter__(self) -> "PreprocessingCache":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def main():
+    """Inspect or garbage-collect a preprocessing cache"""
+    from src.dataset import read_table
+    from src.text.pipelines import PIPELINE_PROCESSORS, get_pipeline
+
+    parser = argparse.ArgumentParser(description="Manage a preprocessing cache.")
+    parser.add_argument("cache_file")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("stats", help="count the entries of each pipeline")
+    gc_parser = commands.add_parser(
+        "gc",
+        help="remove the entries of rows no longer in the dataset and of "
+        "outdated pipelines",
+    )
+    gc_parser.add_argument("dataset_file")
+    args = parser.parse_args()
+
+    with PreprocessingCache(args.cache_file) as cache:
+        if args.command == "gc":
+            texts = read_table(args.dataset_file, columns=["text"])["text"]
+            current = [get_pipeline(name).fingerprint() for name in PIPELINE_PROCESSORS]
+            removed = cache.collect_garbage(texts, current)
+            print(f"Removed {removed} entries.")
+        for pipeline, entries in cache.pipelines().items():
+            print(f"{pipeline}: {entries} entries")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,249 @@
+"""Binary store of pretrained word embeddings.
+
+GloVe-style text files (a word and its vector per line) are slow to parse
+and take several GB once held as a dictionary of arrays. They are
+converted once to a directory holding:
+
+- ``vectors.f32``, the vectors as a contiguous float32 matrix, one row per
+  word in the order of the text file,
+- ``keys.npy`` and ``rows.npy``, the sorted 64-bit hashes of the words and
+  the row of each, to look words up with a binary search,
+- ``words.txt``, the words, one per line, in the order of the rows,
+- ``meta.json``, the dimension, the number of words and the size and
+  modification time of the text file the store was converted from.
+
+The arrays are memory-mapped when a store is opened, so opening is
+instant and worker processes share the pages of the same store.
+"""
+import json
+import os
+from pathlib import Path
+from typing import Iterable, Iterator, List, Optional, Sequence, Union
+
+import numpy as np
+import pandas as pd
+
+PathLike = Union[str, Path]
+
+FORMAT_VERSION = 2
+_CONVERSION_BATCH = 10000
+_HASH_KEY = "misog-embeddings"
+
+
+def word_hashes(words: Sequence[str]) -> np.ndarray:
+    """Returns the 64-bit hashes the words are looked up by, computed
+    together in one vectorized call."""
+    return pd.util.hash_array(
+        np.array(words, dtype=object).reshape(-1), hash_key=_HASH_KEY, categorize=False
+    )
+
+
+def _source_identity(text_path: PathLike) -> dict:
+    stat = os.stat(text_path)
+    return dict(size=stat.st_size, mtime_ns=stat.st_mtime_ns)
+
+
+class EmbeddingStore:
+    """Word embeddings memory-mapped from a store directory.
+
+    Behaves like the dictionary of vectors get_embeddings used to return:
+    store.get(word), store[word], word in store and len(store).
+
+    Args:
+        directory (str or Path) : the store directory, see convert.
+
+    """
+
+    def __init__(self, directory: PathLike):
+        self.directory = Path(directory)
+        with open(self.directory / "meta.json") as file:
+            self.meta = json.load(file)
+        if self.meta["format_version"] != FORMAT_VERSION:
+            raise ValueError(
+                f"{self.directory} has format version {self.meta['format_version']},"
+                f" expected {FORMAT_VERSION}: convert the embeddings again."
+            )
+        self.dimension: int = self.meta["dimension"]
+        self.keys = np.load(self.directory / "keys.npy", mmap_mode="r")
+        self.rows = np.load(self.directory / "rows.npy", mmap_mode="r")
+        if self.meta["words"]:
+            self.vectors = np.memmap(
+                self.directory / "vectors.f32",
+                dtype=np.float32,
+                mode="r",
+                shape=(self.meta["words"], self.dimension),
+            )
+        else:
+            self.vectors = np.empty((0, self.dimension), dtype=np.float32)
+
+    @classmethod
+    def convert(cls, text_path: PathLike, directory: PathLike) -> "EmbeddingStore":
+        """Converts a GloVe-style text file to a store and opens it.
+
+        Lines hold a word followed by the values of its vector, separated by
+        spaces. A first line holding only two numbers (the word2vec header)
+        is skipped. Words may contain spaces, since the vector is read from
+        the end of the line. When a word appears twice, its last vector is
+        kept, as the dictionary did.
+
+        Args:
+            text_path (str or Path) : the text file.
+            directory (str or Path) : the store directory, created if needed.
+
+        Returns:
+            store (EmbeddingStore) : the converted store.
+
+        """
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        # The metadata is written last: without it, an interrupted conversion
+        # is never mistaken for a complete store.
+        if (directory / "meta.json").exists():
+            (directory / "meta.json").unlink()
+        dimension: Optional[int] = None
+        hashes: List[np.ndarray] = []
+        with open(text_path, encoding="utf-8") as source, open(
+            directory / "vectors.f32", "wb"
+        ) as vectors_file, open(
+            directory / "words.txt", "w", encoding="utf-8"
+        ) as words_file:
+            for lines in _batches(source):
+                if dimension is None:
+                    first = lines[0].split(" ")
+                    if _is_word2vec_header(first):
+                        # word2vec header: number of words and dimension.
+                        lines = lines[1:]
+                        dimension = int(first[1])
+                    else:
+                        dimension = len(first) - 1
+                    if not lines:
+                        continue
+                words, values = [], []
+                for line in lines:
+                    fields = line.rsplit(" ", dimension)
+                    if len(fields) <= dimension:
+                        raise ValueError(
+                            f"{text_path}: expected a word and {dimension} values, "
+                            f"got {line[:50]!r}."
+                        )
+                    words.append(fields[0])
+                    values.extend(fields[1:])
+                vectors = np.array(values, dtype=np.float32).reshape(-1, dimension)
+                vectors.tofile(vectors_file)
+                words_file.writelines(word + "\n" for word in words)
+                hashes.append(word_hashes(words))
+
+        keys = np.concatenate(hashes) if hashes else np.empty(0, dtype=np.uint64)
+        # Sort by key, the last row of each word first, and keep that row.
+        order = np.lexsort((-np.arange(len(keys)), keys))
+        keys = keys[order]
+        first = np.ones(len(keys), dtype=bool)
+        first[1:] = keys[1:] != keys[:-1]
+        np.save(directory / "keys.npy", keys[first])
+        np.save(directory / "rows.npy", order[first].astype(np.int64))
+        meta = dict(
+            format_version=FORMAT_VERSION,
+            dimension=dimension or 0,
+            words=len(keys),
+            source=str(text_path),
+            **_source_identity(text_path),
+        )
+        with open(directory / "meta.json", "w") as file:
+            json.dump(meta, file, indent=4)
+        return cls(directory)
+
+    @classmethod
+    def open(
+        cls, text_path: PathLike, directory: Optional[PathLike] = None
+    ) -> "EmbeddingStore":
+        """Opens the store of a text file, converting the file first if it has
+        no store yet or changed since it was converted.
+
+        Args:
+            text_path (str or Path) : the text file.
+            directory (str or Path) : the store directory, by default next to
+            the text file with a .store extension.
+
+        Returns:
+            store (EmbeddingStore) : the store.
+
+        """
+        if directory is None:
+            directory = Path(text_path).with_suffix(".store")
+        meta_path = Path(directory) / "meta.json"
+        if meta_path.exists():
+            with open(meta_path) as file:
+                meta = json.load(file)
+            identity = _source_identity(text_path)
+            if meta.get("format_version") == FORMAT_VERSION and all(
+                meta.get(name) == value for name, value in identity.items()
+            ):
+                return cls(directory)
+        return cls.convert(text_path, directory)
+
+    @property
+    def identity(self) -> str:
+        """Returns what identifies the content of the store, for cache keys."""
+        return (
+            f"{self.meta['source']}:{self.meta['size']}:{self.meta['mtime_ns']}:"
+            f"{self.meta['words']}x{self.dimension}"
+        )
+
+    def rows_of(self, words: Iterable[str]) -> np.ndarray:
+        """Returns the row of the vector of each word, -1 for the words
+        without one."""
+        hashes = word_hashes(list(words))
+        rows = np.full(len(hashes), -1, dtype=np.int64)
+        if not len(self.keys) or not len(hashes):
+            return rows
+        positions = np.minimum(np.searchsorted(self.keys, hashes), len(self.keys) - 1)
+        found = self.keys[positions] == hashes
+        rows[found] = self.rows[positions[found]]
+        return rows
+
+    def get(self, word: str, default=None) -> Optional[np.ndarray]:
+        row = self.rows_of([word])[0]
+        return self.vectors[row] if row >= 0 else default
+
+    def __getitem__(self, word: str) -> np.ndarray:
+        vector = self.get(word)
+        if vector is None:
+            raise KeyError(word)
+        return vector
+
+    def __contains__(self, word: str) -> bool:
+        return self.rows_of([word])[0] >= 0
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def words(self) -> Iterator[str]:
+        """Yields the words of the store, in the order of the text file."""
+        with open(self.directory / "words.txt", encoding="utf-8") as file:
+            for line in file:
+                yield line[:-1]
+
+
+def _is_word2vec_header(fields: List[str]) -> bool:
+    """Tells whether the fields of the first line are a word2vec header, two
+    integers, rather than a word with a one dimensional vector."""
+    if len(fields) != 2:
+        return False
+    try:
+        int(fields[0]), int(fields[1])
+    except ValueError:
+        return False
+    return True
+
+
+def _batches(lines: Iterable[str]) -> Iterator[List[str]]:
+    batch: List[str] = []
+    for line in lines:
+        line = line.rstrip(" \r\n")
+        if line:
+            batch.append(line)
+        if len(batch) == _CONVERSION_BATCH:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
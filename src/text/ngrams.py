@@ -0,0 +1,406 @@
+"""Corpus-level n-gram counting in bounded memory.
+
+create_ngrams and count_top_10_most_common_ngrams build every n-gram of a
+tweet as a string and count them exactly, which does not scale to a whole
+corpus. NgramCounter streams the tweets instead: n-grams are identified by
+64-bit hashes combined from the hashes of their tokens, so their strings
+are never built, except for the few n-grams reported.
+
+Two approximate summaries are kept:
+
+- a Space-Saving summary of the most frequent n-grams, holding at most
+  `capacity` n-grams. Counts are overestimated by at most the error
+  reported with them, and every n-gram more frequent than the total count
+  divided by the capacity is guaranteed to be in it.
+- a Count-Min Sketch, answering the count of any n-gram, overestimated by
+  at most a small fraction of the total count with high probability.
+
+Both merge, so a corpus can be counted in parallel chunks:
+
+    counter = count_ngrams(dataframe["text"], ngram_number=2, n_jobs=-1)
+    counter.most_common(10)
+
+The tokens are those of create_ngrams: the lowercase tweet, with every
+character other than letters, digits and whitespace replaced by a space,
+split on spaces.
+"""
+
+import os
+import re
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Dict, Iterable, List, Optional, Sized, Tuple
+
+import numpy as np
+import pandas as pd
+
+_HASH_KEY = "misog-ngrams-key"
+_BOUNDARY = "\x00"
+# The characters create_ngrams replaces by spaces, except the separator of
+# the joined tweets.
+_NON_WORD_PATTERN = re.compile(r"[^a-zA-Z0-9\s\x00]")
+# The most chunks counted by each task of a worker process, so that the
+# sketch a worker sends back is amortized over many tweets.
+_CHUNKS_PER_TASK = 16
+_MULTIPLIER = np.uint64(0x9E3779B97F4A7C15)
+_BOUNDARY_HASH = pd.util.hash_array(
+    np.array([_BOUNDARY], dtype=object), hash_key=_HASH_KEY
+)[0]
+
+
+def _mix(hashes: np.ndarray) -> np.ndarray:
+    """Returns the splitmix64 finalizer of the hashes, spreading their bits."""
+    hashes = hashes ^ (hashes >> np.uint64(30))
+    hashes = hashes * np.uint64(0xBF58476D1CE4E5B9)
+    hashes = hashes ^ (hashes >> np.uint64(27))
+    hashes = hashes * np.uint64(0x94D049BB133111EB)
+    return hashes ^ (hashes >> np.uint64(31))
+
+
+def tweet_tokens(tweets: List[str]) -> List[str]:
+    """Returns the tokens of the tweets, each tweet followed by a boundary
+    token, with the tokenization of create_ngrams."""
+    joined = _BOUNDARY.join(tweets)
+    if joined.count(_BOUNDARY) != len(tweets) - 1:
+        tokens: List[str] = []
+        for tweet in tweets:
+            tweet = re.sub(r"[^a-zA-Z0-9\s]", " ", tweet.lower())
+            tokens.extend(token for token in tweet.split(" ") if token != "")
+            tokens.append(_BOUNDARY)
+        return tokens
+    joined = _NON_WORD_PATTERN.sub(" ", joined.lower())
+    joined = joined.replace(_BOUNDARY, f" {_BOUNDARY} ") + f" {_BOUNDARY}"
+    return [token for token in joined.split(" ") if token != ""]
+
+
+def ngram_hashes(tokens: List[str], ngram_number: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Returns the hashes of the n-grams of tokenized tweets, without joining
+    their tokens.
+
+    Args:
+        tokens (list) : the tokens, each tweet followed by a boundary token.
+        ngram_number (int) : the number of grams, 2 = bigram, 3 = trigram.
+
+    Returns:
+        hashes (numpy array) : the uint64 hash of each n-gram.
+        starts (numpy array) : the position of the first token of each
+        n-gram in tokens.
+
+    """
+    if len(tokens) < ngram_number:
+        return np.empty(0, dtype=np.uint64), np.empty(0, dtype=np.int64)
+    token_array = np.array(tokens, dtype=object)
+    token_hashes = pd.util.hash_array(token_array, hash_key=_HASH_KEY)
+    # Comparing the tokens to the boundary itself would not work: NumPy
+    # strips the trailing NUL of a string scalar.
+    is_boundary = token_hashes == _BOUNDARY_HASH
+    tweet_ids = np.cumsum(is_boundary)
+    windows = len(tokens) - ngram_number + 1
+    valid = ~is_boundary[:windows] & (
+        tweet_ids[:windows] == tweet_ids[ngram_number - 1 :]
+    )
+    combined = np.zeros(windows, dtype=np.uint64)
+    for offset in range(ngram_number):
+        combined = combined * _MULTIPLIER + token_hashes[offset : offset + windows]
+    starts = np.flatnonzero(valid)
+    return _mix(combined[starts]), starts
+
+
+class SpaceSaving:
+    """Space-Saving summary of the most frequent items of a stream of
+    hashes, updated and merged a batch at a time.
+
+    Args:
+        capacity (int) : the maximum number of items tracked.
+
+    """
+
+    def __init__(self, capacity: int = 10000):
+        self.capacity = capacity
+        self.keys = np.empty(0, dtype=np.uint64)
+        self.counts = np.empty(0, dtype=np.int64)
+        self.errors = np.empty(0, dtype=np.int64)
+        # An upper bound of the count of every item not tracked.
+        self.floor = 0
+
+    def update(self, keys: np.ndarray, counts: np.ndarray):
+        """Adds exact counts of distinct items."""
+        batch = SpaceSaving(len(keys))
+        batch.keys = np.asarray(keys, dtype=np.uint64)
+        batch.counts = np.asarray(counts, dtype=np.int64)
+        batch.errors = np.zeros(len(keys), dtype=np.int64)
+        self.merge(batch)
+
+    def merge(self, other: "SpaceSaving"):
+        """Adds the counts of another summary to this one."""
+        keys = np.concatenate([self.keys, other.keys])
+        counts = np.concatenate([self.counts, other.counts])
+        errors = np.concatenate([self.errors, other.errors])
+        # Items tracked by one summary only may have been counted by the
+        # other up to its floor.
+        in_self = np.concatenate(
+            [np.ones(len(self.keys), bool), np.zeros(len(other.keys), bool)]
+        )
+        unique, inverse = np.unique(keys, return_inverse=True)
+        inverse = inverse.reshape(-1)
+        merged_counts = np.bincount(inverse, counts, len(unique)).astype(np.int64)
+        merged_errors = np.bincount(inverse, errors, len(unique)).astype(np.int64)
+        tracked_by_self = np.bincount(inverse, in_self, len(unique)) > 0
+        tracked_by_other = np.bincount(inverse, ~in_self, len(unique)) > 0
+        missing = np.where(~tracked_by_self, self.floor, 0) + np.where(
+            ~tracked_by_other, other.floor, 0
+        )
+        merged_counts += missing
+        merged_errors += missing
+
+        floor = self.floor + other.floor
+        if len(unique) > self.capacity:
+            order = np.argsort(-merged_counts, kind="stable")
+            floor = max(floor, int(merged_counts[order[self.capacity]]))
+            keep = np.sort(order[: self.capacity])
+            unique = unique[keep]
+            merged_counts = merged_counts[keep]
+            merged_errors = merged_errors[keep]
+        self.keys, self.counts, self.errors = unique, merged_counts, merged_errors
+        self.floor = floor
+
+    def top(self, k: int) -> List[Tuple[int, int, int]]:
+        """Returns the k items with the largest counts, as (key, count,
+        error) tuples, the true count being between count - error and
+        count."""
+        order = np.argsort(-self.counts, kind="stable")[:k]
+        return [
+            (int(self.keys[i]), int(self.counts[i]), int(self.errors[i])) for i in order
+        ]
+
+
+class CountMinSketch:
+    """Count-Min Sketch of the counts of a stream of hashes.
+
+    Args:
+        width (int) : the number of counters per row. Counts are
+        overestimated by about e / width of the total count.
+        depth (int) : the number of rows. The bound holds with probability
+        1 - exp(-depth).
+
+    """
+
+    def __init__(self, width: int = 2**18, depth: int = 4):
+        self.width = width
+        self.depth = depth
+        self.table = np.zeros((depth, width), dtype=np.int64)
+        self.total = 0
+
+    def _columns(self, keys: np.ndarray) -> np.ndarray:
+        keys = np.asarray(keys, dtype=np.uint64)
+        return np.stack(
+            [
+                (
+                    _mix(keys ^ _mix(np.full(1, row + 1, dtype=np.uint64)))
+                    % np.uint64(self.width)
+                ).astype(np.int64)
+                for row in range(self.depth)
+            ]
+        )
+
+    def update(self, keys: np.ndarray, counts: np.ndarray):
+        """Adds counts of items."""
+        counts = np.asarray(counts, dtype=np.int64)
+        for row, columns in enumerate(self._columns(keys)):
+            np.add.at(self.table[row], columns, counts)
+        self.total += int(counts.sum())
+
+    def estimate(self, keys: np.ndarray) -> np.ndarray:
+        """Returns the estimated count of each item."""
+        columns = self._columns(keys)
+        if not columns.shape[1]:
+            return np.empty(0, dtype=np.int64)
+        return np.min(
+            [self.table[row, columns[row]] for row in range(self.depth)], axis=0
+        )
+
+    def merge(self, other: "CountMinSketch"):
+        if (self.width, self.depth) != (other.width, other.depth):
+            raise ValueError("Only sketches of the same width and depth merge.")
+        self.table += other.table
+        self.total += other.total
+
+
+class NgramCounter:
+    """Approximate counts of the n-grams of a stream of tweets, in bounded
+    memory.
+
+    Args:
+        ngram_number (int) : the number of grams, 2 = bigram, 3 = trigram.
+        capacity (int) : the number of frequent n-grams tracked, at least the
+        k of most_common.
+        sketch_width (int) : the width of the Count-Min Sketch.
+        sketch_depth (int) : the depth of the Count-Min Sketch.
+        chunksize (int) : the number of tweets processed at a time.
+
+    """
+
+    def __init__(
+        self,
+        ngram_number: int = 2,
+        capacity: int = 10000,
+        sketch_width: int = 2**18,
+        sketch_depth: int = 4,
+        chunksize: int = 10000,
+    ):
+        self.ngram_number = ngram_number
+        self.chunksize = chunksize
+        self.heavy_hitters = SpaceSaving(capacity)
+        self.sketch = CountMinSketch(sketch_width, sketch_depth)
+        self.strings: Dict[int, str] = {}
+
+    def update(self, tweets: Iterable[str]) -> "NgramCounter":
+        """Counts the n-grams of the tweets."""
+        chunk: List[str] = []
+        for tweet in tweets:
+            chunk.append(tweet)
+            if len(chunk) == self.chunksize:
+                self._update_chunk(chunk)
+                chunk = []
+        if chunk:
+            self._update_chunk(chunk)
+        return self
+
+    def _update_chunk(self, tweets: List[str]):
+        tokens = tweet_tokens(tweets)
+        hashes, starts = ngram_hashes(tokens, self.ngram_number)
+        keys, first, counts = np.unique(hashes, return_index=True, return_counts=True)
+        self.sketch.update(keys, counts)
+        self.heavy_hitters.update(keys, counts)
+        # Only the n-grams newly tracked are turned into strings.
+        tracked = self.heavy_hitters.keys
+        new = tracked[~np.isin(tracked, np.fromiter(self.strings, np.uint64))]
+        new_starts = starts[first[np.searchsorted(keys, new)]]
+        strings = {
+            key: self.strings[key] for key in tracked.tolist() if key in self.strings
+        }
+        for key, start in zip(new.tolist(), new_starts.tolist()):
+            strings[key] = " ".join(tokens[start : start + self.ngram_number])
+        self.strings = strings
+
+    @property
+    def total(self) -> int:
+        """Returns the number of n-grams counted."""
+        return self.sketch.total
+
+    def most_common(self, k: int = 10) -> List[Tuple[str, int]]:
+        """Returns the k most frequent n-grams and their estimated counts, as
+        Counter.most_common does."""
+        top = self.heavy_hitters.top(k)
+        if not top:
+            return []
+        keys = np.array([key for key, _, _ in top], dtype=np.uint64)
+        sketched = self.sketch.estimate(keys)
+        counts = [min(count, int(other)) for (_, count, _), other in zip(top, sketched)]
+        order = sorted(range(len(top)), key=lambda i: -counts[i])
+        return [(self.strings[top[i][0]], counts[i]) for i in order]
+
+    def count(self, ngram: str) -> int:
+        """Returns the estimated count of an n-gram, given as its tokens
+        joined by spaces."""
+        tokens = ngram.split(" ") + [_BOUNDARY]
+        hashes, _ = ngram_hashes(tokens, self.ngram_number)
+        if len(hashes) != 1:
+            raise ValueError(f"{ngram!r} is not a {self.ngram_number}-gram.")
+        return int(self.sketch.estimate(hashes)[0])
+
+    def merge(self, other: "NgramCounter") -> "NgramCounter":
+        """Adds the counts of another counter, e.g. of another worker."""
+        if other.ngram_number != self.ngram_number:
+            raise ValueError("Only counters of the same n-grams merge.")
+        self.sketch.merge(other.sketch)
+        self.heavy_hitters.merge(other.heavy_hitters)
+        strings = {**other.strings, **self.strings}
+        self.strings = {key: strings[key] for key in self.heavy_hitters.keys.tolist()}
+        return self
+
+
+def _count_chunk(arguments) -> NgramCounter:
+    tweets, options = arguments
+    return NgramCounter(**options).update(tweets)
+
+
+def count_ngrams(
+    tweets: Iterable[str],
+    ngram_number: int = 2,
+    capacity: int = 10000,
+    n_jobs: int = 1,
+    chunksize: int = 10000,
+    sketch_width: int = 2**18,
+    sketch_depth: int = 4,
+    tweets_per_task: Optional[int] = None,
+) -> NgramCounter:
+    """Returns the n-gram counter of a corpus, counted in chunks spread over
+    worker processes and merged.
+
+    Args:
+        tweets (iterable) : the tweets, e.g. a pandas series.
+        ngram_number (int) : the number of grams, 2 = bigram, 3 = trigram.
+        capacity (int) : the number of frequent n-grams tracked.
+        n_jobs (int) : the number of worker processes, -1 for one per CPU.
+        chunksize (int) : the number of tweets counted at a time.
+        sketch_width (int) : the width of the Count-Min Sketch.
+        sketch_depth (int) : the depth of the Count-Min Sketch.
+        tweets_per_task (int) : the number of tweets sent to a worker at a
+        time, by default 16 chunks, or fewer when the tweets have a length
+        and would not keep every worker busy.
+
+    Returns:
+        counter (NgramCounter) : the counts of the n-grams.
+
+    """
+    options = dict(
+        ngram_number=ngram_number,
+        capacity=capacity,
+        sketch_width=sketch_width,
+        sketch_depth=sketch_depth,
+        chunksize=chunksize,
+    )
+    if n_jobs == -1:
+        n_jobs = os.cpu_count() or 1
+    if n_jobs < 1:
+        raise ValueError(f"n_jobs must be -1 or at least 1, got {n_jobs}.")
+    counter = NgramCounter(**options)
+    if n_jobs == 1:
+        return counter.update(tweets)
+    if tweets_per_task is None:
+        tweets_per_task = _tweets_per_task(tweets, n_jobs, chunksize)
+
+    def chunks():
+        chunk: List[str] = []
+        for tweet in tweets:
+            chunk.append(tweet)
+            if len(chunk) == tweets_per_task:
+                yield chunk, options
+                chunk = []
+        if chunk:
+            yield chunk, options
+
+    # At most this many chunks are counted or waiting to be merged at a
+    # time, so that neither the tweets nor the partial counters pile up.
+    max_pending = 2 * n_jobs
+    with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+        pending = set()
+        for chunk in chunks():
+            if len(pending) == max_pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    counter.merge(future.result())
+            pending.add(executor.submit(_count_chunk, chunk))
+        for future in pending:
+            counter.merge(future.result())
+    return counter
+
+
+def _tweets_per_task(tweets: Iterable[str], n_jobs: int, chunksize: int) -> int:
+    """Returns the number of tweets sent to a worker at a time: as many as
+    _CHUNKS_PER_TASK chunks, but no more than an equal share of the tweets
+    per worker when their number is known."""
+    tweets_per_task = chunksize * _CHUNKS_PER_TASK
+    if isinstance(tweets, Sized):
+        tweets_per_task = min(tweets_per_task, -(-len(tweets) // n_jobs))
+    return max(tweets_per_task, 1)
@@ -1,90 +1,371 @@
-from typing import List, Callable
+import functools
+import hashlib
+import inspect
+import os
+import sys
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import TYPE_CHECKING, Callable, Dict, Iterable, List, Optional, Tuple
 
 import pandas as pd
 
 from src.text.utils import (
+    clean_tweet,
+    clean_tweet_batch,
     contractions_unpacker,
     tokenizer,
     punctuation_cleaner,
     remove_stopwords,
     lowercase,
-    normalizer,
+    normalize_tweet,
+    contractions_unpacker_batch,
+    punctuation_cleaner_batch,
+    lowercase_batch,
+    get_social_tokenizer,
+    get_text_preprocessor,
 )
+from src.text.profiling import ProfileReport, timed
+
+if TYPE_CHECKING:
+    from src.text.cache import PreprocessingCache
+
+
+Processor = Callable[[str], str]
+BatchProcessor = Callable[[pd.Series], pd.Series]
 
 
 class TextPreProcessingPipeline:
     def __init__(self):
-        self._processors: List[Callable[[str], str]] = []
+        self._processors: List[Tuple[Processor, Optional[BatchProcessor]]] = []
+        self._fingerprint: Optional[str] = None
+
+    def register_processor(
+        self, method: Processor, batch_method: Optional[BatchProcessor] = None
+    ):
+        """Adds a processor at the end of the pipeline.
+
+        Args:
+            method (callable) : processes a single text.
+            batch_method (callable) : optional equivalent of method processing
+            a whole series of texts at once, used by process_batch.
+
+        """
+        self._processors.append((method, batch_method))
+        self._fingerprint = None
 
-    def register_processor(self, method: Callable[[str], str]):
-        self._processors.append(method)
+    def fingerprint(self) -> str:
+        """Returns a hash of what the pipeline does: the names of its
+        processors and the source code of the modules defining them. Texts
+        processed by a pipeline are only reused from a PreprocessingCache by
+        pipelines with the same fingerprint."""
+        if self._fingerprint is None:
+            digest = hashlib.blake2b(digest_size=16)
+            for processor, batch_processor in self._processors:
+                for method in (processor, batch_processor):
+                    digest.update(_code_identity(method).encode("utf-8"))
+            self._fingerprint = digest.hexdigest()
+        return self._fingerprint
 
-    def process_text(self, text):
-        for processor in self._processors:
+    def process_text(self, text, report: Optional[ProfileReport] = None):
+        """Returns the processed text, recording the time spent in each
+        processor in report if one is given."""
+        if report is not None:
+            return self._profile_text(text, report)
+        for processor, _ in self._processors:
             text = processor(text)
 
         return text
 
+    def _profile_text(self, text, report: ProfileReport):
+        for processor, _ in self._unfused_processors():
+            text = timed(report, processor.__name__, processor, text, 1, len(text))
+
+        return text
+
+    def process_batch(
+        self,
+        texts: Iterable[str],
+        n_jobs: int = 1,
+        chunksize: Optional[int] = None,
+        report: Optional[ProfileReport] = None,
+        cache: Optional["PreprocessingCache"] = None,
+    ) -> pd.Series:
+        """Returns the processed texts, running each processor over the whole
+        batch before moving on to the next one. Processors with a batch
+        method process the batch in one call, the others text by text.
+
+        Args:
+            texts (iterable) : the texts to process, e.g. a pandas series.
+            n_jobs (int) : the number of worker processes to spread the texts
+            over, -1 meaning one per CPU. The output is the same whatever
+            the number of workers.
+            chunksize (int) : the number of texts sent to a worker at a time,
+            by default enough for four chunks per worker.
+            report (ProfileReport) : optional report recording the time spent
+            in each processor, summed over the workers.
+            cache (PreprocessingCache) : optional cache of processed texts.
+            Only the texts not found in it are processed, and then added.
+
+        Returns:
+            processed (pandas series) : the processed texts, with the index
+            of texts if it was a series.
+
+        """
+        batch = texts if isinstance(texts, pd.Series) else pd.Series(list(texts))
+        batch = batch.astype(object)
+        if cache is not None:
+            return self._process_with_cache(batch, cache, n_jobs, chunksize, report)
+        if n_jobs == -1:
+            n_jobs = os.cpu_count() or 1
+        if n_jobs < 1:
+            raise ValueError(f"n_jobs must be -1 or at least 1, got {n_jobs}.")
+        if n_jobs == 1 or len(batch) < 2:
+            if report is None:
+                return self._process_chunk(batch)
+            processed, chunk_report = self._profile_chunk(batch)
+            report.merge(chunk_report)
+            return processed
+
+        if chunksize is None:
+            chunksize = -(-len(batch) // (4 * n_jobs))
+        chunks = [
+            batch.iloc[start : start + chunksize]
+            for start in range(0, len(batch), chunksize)
+        ]
+        with ProcessPoolExecutor(max_workers=min(n_jobs, len(chunks))) as executor:
+            if report is None:
+                return pd.concat(list(executor.map(self._process_chunk, chunks)))
+            processed = []
+            for chunk, chunk_report in executor.map(self._profile_chunk, chunks):
+                processed.append(chunk)
+                report.merge(chunk_report)
+            return pd.concat(processed)
+
+    def _process_with_cache(
+        self, batch: pd.Series, cache: "PreprocessingCache", n_jobs, chunksize, report
+    ) -> pd.Series:
+        fingerprint = self.fingerprint()
+        processed = cache.get_many(fingerprint, batch)
+        missing = processed.isna().to_numpy()
+        if missing.any():
+            new = self.process_batch(batch[missing], n_jobs, chunksize, report)
+            cache.put_many(fingerprint, batch[missing], new)
+            processed[missing] = new.to_numpy()
+        return processed
+
+    def _process_chunk(self, batch: pd.Series) -> pd.Series:
+        for processor, batch_processor in self._processors:
+            if batch_processor is None:
+                batch = batch.map(processor)
+            else:
+                batch = batch_processor(batch)
+
+        return batch
+
+    def _profile_chunk(self, batch: pd.Series) -> Tuple[pd.Series, ProfileReport]:
+        """Processes a chunk like _process_chunk, timing each processor."""
+        report = ProfileReport()
+        for processor, batch_processor in self._unfused_processors():
+            if batch_processor is None:
+                batch_processor = functools.partial(_map, processor=processor)
+            batch = timed(
+                report,
+                processor.__name__,
+                batch_processor,
+                batch,
+                len(batch),
+                int(batch.str.len().sum()),
+            )
+
+        return batch, report
+
+    def _unfused_processors(self) -> List[Tuple[Processor, Optional[BatchProcessor]]]:
+        """Returns the processors with the fused ones replaced by the
+        processors they do the work of, which give the same texts. Profiled
+        runs use them so that the report times each stage separately."""
+        processors: List[Tuple[Processor, Optional[BatchProcessor]]] = []
+        for processor, batch_processor in self._processors:
+            if processor in FUSED_PROCESSORS:
+                processors.extend(
+                    (stage, BATCH_PROCESSORS.get(stage))
+                    for stage in FUSED_PROCESSORS[processor]
+                )
+            else:
+                processors.append((processor, batch_processor))
+        return processors
+
+
+def _map(batch: pd.Series, processor: Processor) -> pd.Series:
+    return batch.map(processor)
 
-def clean(dataframe: pd.DataFrame) -> pd.DataFrame:
+
+@functools.lru_cache(maxsize=None)
+def _code_identity(method: Optional[Callable]) -> str:
+    """Returns the qualified name of a function and the source code of its
+    module, which changes whenever the function or what it uses does."""
+    if method is None:
+        return ""
+    module = sys.modules.get(getattr(method, "__module__", ""), None)
+    try:
+        source = inspect.getsource(module) if module is not None else ""
+    except (OSError, TypeError):
+        source = ""
+    source_hash = hashlib.blake2b(source.encode("utf-8"), digest_size=16).hexdigest()
+    name = getattr(method, "__qualname__", repr(method))
+    return f"{getattr(method, '__module__', '')}.{name}:{source_hash}"
+
+
+PIPELINE_PROCESSORS: Dict[str, List[Processor]] = {
+    "clean": [clean_tweet],
+    "normalize": [clean_tweet, normalize_tweet],
+    "tokenize": [contractions_unpacker, tokenizer, lowercase],
+}
+
+# The processors a fused processor does the work of, in order.
+FUSED_PROCESSORS: Dict[Processor, List[Processor]] = {
+    clean_tweet: [
+        contractions_unpacker,
+        tokenizer,
+        punctuation_cleaner,
+        remove_stopwords,
+        lowercase,
+    ],
+}
+
+BATCH_PROCESSORS: Dict[Processor, BatchProcessor] = {
+    clean_tweet: clean_tweet_batch,
+    contractions_unpacker: contractions_unpacker_batch,
+    punctuation_cleaner: punctuation_cleaner_batch,
+    lowercase: lowercase_batch,
+}
+
+_pipelines: Dict[str, TextPreProcessingPipeline] = {}
+_pipelines_lock = threading.Lock()
+
+
+def get_pipeline(name: str) -> TextPreProcessingPipeline:
+    """Returns the named preprocessing pipeline, built once per process.
+
+    The pipeline is shared by every caller, so processors must not be
+    registered on it.
+
+    Args:
+        name (str) : one of "clean", "normalize" or "tokenize".
+
+    Returns:
+        pipeline (TextPreProcessingPipeline) : the preprocessing pipeline.
+
+    """
+    if name not in PIPELINE_PROCESSORS:
+        raise ValueError(
+            f"Unknown pipeline {name!r}, expected one of {sorted(PIPELINE_PROCESSORS)}."
+        )
+    pipeline = _pipelines.get(name)
+    if pipeline is None:
+        with _pipelines_lock:
+            pipeline = _pipelines.get(name)
+            if pipeline is None:
+                pipeline = TextPreProcessingPipeline()
+                for processor in PIPELINE_PROCESSORS[name]:
+                    pipeline.register_processor(
+                        processor, BATCH_PROCESSORS.get(processor)
+                    )
+                _pipelines[name] = pipeline
+    return pipeline
+
+
+def build_pipelines(normalizer: bool = True) -> None:
+    """Builds every named pipeline and the tokenizer and normalizer they
+    share, so that the first tweets processed do not pay for it.
+
+    Args:
+        normalizer (bool) : whether to also build the ekphrasis normalizer,
+        which loads word statistics from disk.
+
+    """
+    for name in PIPELINE_PROCESSORS:
+        get_pipeline(name)
+    get_social_tokenizer()
+    if normalizer:
+        get_text_preprocessor()
+
+
+def clean(
+    dataframe: pd.DataFrame,
+    n_jobs: int = 1,
+    report: Optional[ProfileReport] = None,
+    cache: Optional["PreprocessingCache"] = None,
+) -> pd.DataFrame:
     """Returns cleaned text.
 
           Args
               df (pandas df) : the dataframe with the tweets under a column
               labeled text.
+              n_jobs (int) : the number of worker processes, -1 for one per CPU.
+              report (ProfileReport) : optional report of the time spent in each
+              processor.
+              cache (PreprocessingCache) : optional cache of processed tweets, only
+              the tweets not in it are processed.
 
           Returns
               df (pandas df) : the cleaned tweets under the column cleaned.
 
     """
-    pipeline = TextPreProcessingPipeline()
-    pipeline.register_processor(contractions_unpacker)
-    pipeline.register_processor(tokenizer)
-    pipeline.register_processor(punctuation_cleaner)
-    pipeline.register_processor(remove_stopwords)
-    pipeline.register_processor(lowercase)
-
-    dataframe["cleaned"] = dataframe["text"].apply(pipeline.process_text)
+    dataframe["cleaned"] = get_pipeline("clean").process_batch(
+        dataframe["text"], n_jobs=n_jobs, report=report, cache=cache
+    )
     return dataframe
 
 
-def normalize(dataframe: pd.DataFrame) -> pd.DataFrame:
+def normalize(
+    dataframe: pd.DataFrame,
+    n_jobs: int = 1,
+    report: Optional[ProfileReport] = None,
+    cache: Optional["PreprocessingCache"] = None,
+) -> pd.DataFrame:
     """Returns normalized text.
 
     Args
         df (pandas df) : the dataframe with the tweets under a column
         labeled text.
+        n_jobs (int) : the number of worker processes, -1 for one per CPU.
+        report (ProfileReport) : optional report of the time spent in each
+        processor.
+        cache (PreprocessingCache) : optional cache of processed tweets, only
+        the tweets not in it are processed.
 
     Returns
         df (pandas df) : the normalized tweets under the column normalized.
 
     """
-    pipeline = TextPreProcessingPipeline()
-    pipeline.register_processor(contractions_unpacker)
-    pipeline.register_processor(tokenizer)
-    pipeline.register_processor(punctuation_cleaner)
-    pipeline.register_processor(remove_stopwords)
-    pipeline.register_processor(lowercase)
-
-    dataframe["normalized"] = normalizer(dataframe["text"].apply(pipeline.process_text))
+    dataframe["normalized"] = get_pipeline("normalize").process_batch(
+        dataframe["text"], n_jobs=n_jobs, report=report, cache=cache
+    )
     return dataframe
 
 
-def tokenize(dataframe: pd.DataFrame) -> pd.DataFrame:
+def tokenize(
+    dataframe: pd.DataFrame,
+    n_jobs: int = 1,
+    report: Optional[ProfileReport] = None,
+    cache: Optional["PreprocessingCache"] = None,
+) -> pd.DataFrame:
     """Returns tokenized text in string format.
 
        Args
            df (pandas df) : the dataframe with the tweets under a column
            labeled text.
+           n_jobs (int) : the number of worker processes, -1 for one per CPU.
+           report (ProfileReport) : optional report of the time spent in each
+           processor.
+           cache (PreprocessingCache) : optional cache of processed tweets, only
+           the tweets not in it are processed.
 
        Returns
            df (pandas df) : the tokenized tweets under the column tokenized.
 
     """
-    pipeline = TextPreProcessingPipeline()
-    pipeline.register_processor(contractions_unpacker)
-    pipeline.register_processor(tokenizer)
-    pipeline.register_processor(lowercase)
-
-    dataframe["tokenized"] = dataframe["text"].apply(pipeline.process_text)
+    dataframe["tokenized"] = get_pipeline("tokenize").process_batch(
+        dataframe["text"], n_jobs=n_jobs, report=report, cache=cache
+    )
     return dataframe
@@ -0,0 +1,178 @@
+"""Instrumentation of the preprocessing pipelines.
+
+Pass a ProfileReport to TextPreProcessingPipeline.process_text or
+process_batch (or to clean, normalize and tokenize) to record, for each
+processor, the time spent in it, how many times it was called and how many
+texts and characters it processed:
+
+    report = ProfileReport()
+    normalize(dataframe, report=report)
+    print(report)
+
+Without a report the pipelines run uninstrumented. For a view below the
+processors, wrap the call in `profiler()`, which runs pyinstrument when it
+is installed and cProfile otherwise.
+"""
+import cProfile
+import pstats
+from contextlib import contextmanager
+from time import perf_counter
+from typing import Callable, Dict, Iterator, Optional, TypeVar
+
+_Batch = TypeVar("_Batch")
+
+
+class ProcessorStats:
+    """Cumulative measures of one processor."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.calls = 0
+        self.texts = 0
+        self.characters = 0
+        self.seconds = 0.0
+
+    @property
+    def microseconds_per_text(self) -> float:
+        return self.seconds / self.texts * 1e6 if self.texts else 0.0
+
+    @property
+    def characters_per_second(self) -> float:
+        return self.characters / self.seconds if self.seconds else 0.0
+
+    def as_dict(self) -> dict:
+        return dict(
+            calls=self.calls,
+            texts=self.texts,
+            characters=self.characters,
+            seconds=self.seconds,
+            microseconds_per_text=self.microseconds_per_text,
+        )
+
+    def __repr__(self) -> str:
+        return (
+            f"ProcessorStats({self.name!r}, calls={self.calls}, texts={self.texts}, "
+            f"characters={self.characters}, seconds={self.seconds:.6f})"
+        )
+
+
+class ProfileReport:
+    """Per-processor measures of the texts a pipeline processed, in the order
+    of the processors.
+
+    With several worker processes, each worker measures its own chunks and
+    the report sums them, so its times add up the time of every worker.
+    """
+
+    def __init__(self):
+        self.processors: Dict[str, ProcessorStats] = {}
+
+    def record(self, name: str, texts: int, characters: int, seconds: float):
+        stats = self.processors.get(name)
+        if stats is None:
+            stats = self.processors[name] = ProcessorStats(name)
+        stats.calls += 1
+        stats.texts += texts
+        stats.characters += characters
+        stats.seconds += seconds
+
+    def merge(self, other: "ProfileReport"):
+        """Adds the measures of another report to this one."""
+        for name, stats in other.processors.items():
+            mine = self.processors.get(name)
+            if mine is None:
+                mine = self.processors[name] = ProcessorStats(name)
+            mine.calls += stats.calls
+            mine.texts += stats.texts
+            mine.characters += stats.characters
+            mine.seconds += stats.seconds
+
+    @property
+    def seconds(self) -> float:
+        return sum(stats.seconds for stats in self.processors.values())
+
+    def as_dict(self) -> Dict[str, dict]:
+        return {name: stats.as_dict() for name, stats in self.processors.items()}
+
+    def __str__(self) -> str:
+        total = self.seconds
+        lines = [
+            f"{'processor':<28}{'calls':>8}{'texts':>10}{'chars':>12}"
+            f"{'time (s)':>10}{'us/text':>10}{'share':>8}"
+        ]
+        for stats in self.processors.values():
+            share = stats.seconds / total if total else 0.0
+            lines.append(
+                f"{stats.name:<28}{stats.calls:>8}{stats.texts:>10}"
+                f"{stats.characters:>12}{stats.seconds:>10.3f}"
+                f"{stats.microseconds_per_text:>10.1f}{share:>8.1%}"
+            )
+        return "\n".join(lines)
+
+
+def timed(
+    report: ProfileReport,
+    name: str,
+    process: Callable[[_Batch], _Batch],
+    batch: _Batch,
+    texts: int,
+    characters: int,
+) -> _Batch:
+    """Returns process(batch), recording its duration in the report."""
+    start = perf_counter()
+    processed = process(batch)
+    report.record(name, texts, characters, perf_counter() - start)
+    return processed
+
+
+@contextmanager
+def profiler(kind: Optional[str] = None, limit: int = 25) -> Iterator[object]:
+    """Profiles the enclosed block and prints where its time went.
+
+    Args:
+        kind (str) : "cprofile", or "pyinstrument" if it is installed. By
+        default pyinstrument when it is installed, cProfile otherwise.
+        limit (int) : the number of functions listed by cProfile.
+
+    Returns:
+        profiler (object) : the cProfile.Profile or pyinstrument.Profiler,
+        to inspect further once the block has run.
+
+    """
+    if kind is None:
+        kind = "pyinstrument" if _pyinstrument_installed() else "cprofile"
+    if kind == "cprofile":
+        profile = cProfile.Profile()
+        profile.enable()
+        try:
+            yield profile
+        finally:
+            profile.disable()
+        pstats.Stats(profile).sort_stats("cumulative").print_stats(limit)
+    elif kind == "pyinstrument":
+        try:
+            from pyinstrument import Profiler
+        except ImportError:
+            raise ImportError(
+                "pyinstrument is not installed, run `pip install pyinstrument` "
+                "or use the cprofile profiler."
+            )
+        profile = Profiler()
+        profile.start()
+        try:
+            yield profile
+        finally:
+            profile.stop()
+        print(profile.output_text(unicode=True))
+    else:
+        raise ValueError(
+            f"Unknown profiler {kind!r}, expected 'cprofile' or 'pyinstrument'."
+        )
+
+
+def _pyinstrument_installed() -> bool:
+    try:
+        import pyinstrument  # noqa: F401
+    except ImportError:
+        return False
+    return True
@@ -1,13 +1,75 @@
 import collections
+import functools
+import hashlib
+import json
 import re
+import threading
 from os.path import exists
-from typing import Dict, List, Tuple
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Tuple, TypeVar, Union
 
 import numpy as np
 import pandas as pd
 from ekphrasis.classes.preprocessor import TextPreProcessor
 from ekphrasis.classes.tokenizer import SocialTokenizer
 
+from src.text.embeddings import EmbeddingStore
+
+
+_Resource = TypeVar("_Resource")
+
+
+def _process_wide(factory: Callable[[], _Resource]) -> Callable[[], _Resource]:
+    """Turns a factory into an accessor that builds its resource on the
+    first call and then returns that same instance, from any thread.
+
+    Each resource has its own lock, so a factory may use the accessors of
+    other resources.
+    """
+    instance: List[_Resource] = []
+    lock = threading.Lock()
+
+    @functools.wraps(factory)
+    def accessor() -> _Resource:
+        if not instance:
+            with lock:
+                if not instance:
+                    instance.append(factory())
+        return instance[0]
+
+    return accessor
+
+
+@_process_wide
+def get_social_tokenizer() -> SocialTokenizer:
+    """Returns the process-wide social tokenizer used by `tokenizer`.
+
+    The tokenizer only holds compiled regular expressions, so it can be
+    shared between threads.
+    """
+    return SocialTokenizer(lowercase=False)
+
+
+@_process_wide
+def get_text_preprocessor() -> TextPreProcessor:
+    """Returns the process-wide ekphrasis preprocessor used to normalize
+    tweets. Building it loads its regular expressions and word statistics,
+    which is only done once per process.
+    """
+    return TextPreProcessor(
+        normalize=[
+            "url",
+            "email",
+            "percent",
+            "money",
+            "phone",
+            "user",
+            "time",
+            "date",
+            "hashtag",
+        ]
+    )
+
 
 def contractions_unpacker(tweet: str) -> str:
     """ Returns the contracted words within the tweet as unpacked
@@ -20,17 +82,50 @@ def contractions_unpacker(tweet: str) -> str:
           unpacked_tweet (str) : the unpacked tweet.
 
     """
-    contractions_list = contractions()
+    return _CONTRACTIONS_PATTERN.sub(_unpack_contraction, tweet)
 
-    pattern = re.compile(
-        r"\b(?:%s)\b" % "|".join(contractions_list.keys()), flags=re.IGNORECASE
-    )
 
-    def replace(match):
-        match = match.group(0).lower()
-        return contractions_list[match]
+def _unpack_contraction(match) -> str:
+    return _CONTRACTIONS[match.group(0).lower()]
+
+
+def _trie_pattern(words: Iterable[str]) -> str:
+    """Returns a regular expression alternation matching any of the words,
+    built from a character trie so that shared prefixes are only tried once.
+    Where one word is a prefix of another, the longest one is tried first.
+
+    Args:
+        words (iterable) : the words to match.
+
+    Returns:
+        pattern (str) : the regular expression, without anchors.
+
+    """
+    trie: Dict[str, dict] = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    def build(node: Dict[str, dict]) -> str:
+        is_word_end = "" in node
+        branches = [
+            re.escape(char) + build(child)
+            for char, child in sorted(node.items())
+            if char != ""
+        ]
+        if not branches:
+            return ""
+        if len(branches) == 1:
+            pattern = branches[0]
+            if is_word_end:
+                return "(?:%s)?" % pattern
+            return pattern
+        pattern = "(?:%s)" % "|".join(branches)
+        return pattern + "?" if is_word_end else pattern
 
-    return pattern.sub(replace, tweet)
+    return build(trie)
 
 
 def contractions() -> Dict[str, str]:
@@ -169,8 +264,7 @@ def tokenizer(tweet: str) -> str:
         tokenized_tweet (str) : the tokenized tweet.
 
     """
-    social_tokenizer = SocialTokenizer(lowercase=False).tokenize
-    return " ".join(s for s in social_tokenizer(tweet))
+    return " ".join(get_social_tokenizer().tokenize(tweet))
 
 
 def punctuation_cleaner(tweet: str) -> str:
@@ -186,7 +280,7 @@ def punctuation_cleaner(tweet: str) -> str:
          cleaned_tweet (str) : the cleaned tweet.
 
     """
-    return re.sub(r"\s[:,\'!.](?=\s)?", "", tweet)
+    return _PUNCTUATION_PATTERN.sub("", tweet)
 
 
 def lowercase(tweet: str) -> str:
@@ -202,6 +296,108 @@ def lowercase(tweet: str) -> str:
     return " ".join(word.lower() for word in tweet.split())
 
 
+def clean_tweet(tweet: str) -> str:
+    """Returns the tweet cleaned in a single pass over its tokens, the same
+    as contractions_unpacker, tokenizer, punctuation_cleaner,
+    remove_stopwords and lowercase applied one after the other.
+
+    Args:
+        tweet (str) : the original tweet.
+
+    Returns:
+        cleaned_tweet (str) : the cleaned tweet.
+
+    """
+    return _clean_tokens(get_social_tokenizer().tokenize(contractions_unpacker(tweet)))
+
+
+def _clean_tokens(tokens: List[str]) -> str:
+    """Cleans the tokens of a tweet with unpacked contractions.
+
+    Once the tokens are joined with spaces, punctuation_cleaner removes each
+    space followed by a punctuation character together with that character,
+    gluing the rest of the token to the previous one. Stopwords are then
+    removed before lowercasing, so only lowercase stopwords are. Tokens with
+    whitespace in them would be split differently by the chained processors,
+    which are then run instead.
+    """
+    if "" in tokens or _WHITESPACE_PATTERN.search("".join(tokens)):
+        return lowercase(remove_stopwords(punctuation_cleaner(" ".join(tokens))))
+    words: List[str] = []
+    for token in tokens:
+        if words and token[0] in _PUNCTUATION_CHARACTERS:
+            words[-1] += token[1:]
+        else:
+            words.append(token)
+    return " ".join([word.lower() for word in words if word not in _STOPWORDS])
+
+
+def contractions_unpacker_batch(tweets: pd.Series) -> pd.Series:
+    """Batch version of `contractions_unpacker`. Every contraction contains
+    an apostrophe, so only the tweets with one go through the regular
+    expression, in a single pass."""
+    with_apostrophe = tweets.str.contains("'", regex=False).astype(bool)
+    unpacked = tweets.copy()
+    unpacked[with_apostrophe] = _apply_to_joined(
+        tweets[with_apostrophe], contractions_unpacker
+    )
+    return unpacked
+
+
+def punctuation_cleaner_batch(tweets: pd.Series) -> pd.Series:
+    """Batch version of `punctuation_cleaner`, cleaning all the tweets in a
+    single regular expression pass."""
+    return _apply_to_joined(tweets, punctuation_cleaner)
+
+
+def lowercase_batch(tweets: pd.Series) -> pd.Series:
+    """Batch version of `lowercase`, lowercasing all the tweets in one call
+    before collapsing their whitespace."""
+    lowercased = _apply_to_joined(tweets, str.lower)
+    return pd.Series(
+        [" ".join(tweet.split()) for tweet in lowercased],
+        index=tweets.index,
+        dtype=object,
+    )
+
+
+def clean_tweet_batch(tweets: pd.Series) -> pd.Series:
+    """Batch version of `clean_tweet`, unpacking the contractions of all the
+    tweets in one regular expression pass."""
+    tokenize = get_social_tokenizer().tokenize
+    return pd.Series(
+        [_clean_tokens(tokenize(tweet)) for tweet in contractions_unpacker_batch(tweets)],
+        index=tweets.index,
+        dtype=object,
+    )
+
+
+def _apply_to_joined(tweets: pd.Series, rewrite: Callable[[str], str]) -> pd.Series:
+    """Applies a string rewrite to all the tweets at once, by joining them
+    with a separator the rewrite leaves in place and splitting the result.
+
+    Falls back to rewriting the tweets one by one if any of them contains the
+    separator.
+
+    Args:
+        tweets (pandas series) : the tweets to rewrite.
+        rewrite (callable) : the rewrite, which must not match across the
+        separator.
+
+    Returns:
+        rewritten_tweets (pandas series) : the rewritten tweets.
+
+    """
+    if tweets.empty:
+        return tweets
+    joined = _BATCH_SEPARATOR.join(tweets)
+    if joined.count(_BATCH_SEPARATOR) != len(tweets) - 1:
+        return tweets.map(rewrite)
+    return pd.Series(
+        rewrite(joined).split(_BATCH_SEPARATOR), index=tweets.index, dtype=object
+    )
+
+
 def normalizer(tweets):
     """ Return a the values parsed as normalized versions of themselves.
 
@@ -212,25 +408,26 @@ def normalizer(tweets):
           normalized_tweet (str) : the normalized tweet.
 
     """
-    preprocesser = TextPreProcessor(
-        normalize=[
-            "url",
-            "email",
-            "percent",
-            "money",
-            "phone",
-            "user",
-            "time",
-            "date",
-            "hashtag",
-        ]
-    )
-    return tweets.apply(preprocesser.pre_process_doc)
+    return tweets.apply(get_text_preprocessor().pre_process_doc)
+
+
+def normalize_tweet(tweet: str) -> str:
+    """Returns the tweet with urls, emails, percentages, money, phone
+    numbers, users, times, dates and hashtags replaced by tags, e.g. <user>.
+
+    Args:
+        tweet (str) : the original tweet.
+
+    Returns:
+        normalized_tweet (str) : the normalized tweet.
+
+    """
+    return get_text_preprocessor().pre_process_doc(tweet)
 
 
 def remove_stopwords(tweet: str) -> str:
     """Returns a string of words with stop words removed."""
-    return " ".join(word for word in tweet.split(" ") if word not in stopwords())
+    return " ".join(word for word in tweet.split(" ") if word not in _STOPWORDS)
 
 
 def stopwords() -> List[str]:
@@ -446,56 +643,168 @@ def stopwords() -> List[str]:
     ]
 
 
-def get_embeddings(embedding_path):
-    embeddings_index = {}
-    file_name = embedding_path
+# Compiled lookup tables, built once at import and shared by all the helpers.
+_CONTRACTIONS = contractions()
+_CONTRACTIONS_PATTERN = re.compile(
+    r"\b%s\b" % _trie_pattern(_CONTRACTIONS), flags=re.IGNORECASE
+)
+_STOPWORDS = frozenset(stopwords())
+_PUNCTUATION_PATTERN = re.compile(r"\s[:,\'!.](?=\s)?")
+# The characters _PUNCTUATION_PATTERN removes after whitespace.
+_PUNCTUATION_CHARACTERS = frozenset(":,'!.")
+_WHITESPACE_PATTERN = re.compile(r"\s")
+_BATCH_SEPARATOR = "\x00"
 
-    with open(file_name, encoding="utf-8") as file:
-        for line in file:
-            values = line.split(" ")
-            word = values[0]
-            embedding = np.asarray(values[1:], dtype="float32")
-            embeddings_index[word] = embedding
 
+def get_embeddings(embedding_path, store_dir=None) -> EmbeddingStore:
+    """Returns the word embeddings of a GloVe-style text file, converted on
+    first use to a memory-mapped binary store, see EmbeddingStore.
+
+    Args:
+        embedding_path (str) : the text file.
+        store_dir (str) : the store directory, by default next to the text
+        file with a .store extension.
+
+    Returns:
+        embeddings_index (EmbeddingStore) : the vector of each word, looked up
+        like a dictionary.
+
+    """
+    embeddings_index = EmbeddingStore.open(embedding_path, store_dir)
     print("Word embeddings: %d" % len(embeddings_index))
     return embeddings_index
 
 
-def get_embedding_matrix(embeddings_index, word_index, max_nb_words, dimension):
+def get_embedding_matrix(
+    embeddings_index,
+    word_index,
+    max_nb_words,
+    dimension,
+    dtype=np.float64,
+    return_coverage=False,
+):
+    """Returns the embedding matrix of a tokenizer vocabulary: row i holds
+    the vector of the word of index i, zeros for the words without one.
+
+    The vocabulary is joined against the embeddings in one lookup and the
+    rows are copied with fancy indexing, reading only the vectors needed
+    from a memory-mapped EmbeddingStore.
+
+    Args:
+        embeddings_index (EmbeddingStore or dict) : the vector of each word.
+        word_index (dict) : the index of each word, from 1.
+        max_nb_words (int) : the largest index kept.
+        dimension (int) : the dimension of the vectors.
+        dtype (numpy dtype) : the type of the matrix, e.g. np.float32 to halve
+        its memory.
+        return_coverage (bool) : whether to also return the coverage.
+
+    Returns:
+        word_embedding_matrix (numpy array) : the embedding matrix.
+        coverage (dict) : if return_coverage, the number of words kept,
+        found in the embeddings and missing, and the number of null rows.
+
+    """
     # Prepare word embedding matrix
     nb_words = min(max_nb_words, len(word_index))
-    word_embedding_matrix = np.zeros((nb_words + 1, dimension))
-    for word, i in word_index.items():
-        if i > max_nb_words:
-            continue
-        embedding_vector = embeddings_index.get(word)
-        if embedding_vector is not None:
-            word_embedding_matrix[i] = embedding_vector
-
+    word_embedding_matrix = np.zeros((nb_words + 1, dimension), dtype=dtype)
+    words = [word for word, i in word_index.items() if i <= nb_words]
+    indices = np.fromiter(
+        (word_index[word] for word in words), dtype=np.int64, count=len(words)
+    )
+    if isinstance(embeddings_index, EmbeddingStore):
+        rows = embeddings_index.rows_of(words)
+        found = rows >= 0
+        found_vectors = embeddings_index.vectors[rows[found]]
+    else:
+        # A dictionary of vectors, as get_embeddings used to return.
+        vectors = [embeddings_index.get(word) for word in words]
+        found = np.array([vector is not None for vector in vectors], dtype=bool)
+        found_vectors = np.array([vector for vector in vectors if vector is not None])
+    word_embedding_matrix[indices[found]] = found_vectors.reshape(-1, dimension)
+
+    filled = len(np.unique(indices[found]))
+    coverage = dict(
+        words=len(words),
+        found=int(found.sum()),
+        missing=int((~found).sum()),
+        null_rows=len(word_embedding_matrix) - filled,
+    )
     print(
-        "Null word embeddings: %d" % np.sum(np.sum(word_embedding_matrix, axis=1) == 0)
+        "Word embeddings found: %d of %d words (%.1f%%)"
+        % (
+            coverage["found"],
+            coverage["words"],
+            100 * coverage["found"] / coverage["words"] if words else 0.0,
+        )
     )
+    print("Null word embeddings: %d" % coverage["null_rows"])
+    if return_coverage:
+        return word_embedding_matrix, coverage
     return word_embedding_matrix
 
 
 def init_embeddings(
-    word_index, max_number_of_words, embedding_dimension, word_embedding_path
+    word_index,
+    max_number_of_words,
+    embedding_dimension,
+    word_embedding_path,
+    cache_dir="cache/embedding-matrices",
+    dtype=np.float64,
 ):
     # Initialize embedding matrix. If it exists, load it, otherwise create it
-    cache_filename = "embedding_matrix.npy"
+    embeddings_index = get_embeddings(word_embedding_path)
+    cache_filename = Path(cache_dir) / (
+        "embedding-matrix-%s.npy"
+        % embedding_matrix_key(
+            embeddings_index,
+            word_index,
+            max_number_of_words,
+            embedding_dimension,
+            np.dtype(dtype).name,
+        )
+    )
 
     if exists(cache_filename):
         word_embedding_matrix = np.load(cache_filename)
     else:
         # Prepare embedding matrix to be used in Embedding Layer
-        embeddings_index = get_embeddings(word_embedding_path)
         word_embedding_matrix = get_embedding_matrix(
-            embeddings_index, word_index, max_number_of_words, embedding_dimension
+            embeddings_index,
+            word_index,
+            max_number_of_words,
+            embedding_dimension,
+            dtype=dtype,
         )
+        cache_filename.parent.mkdir(parents=True, exist_ok=True)
         np.save(cache_filename, word_embedding_matrix)
     return word_embedding_matrix
 
 
+def embedding_matrix_key(
+    embeddings_index: EmbeddingStore,
+    word_index: Dict[str, int],
+    max_number_of_words: int,
+    embedding_dimension: int,
+    dtype: str = "float64",
+) -> str:
+    """Returns the hash an embedding matrix is cached under, which changes
+    with the embeddings, the word index or the dimensions of the matrix."""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(
+        json.dumps(
+            [
+                embeddings_index.identity,
+                max_number_of_words,
+                embedding_dimension,
+                dtype,
+                sorted(word_index.items()),
+            ]
+        ).encode("utf-8")
+    )
+    return digest.hexdigest()
+
+
 def density_of_curse_words_in_sentence(tweet: str) -> Dict[str, float]:
     """Returns the density of top 20 curse words, taken from Wang, Wenbo,  et  al.
     Cursing  in english on  twitter."
@@ -505,7 +814,100 @@ def density_of_curse_words_in_sentence(tweet: str) -> Dict[str, float]:
     Returns:
         density (dict) : the curse words and their densities.
     """
-    curse_words = [
+    counts = {curse: 0.0 for curse in _CURSE_WORDS}
+    tweet_words = tweet.lower().split(" ")
+    # now we just need to count how many times is each curse root used
+    for word in tweet_words:
+        root = _CURSE_ROOTS.get(word.strip())
+        if root is not None:
+            counts[root] += 1
+
+    # all done, now we just need frequency
+    for key in counts:
+        counts[key] /= float(len(tweet_words))
+    return counts
+
+
+def curse_word_densities(tweets: Iterable[str], chunksize: int = 100000) -> np.ndarray:
+    """Returns the density of each curse word in each tweet, the same as
+    density_of_curse_words_in_sentence but as one matrix.
+
+    The words of the tweets are matched with a single regular expression
+    pass over a chunk of tweets joined together, and counted per tweet with
+    NumPy, so no dictionary is built per tweet.
+
+    Args:
+        tweets (iterable) : the tweets, e.g. a pandas series.
+        chunksize (int) : the number of tweets matched at a time.
+
+    Returns:
+        densities (numpy array) : matrix with one row per tweet and one
+        column per curse word, in the order of curse_words().
+
+    """
+    tweets = list(tweets)
+    densities = np.zeros((len(tweets), len(_CURSE_WORDS)), dtype=np.float64)
+    for start in range(0, len(tweets), chunksize):
+        chunk = tweets[start : start + chunksize]
+        joined = _BATCH_SEPARATOR.join(chunk).lower()
+        parts = joined.split(_BATCH_SEPARATOR)
+        if len(parts) != len(chunk):
+            # A tweet contains the separator: count the tweets one by one.
+            densities[start : start + len(chunk)] = [
+                list(density_of_curse_words_in_sentence(tweet).values())
+                for tweet in chunk
+            ]
+            continue
+        lengths = np.fromiter(map(len, parts), dtype=np.int64, count=len(parts))
+        ends = np.cumsum(lengths + 1)
+        # Each match starts on the space or separator before its word, which
+        # is in the joined tweets where the match is in the padded ones.
+        matches = list(_CURSE_PATTERN.finditer(" " + joined + " "))
+        starts = np.fromiter(
+            (match.start() for match in matches), dtype=np.int64, count=len(matches)
+        )
+        rows = np.searchsorted(ends, starts, side="right")
+        columns = np.fromiter(
+            (_CURSE_COLUMNS[match.group(1)] for match in matches),
+            dtype=np.int64,
+            count=len(matches),
+        )
+        counts = np.zeros((len(chunk), len(_CURSE_WORDS)), dtype=np.float64)
+        np.add.at(counts, (rows, columns), 1)
+        words = np.fromiter(
+            (part.count(" ") + 1 for part in parts), dtype=np.float64, count=len(parts)
+        )
+        densities[start : start + len(chunk)] = counts / words[:, None]
+    return densities
+
+
+def density_of_curse_words_in_corpus(
+    dataframe: pd.DataFrame, return_per_tweet: bool = False
+) -> Union[Dict[str, float], Tuple[Dict[str, float], np.ndarray]]:
+    """Returns density of curse words across an entire corpus
+
+      Args:
+        dataframe (pandas df) : the df with the tweets to be counted.
+        return_per_tweet (bool) : whether to also return the densities of
+        each tweet, see curse_word_densities.
+
+    Returns:
+        count (dict) : the curse words and their densities.
+        densities (numpy array) : if return_per_tweet, the densities of each
+        tweet.
+
+    """
+    densities = curse_word_densities(dataframe["text"])
+    count = dict(zip(_CURSE_WORDS, densities.sum(axis=0) / len(dataframe)))
+    if len(dataframe) == 0:
+        count = {}
+    if return_per_tweet:
+        return count, densities
+    return count
+
+
+def curse_words() -> List[str]:
+    return [
         "fuck",
         "shit",
         "ass",
@@ -527,54 +929,21 @@ def density_of_curse_words_in_sentence(tweet: str) -> Dict[str, float]:
         "blowjob",
     ]
 
-    # here we are going to use above words as roots in dictionary and then
-    # as dictionary value add them and their plurals in order to make magic happen
-    # I'm just adding plural but you can easily extend it with synonyms and such
-
-    curse_roots = {
-        curse_word: [curse_word, f"{curse_word}s"] for curse_word in curse_words
-    }
-
-    # now we create look_up dictionary which is a reverse of above (all values become
-    # keys, and key become values)
-    lookup = {}
-    for key, values in curse_roots.items():
-        for value in values:
-            lookup[value] = key
-    # here we add counter
-    counts = {curse: 0.0 for curse in curse_words}
 
-    #####
-    tweet_words = tweet.lower().split(" ")
-    # cleaning up white space
-    tweet_words = [tweet_word.strip() for tweet_word in tweet_words]
-
-    # now we just need to count how many times is each curse root used
-    for word in tweet_words:
-        if word in lookup:
-            counts[lookup[word]] += 1
-
-    # all done, now we just need frequency
-    for key in counts:
-        counts[key] /= float(len(tweet_words))
-    return counts
-
-
-def density_of_curse_words_in_corpus(dataframe: pd.DataFrame) -> Dict[str, float]:
-    """Returns density of curse words across an entire corpus
-
-      Args:
-        dataframe (pandas df) : the df with the tweets to be counted.
-
-    Returns:
-        count (dict) : the curse words and their densities.
-
-    """
-    dataframe["curse_words"] = dataframe["text"].apply(
-        density_of_curse_words_in_sentence
-    )
-    count = pd.DataFrame(list(dataframe["curse_words"])).T.sum(axis=1) / len(dataframe)
-    return dict(count)
+_CURSE_WORDS = curse_words()
+# Each curse word is counted with its plural.
+_CURSE_ROOTS = {
+    form: curse_word
+    for curse_word in _CURSE_WORDS
+    for form in (curse_word, f"{curse_word}s")
+}
+_CURSE_COLUMNS = {form: _CURSE_WORDS.index(root) for form, root in _CURSE_ROOTS.items()}
+# A word of the tweets split on spaces, stripped of other whitespace, with
+# the space or batch separator before it. Consuming that character rather
+# than looking behind for it makes the scan about twice as fast.
+_CURSE_PATTERN = re.compile(
+    r"[ \x00][^\S ]*(%s)[^\S ]*(?=[ \x00])" % _trie_pattern(_CURSE_ROOTS)
+)
 
 
 def create_ngrams(tweet: str, ngram_number: int) -> List[str]:
@@ -1,36 +1,112 @@
 # pylint: disable=C0103,W0613,W0201,W0611
+import argparse
+import json
 import logging
-import sys
-import pandas as pd
 from sklearn.experimental import enable_hist_gradient_boosting  # noqa
 from sklearn.pipeline import make_pipeline
 from sklearn.ensemble import HistGradientBoostingClassifier
-import cloudpickle
+from sklearn.linear_model import LogisticRegression
 
-from src.transformers import SpacyTransformer
+from src.artifacts import save_model
+from src.dataset import read_table
+from src.feature_store import (
+    is_feature_store,
+    load_features,
+    load_featurizer,
+    read_meta,
+)
+from src.featurizers import build_featurizer, featurize_chunks, fit_featurizer
 
 logger = logging.getLogger(__name__)
 
 
+def build_model(featurizer_name, cache_dir=None, classifier_params=None):
+    """Returns the featurizer and the classifier of a model: spaCy document
+    vectors and gradient boosting, or hashed n-grams and a linear model, the
+    classifier taking any parameters given"""
+    return (
+        build_featurizer(featurizer_name, cache_dir),
+        build_classifier(featurizer_name, classifier_params),
+    )
+
+
+def build_classifier(featurizer_name, classifier_params=None):
+    """Returns the classifier of the features of a featurizer, see
+    build_model"""
+    classifier_params = classifier_params or {}
+    if featurizer_name == "spacy":
+        return HistGradientBoostingClassifier(
+            **dict(dict(max_iter=50, verbose=2), **classifier_params)
+        )
+    if featurizer_name == "hashing":
+        return LogisticRegression(**dict(dict(solver="liblinear"), **classifier_params))
+    raise ValueError(f"Unknown featurizer {featurizer_name!r}.")
+
+
 def main():
     # """Take text from input dataframe and vectorize it to build a feature matrix"""
     """Take text as input, create feature matrix, and train model with sklearn pipeline"""
-    try:
-        input_file, output_file = sys.argv[1], sys.argv[2]
-    except (IndexError, ValueError) as error:
-        print(error)
-        print("Error: please specify input and output files.")
-        raise
-
-    # # Featurizer here
-    df_in = pd.read_csv(input_file)
-
-    classifier = HistGradientBoostingClassifier(max_iter=50, verbose=2)
-    pipeline = make_pipeline(SpacyTransformer(), classifier)
-    pipeline.fit(df_in["text"], df_in["label"])
-
-    with open(output_file, "wb") as handler:
-        cloudpickle.dump(pipeline, handler)  # , compress="zlib")
+    parser = argparse.ArgumentParser(description="Train the misogyny classifier.")
+    parser.add_argument(
+        "input_file",
+        help="the training set, or a feature store written by src/featurize.py",
+    )
+    parser.add_argument("output_file")
+    parser.add_argument(
+        "--chunksize",
+        type=int,
+        help="read and featurize the training set this many rows at a time",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        help="directory caching the document vectors between runs, "
+        "e.g. cache/doc-vectors",
+    )
+    parser.add_argument(
+        "--featurizer",
+        choices=["spacy", "hashing"],
+        default="spacy",
+        help="spaCy document vectors with gradient boosting, or hashed word "
+        "and character n-grams with logistic regression",
+    )
+    parser.add_argument(
+        "--params",
+        help="JSON file of the parameters of the classifier under params, "
+        "e.g. reports/tune.json written by src/tune.py",
+    )
+    args = parser.parse_args()
+    input_file, output_file = args.input_file, args.output_file
+
+    classifier_params = None
+    if args.params:
+        with open(args.params) as file:
+            classifier_params = json.load(file)["params"]
+    if is_feature_store(input_file):
+        # The featurizer of the store is already fitted, and the features of
+        # the training set computed.
+        classifier = build_classifier(
+            read_meta(input_file)["featurizer"], classifier_params
+        )
+        features, labels = load_features(input_file, "train")
+        classifier.fit(features, labels)
+        save_model(make_pipeline(load_featurizer(input_file), classifier), output_file)
+        return
+    featurizer, classifier = build_model(
+        args.featurizer, args.cache_dir, classifier_params
+    )
+    if args.chunksize:
+        featurizer = fit_featurizer(featurizer, input_file, args.chunksize)
+        features, labels = featurize_chunks(featurizer, input_file, args.chunksize)
+        classifier.fit(features, labels)
+        # Both steps are already fitted, the pipeline only chains them.
+        pipeline = make_pipeline(featurizer, classifier)
+    else:
+        # # Featurizer here
+        df_in = read_table(input_file, columns=["text", "label"])
+        pipeline = make_pipeline(featurizer, classifier)
+        pipeline.fit(df_in["text"], df_in["label"])
+
+    save_model(pipeline, output_file)
 
 
 if __name__ == "__main__":
@@ -1,26 +1,440 @@
 # pylint: disable=C0103,W0613,W0201
+import hashlib
+import json
+import logging
+import threading
+from itertools import islice
+from pathlib import Path
+from typing import Dict, Tuple
+
 import numpy as np
+import pandas as pd
+import scipy.sparse as sp
 import spacy
-from sklearn.base import BaseEstimator, TransformerMixin
+from spacy.attrs import ORTH
+from sklearn.base import BaseEstimator, TransformerMixin, clone
+from sklearn.feature_extraction.text import HashingVectorizer
+from sklearn.utils.sparsefuncs_fast import inplace_csr_row_normalize_l2
 from sklearn.utils.validation import check_is_fitted
 
+from src.feature_cache import CacheStats, DocVectorCache
+from src.text.pipelines import get_pipeline
+from src.vectors import VectorTable
+
+logger = logging.getLogger(__name__)
+
+_language_models: Dict[Tuple[str, Tuple[str, ...]], dict] = {}
+_language_models_lock = threading.Lock()
+
+# Below this number of texts, HashingTextTransformer preprocesses them one
+# by one rather than as a batch.
+_SMALL_BATCH = 32
+
+
+def get_language_model(model_name: str, disable=()) -> dict:
+    """Returns a spaCy language model, loaded once per process and shared by
+    every transformer using it.
+
+    Args:
+        model_name (str) : the spaCy language model.
+        disable (tuple) : the pipeline components not to load.
+
+    Returns:
+        language_model (dict) : the loaded model under "nlp", its reference
+        under "reference" and, once built, its VectorTable under
+        "vector_table".
+
+    """
+    key = (model_name, tuple(disable))
+    language_model = _language_models.get(key)
+    if language_model is None:
+        with _language_models_lock:
+            language_model = _language_models.get(key)
+            if language_model is None:
+                nlp = spacy.load(model_name, disable=list(disable))
+                language_model = dict(
+                    nlp=nlp, reference=language_model_reference(model_name, nlp)
+                )
+                _language_models[key] = language_model
+    return language_model
+
+
+def get_vectors_model(vectors_dir: str) -> dict:
+    """Returns the tokenizer and word vector table saved by
+    src/build_vectors.py, loaded once per process without the spaCy language
+    model they come from. The checksum of the vectors loaded must be the
+    one saved with them.
+
+    Args:
+        vectors_dir (str) : the directory written by src/build_vectors.py.
+
+    Returns:
+        language_model (dict) : a blank spaCy model with the saved tokenizer
+        under "nlp", the reference of the vectors under "reference" and the
+        memory-mapped VectorTable under "vector_table".
+
+    """
+    key = ("vectors", (str(vectors_dir),))
+    language_model = _language_models.get(key)
+    if language_model is None:
+        with _language_models_lock:
+            language_model = _language_models.get(key)
+            if language_model is None:
+                with open(Path(vectors_dir) / "meta.json") as file:
+                    meta = json.load(file)
+                vector_table = VectorTable.load(vectors_dir)
+                checksum = vector_table.checksum()
+                if checksum != meta["reference"]["vectors_checksum"]:
+                    raise ValueError(
+                        f"The vectors of {vectors_dir} have the checksum "
+                        f"{checksum}, not {meta['reference']['vectors_checksum']} "
+                        f"as saved: they were modified or are incomplete."
+                    )
+                nlp = spacy.blank(meta["lang"])
+                nlp.tokenizer.from_disk(Path(vectors_dir) / "tokenizer")
+                language_model = dict(
+                    nlp=nlp, reference=meta["reference"], vector_table=vector_table
+                )
+                _language_models[key] = language_model
+    return language_model
+
+
+def language_model_reference(model_name: str, nlp) -> dict:
+    """Returns what identifies a language model in a serialized pipeline: its
+    name, version and a checksum of its word vectors."""
+    key2row = nlp.vocab.vectors.key2row
+    keys = np.fromiter(key2row.keys(), dtype=np.uint64, count=len(key2row))
+    rows = np.fromiter(key2row.values(), dtype=np.uint64, count=len(key2row))
+    order = np.argsort(keys)
+    checksum = hashlib.md5()
+    checksum.update(np.ascontiguousarray(nlp.vocab.vectors.data, dtype=np.float32))
+    checksum.update(keys[order])
+    checksum.update(rows[order])
+    return dict(
+        name=model_name,
+        version=nlp.meta.get("version", ""),
+        vectors_checksum=checksum.hexdigest(),
+    )
+
+
+def language_model_id(reference: dict) -> str:
+    """Returns a short identifier of a language model reference."""
+    return (
+        f"{reference['name']}-{reference['version']}-"
+        f"{reference['vectors_checksum'][:12]}"
+    )
+
 
 class SpacyTransformer(BaseEstimator, TransformerMixin):
-    def __init__(self):
-        pass
+    """Featurizes texts as the average of the spaCy word vectors of their
+    tokens.
+
+    Only the tokenizer and the word vectors are needed for that, so by
+    default the tagger, parser and named entity recognizer of the language
+    model are not loaded. With fast_vectors, the texts are only tokenized and
+    the vectors of their tokens averaged with NumPy.
+
+    The language model is not pickled with the transformer: only its name,
+    version and vectors checksum are. It is loaded on first use after
+    unpickling, once per process, and must match the checksum.
+
+    With vectors_dir, the full language model is not loaded at all: the
+    vectors come from a table pruned and possibly quantized by
+    src/build_vectors.py, and the texts are only tokenized.
+
+    Args:
+        model_name (str) : the spaCy language model.
+        disable (tuple) : the pipeline components of the language model not
+        to load. An empty tuple runs the full pipeline.
+        batch_size (int) : the number of texts spaCy processes at a time.
+        n_process (int) : the number of processes spaCy spreads the texts
+        over, -1 meaning one per CPU.
+        cache_dir (str) : optional directory where the document vectors are
+        cached between runs, keyed by text and language model.
+        cache_size (int) : the maximum number of vectors kept in the cache.
+        fast_vectors (bool) : whether to compute the document vectors from
+        the tokens with NumPy rather than through spaCy documents.
+        vectors_dir (str) : optional directory written by
+        src/build_vectors.py to take the tokenizer and word vectors from,
+        instead of the language model.
+
+    """
+
+    def __init__(
+        self,
+        model_name="en_core_web_md",
+        disable=("tagger", "parser", "ner"),
+        batch_size=1000,
+        n_process=1,
+        cache_dir=None,
+        cache_size=1_000_000,
+        fast_vectors=False,
+        vectors_dir=None,
+    ):
+        self.model_name = model_name
+        self.disable = disable
+        self.batch_size = batch_size
+        self.n_process = n_process
+        self.cache_dir = cache_dir
+        self.cache_size = cache_size
+        self.fast_vectors = fast_vectors
+        self.vectors_dir = vectors_dir
+
+    def _get_language_model(self) -> dict:
+        if self.vectors_dir is not None:
+            return get_vectors_model(self.vectors_dir)
+        return get_language_model(self.model_name, self.disable)
 
     def fit(self, X, y):
-        self.nlp_ = spacy.load("en_core_web_md")
+        language_model = self._get_language_model()
+        self.language_model_ = language_model["reference"]
+        self.nlp_ = language_model["nlp"]
         return self
 
-    def transform(self, X, y=None):
+    def load_language_model(self):
+        """Returns the language model, loading it if this transformer was
+        unpickled and has not used it yet."""
         check_is_fitted(self)
-        try:
-            docs = list(self.nlp_.pipe(X))
-        except OSError:
-            # This is needed when the language model is not pickled with the transformer itself
-            self.nlp_ = spacy.load("en_core_web_md")
-            docs = list(self.nlp_.pipe(X))
+        if "nlp_" not in self.__dict__:
+            language_model = self._get_language_model()
+            if language_model["reference"] != self.language_model_:
+                raise ValueError(
+                    f"The transformer was fitted with the language model "
+                    f"{self.language_model_}, but {language_model['reference']} "
+                    f"is installed."
+                )
+            self.nlp_ = language_model["nlp"]
+        return self.nlp_
 
+    def with_vectors(self, vectors_dir: str) -> "SpacyTransformer":
+        """Returns a copy of this fitted transformer taking its tokenizer and
+        word vectors from a directory written by src/build_vectors.py, which
+        must come from the same language model."""
+        check_is_fitted(self)
+        language_model = get_vectors_model(vectors_dir)
+        source = language_model["reference"]["source"]
+        if source != self.language_model_:
+            raise ValueError(
+                f"The transformer was fitted with the language model "
+                f"{self.language_model_}, but the vectors of {vectors_dir} come "
+                f"from {source}."
+            )
+        transformer = clone(self).set_params(vectors_dir=vectors_dir)
+        transformer.language_model_ = language_model["reference"]
+        transformer.nlp_ = language_model["nlp"]
+        return transformer
+
+    def vector_table(self) -> VectorTable:
+        """Returns the table of the word vectors the transformer averages,
+        that of vectors_dir or one built from the language model."""
+        nlp = self.load_language_model()
+        language_model = self._get_language_model()
+        if "vector_table" not in language_model:
+            with _language_models_lock:
+                if "vector_table" not in language_model:
+                    language_model["vector_table"] = VectorTable.from_vocab(nlp.vocab)
+        return language_model["vector_table"]
+
+    def __getstate__(self):
+        # A copy: from Python 3.11 the state may be the __dict__ itself.
+        state = dict(super().__getstate__())
+        state.pop("nlp_", None)
+        return state
+
+    def transform(self, X, y=None):
+        self.load_language_model()
+        if self.cache_dir is None:
+            return self._doc_vectors(X)
+
+        texts = list(X)
+        if self.vectors_dir is not None:
+            dimension = self.vector_table().dimension
+        else:
+            dimension = self.nlp_.vocab.vectors_length
+        cache = DocVectorCache(
+            self.cache_dir,
+            language_model_id(self.language_model_),
+            dimension,
+            self.cache_size,
+        )
+        feature_matrix, found = cache.get_many(texts)
+        missing = np.flatnonzero(~found)
+        if len(missing):
+            missing_texts = [texts[index] for index in missing]
+            feature_matrix[missing] = self._doc_vectors(missing_texts)
+            cache.put_many(missing_texts, feature_matrix[missing])
+        # Also saves when the vectors found were last used, for eviction.
+        cache.flush()
+        self.cache_stats_: CacheStats = cache.stats
+        logger.info("Document vector cache: %s", cache.stats)
+        return feature_matrix
+
+    def _doc_vectors(self, X):
+        if self.fast_vectors or self.vectors_dir is not None:
+            return self._fast_doc_vectors(X)
+        docs = self.nlp_.pipe(X, batch_size=self.batch_size, n_process=self.n_process)
         feature_matrix = np.array(list(map(lambda x: x.vector, docs)))
         return feature_matrix
+
+    def _fast_doc_vectors(self, X):
+        """Returns the same vectors as doc.vector, from the lexeme IDs of the
+        tokens found by the tokenizer alone. The vectors of the tokens are
+        averaged batch_size texts at a time, so that only those of a batch
+        are held in memory."""
+        vector_table = self.vector_table()
+        feature_matrix = np.zeros((len(X), vector_table.dimension), dtype=np.float32)
+        docs = self.nlp_.tokenizer.pipe(X, batch_size=self.batch_size)
+        start = 0
+        while start < len(X):
+            keys = [doc.to_array(ORTH) for doc in islice(docs, self.batch_size)]
+            lengths = [len(orths) for orths in keys]
+            feature_matrix[start : start + len(keys)] = vector_table.mean_vectors(
+                np.concatenate(keys), lengths
+            )
+            start += len(keys)
+        return feature_matrix
+
+
+class HashingTextTransformer(BaseEstimator, TransformerMixin):
+    """Featurizes texts as sparse TF-IDF weighted counts of their word and
+    character n-grams, hashed to a fixed number of columns.
+
+    The texts are first preprocessed by a pipeline of src.text. Hashing the
+    n-grams means no vocabulary is learned or stored: fitting only counts
+    the documents each column appears in, for the inverse document
+    frequencies, and partial_fit does so a chunk of texts at a time. The
+    features are meant for linear models, which train and predict much
+    faster on them than on the spaCy document vectors.
+
+    Args:
+        preprocessing (str) : the src.text pipeline preprocessing the texts,
+        None to featurize them as they are.
+        word_ngram_range (tuple) : the smallest and largest number of words
+        per n-gram, None for no word n-grams.
+        char_ngram_range (tuple) : the smallest and largest number of
+        characters per n-gram, taken within words, None for no character
+        n-grams.
+        n_features (int) : the number of columns each kind of n-gram is
+        hashed to.
+        sublinear_tf (bool) : whether to weight counts as 1 + log(count).
+        use_idf (bool) : whether to weight columns by their inverse document
+        frequency.
+        n_jobs (int) : the number of worker processes preprocessing the
+        texts, -1 meaning one per CPU.
+
+    """
+
+    def __init__(
+        self,
+        preprocessing="tokenize",
+        word_ngram_range=(1, 2),
+        char_ngram_range=(2, 4),
+        n_features=2 ** 18,
+        sublinear_tf=True,
+        use_idf=True,
+        n_jobs=1,
+    ):
+        self.preprocessing = preprocessing
+        self.word_ngram_range = word_ngram_range
+        self.char_ngram_range = char_ngram_range
+        self.n_features = n_features
+        self.sublinear_tf = sublinear_tf
+        self.use_idf = use_idf
+        self.n_jobs = n_jobs
+
+    def _vectorizers(self):
+        vectorizers = []
+        options = dict(
+            n_features=self.n_features,
+            alternate_sign=False,
+            norm=None,
+            lowercase=False,
+            dtype=np.float32,
+        )
+        if self.word_ngram_range is not None:
+            # The preprocessing pipelines already split the tokens by spaces.
+            vectorizers.append(
+                HashingVectorizer(
+                    analyzer="word",
+                    token_pattern=r"\S+",
+                    ngram_range=tuple(self.word_ngram_range),
+                    **options,
+                )
+            )
+        if self.char_ngram_range is not None:
+            vectorizers.append(
+                HashingVectorizer(
+                    analyzer="char_wb",
+                    ngram_range=tuple(self.char_ngram_range),
+                    **options,
+                )
+            )
+        if not vectorizers:
+            raise ValueError("word_ngram_range and char_ngram_range are both None.")
+        return vectorizers
+
+    def _counts(self, X) -> sp.csr_matrix:
+        texts = X if isinstance(X, pd.Series) else pd.Series(list(X))
+        if self.preprocessing is not None:
+            pipeline = get_pipeline(self.preprocessing)
+            if len(texts) < _SMALL_BATCH:
+                # Batch processing costs more than it saves for a few texts,
+                # e.g. when predicting single tweets.
+                texts = [pipeline.process_text(text) for text in texts]
+            else:
+                texts = pipeline.process_batch(texts, n_jobs=self.n_jobs)
+        counts = sp.hstack(
+            [vectorizer.transform(texts) for vectorizer in self._vectorizers()],
+            format="csr",
+        )
+        counts.sum_duplicates()
+        return counts
+
+    def fit(self, X, y=None):
+        self._reset()
+        return self.partial_fit(X, y)
+
+    def fit_transform(self, X, y=None, **fit_params):
+        """Fits the document frequencies and returns the features of the
+        texts, preprocessing and hashing them only once."""
+        self._reset()
+        counts = self._counts(X)
+        self._add_document_frequencies(counts)
+        return self._weight(counts)
+
+    def partial_fit(self, X, y=None):
+        """Adds the document frequencies of a chunk of texts."""
+        self._add_document_frequencies(self._counts(X))
+        return self
+
+    def transform(self, X, y=None):
+        check_is_fitted(self, "n_documents_")
+        return self._weight(self._counts(X))
+
+    def _reset(self):
+        for attribute in ("document_frequencies_", "n_documents_", "idf_"):
+            self.__dict__.pop(attribute, None)
+
+    def _add_document_frequencies(self, counts: sp.csr_matrix):
+        if not hasattr(self, "n_documents_"):
+            self.document_frequencies_ = np.zeros(counts.shape[1], dtype=np.int64)
+            self.n_documents_ = 0
+        self.document_frequencies_ += np.bincount(
+            counts.indices, minlength=counts.shape[1]
+        )
+        self.n_documents_ += counts.shape[0]
+        # Smoothed as TfidfTransformer does, as if one more document held
+        # every n-gram.
+        self.idf_ = (
+            np.log((1 + self.n_documents_) / (1 + self.document_frequencies_)) + 1
+        ).astype(np.float32)
+
+    def _weight(self, counts: sp.csr_matrix) -> sp.csr_matrix:
+        """Weights the counts in place and returns them."""
+        if self.sublinear_tf:
+            np.log(counts.data, out=counts.data)
+            counts.data += 1
+        if self.use_idf:
+            counts.data *= self.idf_[counts.indices]
+        inplace_csr_row_normalize_l2(counts)
+        return counts
@@ -0,0 +1,361 @@
+"""Fast prediction with the trees of a HistGradientBoostingClassifier.
+
+sklearn's predict_proba validates its input, sets up threads and walks each
+tree in turn, which dominates the time taken to score a single tweet.
+FlatTreeClassifier extracts the trees once into contiguous arrays and
+evaluates all of them together with a few NumPy operations, whatever the
+number of rows. Its probabilities are identical to those of the
+classifier: the same comparisons are made, and the values of the leaves
+are added in the same order.
+
+Evaluating every node costs more per row than walking the trees once the
+batches are large, the more so the larger the trees. flatten_pipeline can
+measure the batch size above which the classifier is faster, and leave
+those batches to it.
+
+To check that on a test set and compare the prediction times:
+
+    python -m src.trees data/prepared-data-test.csv models/misog-model.pkl
+"""
+import argparse
+import copy
+import logging
+import sys
+from time import perf_counter
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+from scipy.special import expit
+from sklearn.base import BaseEstimator, ClassifierMixin
+
+from src.artifacts import load_language_models, load_model
+from src.dataset import read_table
+
+logger = logging.getLogger(__name__)
+
+# The number of rows evaluated at a time, so that the comparisons of a
+# block stay in the CPU caches.
+_BLOCK_ROWS = 128
+# The batch sizes compared by measure_max_rows, and the number of rows
+# predicted at each of them.
+_MEASURED_BATCH_SIZES = (16, 32, 64, 128, 256, 512, 1024)
+_MEASURED_ROWS = 4096
+
+
+def flatten_trees(classifier) -> Dict[str, np.ndarray]:
+    """Returns the trees of a fitted binary HistGradientBoostingClassifier
+    as flat node arrays.
+
+    Every node of every tree is numbered one after the other, with its
+    feature, threshold, children (numbered the same way), whether missing
+    values go left, whether it is a leaf and its value (feature, threshold,
+    left, right, missing_left, is_leaf, value). The root of each tree
+    (roots), the raw prediction the trees add up from (baseline) and the
+    largest depth of a leaf (max_depth) complete them.
+    """
+    if len(classifier.classes_) != 2:
+        raise ValueError("Only binary classifiers can be flattened.")
+    predictors = [trees[0] for trees in classifier._predictors]
+    if not predictors:
+        raise ValueError("The classifier has no trees.")
+    nodes = np.concatenate([predictor.nodes for predictor in predictors])
+    if "is_categorical" in nodes.dtype.names and nodes["is_categorical"].any():
+        raise ValueError("Trees splitting on categorical features cannot be flattened.")
+    sizes = np.array([len(predictor.nodes) for predictor in predictors])
+    roots = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+    offsets = np.repeat(roots, sizes)
+    is_leaf = nodes["is_leaf"].astype(bool)
+    # The threshold field was renamed in scikit-learn 0.24.
+    threshold_field = (
+        "num_threshold" if "num_threshold" in nodes.dtype.names else "threshold"
+    )
+    return dict(
+        feature=np.where(is_leaf, 0, nodes["feature_idx"]).astype(np.int32),
+        threshold=nodes[threshold_field].astype(np.float64),
+        left=np.where(is_leaf, 0, nodes["left"] + offsets).astype(np.int32),
+        right=np.where(is_leaf, 0, nodes["right"] + offsets).astype(np.int32),
+        missing_left=nodes["missing_go_to_left"].astype(bool),
+        is_leaf=is_leaf,
+        value=np.where(is_leaf, nodes["value"], 0).astype(np.float64),
+        roots=roots.astype(np.int32),
+        baseline=np.array(
+            np.ravel(classifier._baseline_prediction)[0], dtype=np.float64
+        ),
+        max_depth=np.array(nodes["depth"].max(), dtype=np.int32),
+    )
+
+
+class FlatTreeClassifier(ClassifierMixin, BaseEstimator):
+    """Predicts like a binary HistGradientBoostingClassifier, from its
+    flattened trees.
+
+    The trees are evaluated with bit vectors, as in QuickScorer: the leaves
+    of each tree are numbered from left to right, and each split node has a
+    mask of the leaves outside its left subtree. The mask of a node whose
+    feature is above its threshold rules out its left subtree. Combining
+    the masks of all the nodes of a tree with a bitwise and leaves the
+    reachable leaves. The exit leaf is the leftmost of them, the lowest bit
+    set. All the nodes of all the trees are compared at once, so a row
+    costs a few NumPy operations whatever the depth of the trees.
+
+    The masks are built on first use, or by from_classifier. Batches of more
+    than max_rows rows are predicted by the classifier, if given.
+
+    Args:
+        trees (dict) : the arrays returned by flatten_trees.
+        classes (sequence) : the classes of the classifier.
+        classifier (HistGradientBoostingClassifier) : optional classifier
+        the trees come from, predicting the batches of more than max_rows.
+        max_rows (int) : the largest batch predicted from the flat trees
+        when a classifier is given, None for no limit.
+
+    """
+
+    def __init__(
+        self,
+        trees: Dict[str, np.ndarray],
+        classes: Sequence = (0, 1),
+        classifier=None,
+        max_rows: Optional[int] = None,
+    ):
+        self.trees = trees
+        self.classes = classes
+        self.classifier = classifier
+        self.max_rows = max_rows
+
+    def _build_masks(self):
+        trees = self.trees
+        tree_nodes, tree_leaves = [], []
+        for root in trees["roots"]:
+            nodes, leaves = _walk_tree(trees, int(root))
+            tree_nodes.append(nodes)
+            tree_leaves.append(leaves)
+        max_leaves = max(len(leaves) for leaves in tree_leaves)
+        if max_leaves > 64:
+            raise ValueError(f"Trees have up to {max_leaves} leaves, at most 64 fit.")
+        self._mask_type = np.uint32 if max_leaves <= 32 else np.uint64
+        all_leaves = np.iinfo(self._mask_type).max
+        n_trees = len(tree_nodes)
+        # Every tree gets as many split nodes, padded with nodes which rule
+        # no leaf out.
+        self._width = max(1, max(len(nodes) for nodes in tree_nodes))
+        self._feature = np.zeros((n_trees, self._width), dtype=np.intp)
+        self._threshold = np.full((n_trees, self._width), np.inf)
+        self._missing_left = np.ones((n_trees, self._width), dtype=bool)
+        self._masks = np.full((n_trees, self._width), all_leaves, self._mask_type)
+        self._leaf_values = np.zeros((n_trees, max_leaves))
+        for tree, (nodes, leaves) in enumerate(zip(tree_nodes, tree_leaves)):
+            for position, (node, first, last) in enumerate(nodes):
+                self._feature[tree, position] = trees["feature"][node]
+                self._threshold[tree, position] = trees["threshold"][node]
+                self._missing_left[tree, position] = trees["missing_left"][node]
+                left_leaves = (1 << last) - (1 << first)
+                self._masks[tree, position] = all_leaves & ~left_leaves
+            self._leaf_values[tree, : len(leaves)] = trees["value"][leaves]
+        self._feature = self._feature.ravel()
+        self._threshold = self._threshold.ravel()
+        self._missing_left = self._missing_left.ravel()
+        self._masks = self._masks.ravel()
+        self._leaf_offsets = np.arange(n_trees) * max_leaves
+        self._leaf_values = self._leaf_values.ravel()
+        self._baseline = float(trees["baseline"])
+        self.classes_ = np.asarray(self.classes)
+
+    @classmethod
+    def from_classifier(cls, classifier) -> "FlatTreeClassifier":
+        """Returns the flat trees of a fitted classifier, with their masks
+        built."""
+        flat = cls(flatten_trees(classifier), classifier.classes_)
+        flat._build_masks()
+        return flat
+
+    def fit(self, X, y):
+        raise TypeError(
+            "A FlatTreeClassifier cannot be fitted: build it from a fitted "
+            "HistGradientBoostingClassifier with from_classifier."
+        )
+
+    def decision_function(self, X) -> np.ndarray:
+        """Returns the raw prediction of each row, the baseline plus the
+        values of the leaves reached, added tree after tree."""
+        features = np.asarray(X, dtype=np.float64)
+        if features.ndim != 2:
+            raise ValueError(f"Expected a 2D array, got {features.ndim}D.")
+        if self._predicts_with_classifier(len(features)):
+            return self.classifier.decision_function(features)
+        if "_masks" not in self.__dict__:
+            self._build_masks()
+        raw = np.empty(len(features))
+        for start in range(0, len(features), _BLOCK_ROWS):
+            block = features[start : start + _BLOCK_ROWS]
+            raw[start : start + len(block)] = self._block_decision_function(block)
+        return raw
+
+    def _block_decision_function(self, features: np.ndarray) -> np.ndarray:
+        values = features[:, self._feature]
+        go_left = values <= self._threshold
+        if np.isnan(features).any():
+            go_left |= np.isnan(values) & self._missing_left
+        all_leaves = np.iinfo(self._mask_type).max
+        masks = self._masks | (go_left * self._mask_type(all_leaves))
+        reachable = np.bitwise_and.reduce(
+            masks.reshape(len(features), -1, self._width), axis=2
+        )
+        lowest = reachable & (self._mask_type(0) - reachable)
+        exits = np.log2(lowest.astype(np.float64)).astype(np.intp)
+        leaf_values = np.empty((len(features), len(self._leaf_offsets) + 1))
+        leaf_values[:, 0] = self._baseline
+        leaf_values[:, 1:] = self._leaf_values[self._leaf_offsets + exits]
+        # cumsum adds in order, as sklearn does tree after tree.
+        return np.cumsum(leaf_values, axis=1)[:, -1]
+
+    def _predicts_with_classifier(self, n_rows: int) -> bool:
+        return (
+            self.classifier is not None
+            and self.max_rows is not None
+            and n_rows > self.max_rows
+        )
+
+    def predict_proba(self, X) -> np.ndarray:
+        probabilities = np.empty((len(X), 2))
+        probabilities[:, 1] = expit(self.decision_function(X))
+        probabilities[:, 0] = 1 - probabilities[:, 1]
+        return probabilities
+
+    def predict(self, X) -> np.ndarray:
+        raw = self.decision_function(X)
+        return np.asarray(self.classes)[(raw > 0).astype(int)]
+
+
+def _walk_tree(trees: Dict[str, np.ndarray], root: int):
+    """Returns the split nodes of a tree, each with the range of the numbers
+    of the leaves of its left subtree, and its leaves from left to right."""
+    nodes, leaves = [], []
+    first_leaf = {}
+    # Depth first, left child first, each split node visited again once its
+    # left subtree is done.
+    stack = [(root, False)]
+    while stack:
+        node, left_done = stack.pop()
+        if trees["is_leaf"][node]:
+            leaves.append(node)
+        elif left_done:
+            nodes.append((node, first_leaf[node], len(leaves)))
+            stack.append((int(trees["right"][node]), False))
+        else:
+            first_leaf[node] = len(leaves)
+            stack.append((node, True))
+            stack.append((int(trees["left"][node]), False))
+    return nodes, leaves
+
+
+def measure_max_rows(
+    classifier, flat: FlatTreeClassifier, features: np.ndarray
+) -> Optional[int]:
+    """Returns the largest batch size, out of _MEASURED_BATCH_SIZES, up to
+    which the flat trees predict faster than the classifier. None if they
+    are faster at every size, 0 if they are slower at the smallest one."""
+    max_rows = 0
+    for batch_size in _MEASURED_BATCH_SIZES:
+        repeats = max(1, _MEASURED_ROWS // batch_size)
+        classifier_time = _seconds_per_row(
+            classifier.predict_proba, features, batch_size, repeats
+        )
+        flat_time = _seconds_per_row(flat.predict_proba, features, batch_size, repeats)
+        if flat_time > classifier_time:
+            return max_rows
+        max_rows = batch_size
+    return None
+
+
+def _sample_rows(classifier, n_rows: int) -> np.ndarray:
+    """Returns rows whose features are bin thresholds of the classifier,
+    drawn at random, so that they reach leaves all over the trees."""
+    random = np.random.RandomState(42)
+    return np.column_stack(
+        [
+            random.choice(thresholds, n_rows) if len(thresholds) else np.zeros(n_rows)
+            for thresholds in classifier._bin_mapper.bin_thresholds_
+        ]
+    )
+
+
+def flatten_pipeline(pipeline, measure: bool = False):
+    """Returns a copy of a pipeline whose final HistGradientBoostingClassifier
+    is replaced by a FlatTreeClassifier, or the pipeline itself if it ends
+    with another classifier.
+
+    With measure, the batch size above which the classifier predicts faster
+    than the flat trees is measured, and the classifier is kept to predict
+    the batches above it.
+    """
+    name, classifier = pipeline.steps[-1]
+    if not hasattr(classifier, "_predictors") or len(classifier.classes_) != 2:
+        return pipeline
+    try:
+        flat = FlatTreeClassifier.from_classifier(classifier)
+    except ValueError as error:
+        logger.warning("Predicting with the classifier itself: %s", error)
+        return pipeline
+    if measure:
+        features = _sample_rows(classifier, _MEASURED_ROWS)
+        max_rows = measure_max_rows(classifier, flat, features)
+        logger.info(
+            "Predicting batches of up to %s tweets with the flat trees", max_rows
+        )
+        if max_rows is not None:
+            flat.set_params(classifier=classifier, max_rows=max_rows)
+    flattened = copy.copy(pipeline)
+    flattened.steps = pipeline.steps[:-1] + [(name, flat)]
+    return flattened
+
+
+def _seconds_per_row(predict, features, batch_size: int, repeats: int) -> float:
+    rows = np.random.RandomState(42).randint(len(features), size=(repeats, batch_size))
+    start = perf_counter()
+    for batch in rows:
+        predict(features[batch])
+    return (perf_counter() - start) / rows.size
+
+
+def main():
+    """Check that the flattened trees predict the same probabilities as the
+    classifier and compare their prediction times"""
+    parser = argparse.ArgumentParser(description="Check the flattened trees.")
+    parser.add_argument("test_set_file")
+    parser.add_argument("trained_model_file")
+    args = parser.parse_args()
+
+    pipeline = load_model(args.trained_model_file)
+    load_language_models(pipeline)
+    texts = read_table(args.test_set_file, columns=["text"])["text"]
+    features = pipeline[:-1].transform(texts)
+    classifier = pipeline[-1]
+    flat = FlatTreeClassifier.from_classifier(classifier)
+
+    expected = classifier.predict_proba(features)
+    probabilities = flat.predict_proba(features)
+    identical = np.array_equal(probabilities, expected)
+    print(
+        f"{len(features)} tweets, identical probabilities: {identical}, largest "
+        f"difference: {np.abs(probabilities - expected).max():.3g}"
+    )
+    for batch_size, repeats in [(1, 500), (1024, 5)]:
+        sklearn_time = _seconds_per_row(
+            classifier.predict_proba, features, batch_size, repeats
+        )
+        flat_time = _seconds_per_row(flat.predict_proba, features, batch_size, repeats)
+        print(
+            f"batch size {batch_size}: sklearn {sklearn_time * 1e6:.1f} us per "
+            f"tweet, flattened {flat_time * 1e6:.1f} us per tweet"
+        )
+    print(
+        "largest batch faster with the flattened trees: "
+        f"{measure_max_rows(classifier, flat, features)}"
+    )
+    if not identical:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
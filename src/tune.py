@@ -0,0 +1,303 @@
+"""Hyperparameter search for the gradient boosting classifier of train.py.
+
+The search reads the training set featurized once by src/featurize.py, so
+that no candidate embeds the tweets again. Candidates drawn at random from
+PARAM_DISTRIBUTIONS are compared by successive halving: every candidate is
+cross-validated (AUC, stratified folds) on a sample of the tweets, the best
+1/factor of them are kept and cross-validated again on factor times more
+tweets, until one is left or all the tweets are used.
+
+The fits run in a pool of processes. Each worker memory-maps the features,
+so they are shared between workers rather than copied, and uses a bounded
+number of OpenMP threads and a bounded amount of memory, by default the RAM
+of the machine divided between the workers. Every fit is a row of the
+results table, with its fit time and the peak memory of its worker; a fit
+which fails, e.g. for lack of memory, is a row with its error and no AUC,
+and its candidate is ranked last. The best parameters go to a JSON file,
+which train.py takes with --params.
+
+    python src/tune.py data/features reports/tune.csv reports/tune.json
+"""
+import argparse
+import functools
+import itertools
+import json
+import multiprocessing
+import os
+import resource
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from time import perf_counter
+from typing import List, Optional, Union
+
+import numpy as np
+import pandas as pd
+from scipy.stats import loguniform, randint
+from sklearn.experimental import enable_hist_gradient_boosting  # noqa
+from sklearn.ensemble import HistGradientBoostingClassifier
+from sklearn.metrics import roc_auc_score
+from sklearn.model_selection import ParameterSampler, StratifiedKFold, train_test_split
+
+from src.benchmark import peak_rss_mb
+from src.feature_store import read_meta
+
+PathLike = Union[str, Path]
+
+PARAM_DISTRIBUTIONS = dict(
+    learning_rate=loguniform(0.01, 0.5),
+    max_iter=randint(50, 400),
+    # FlatTreeClassifier predicts with trees of up to 64 leaves.
+    max_leaf_nodes=randint(8, 65),
+    min_samples_leaf=randint(5, 100),
+    l2_regularization=loguniform(1e-3, 10),
+)
+
+# The features and labels memory-mapped by each worker.
+_features: Optional[np.ndarray] = None
+_labels: Optional[np.ndarray] = None
+# The number of rows of features copied at a time by _gather_rows.
+_GATHER_ROWS = 4096
+
+
+def _init_worker(features_dir: str, memory_mb: Optional[int]):
+    global _features, _labels
+    if memory_mb is not None:
+        # RLIMIT_DATA bounds the memory the worker allocates, but not the
+        # shared libraries and memory-mapped features its address space also
+        # holds, which do not take RAM of their own.
+        limit = memory_mb * 2 ** 20
+        resource.setrlimit(resource.RLIMIT_DATA, (limit, limit))
+    _features = np.load(Path(features_dir) / "features.npy", mmap_mode="r")
+    _labels = np.load(Path(features_dir) / "labels.npy", mmap_mode="r")
+
+
+def _gather_rows(rows: np.ndarray) -> np.ndarray:
+    """Returns rows of the features as the float64 array the classifier
+    takes, converted block by block so that no other copy is made."""
+    features = np.empty((len(rows), _features.shape[1]), dtype=np.float64)
+    for start in range(0, len(rows), _GATHER_ROWS):
+        block = rows[start : start + _GATHER_ROWS]
+        features[start : start + len(block)] = _features[block]
+    return features
+
+
+def _fit_and_score(params: dict, train_rows: np.ndarray, test_rows: np.ndarray) -> dict:
+    classifier = HistGradientBoostingClassifier(random_state=42, **params)
+    start = perf_counter()
+    classifier.fit(_gather_rows(train_rows), _labels[train_rows])
+    fitted = perf_counter()
+    probabilities = classifier.predict_proba(_gather_rows(test_rows))[:, 1]
+    return dict(
+        auc=roc_auc_score(_labels[test_rows], probabilities),
+        fit_time_s=fitted - start,
+        score_time_s=perf_counter() - fitted,
+        worker_peak_rss_mb=peak_rss_mb(),
+    )
+
+
+def successive_halving(
+    features_dir: PathLike,
+    candidates: List[dict],
+    factor: int = 3,
+    min_samples: int = 2000,
+    n_splits: int = 3,
+    n_workers: int = 1,
+    worker_memory_mb: Optional[int] = None,
+    random_state: int = 42,
+) -> pd.DataFrame:
+    """Returns the trials of a successive halving search over the candidate
+    parameters of the classifier.
+
+    Args:
+        features_dir (str or Path) : the directory of a split of a feature
+        store, with dense features.
+        candidates (list) : the parameters of each candidate.
+        factor (int) : the fraction of the candidates kept after each rung,
+        and how many times more tweets the next rung uses.
+        min_samples (int) : the number of tweets of the first rung.
+        n_splits (int) : the number of cross-validation folds.
+        n_workers (int) : the number of worker processes.
+        worker_memory_mb (int) : optional limit of the memory allocated by
+        each worker, beyond which its fits fail.
+        random_state (int) : seed of the samples and folds.
+
+    Returns:
+        trials (pandas DataFrame) : one row per fit, with its rung, number
+        of tweets, candidate, fold, parameters, AUC, fit time and the peak
+        memory of the worker, or the error of a failed fit.
+
+    """
+    labels = np.load(Path(features_dir) / "labels.npy", mmap_mode="r")
+    folds = StratifiedKFold(n_splits=n_splits, shuffle=True, random_state=random_state)
+    remaining = list(range(len(candidates)))
+    trials = []
+    context = multiprocessing.get_context("spawn")
+    new_executor = functools.partial(
+        ProcessPoolExecutor,
+        max_workers=n_workers,
+        mp_context=context,
+        initializer=_init_worker,
+        initargs=(str(features_dir), worker_memory_mb),
+    )
+    executor = new_executor()
+    try:
+        for rung in itertools.count():
+            n_samples = min(len(labels), min_samples * factor ** rung)
+            rows = np.arange(len(labels))
+            if n_samples < len(labels):
+                rows, _ = train_test_split(
+                    rows,
+                    train_size=n_samples,
+                    stratify=labels,
+                    random_state=random_state,
+                )
+            splits = list(folds.split(rows, labels[rows]))
+            futures = []
+            for candidate in remaining:
+                for fold, (train, test) in enumerate(splits):
+                    future = executor.submit(
+                        _fit_and_score, candidates[candidate], rows[train], rows[test]
+                    )
+                    futures.append((candidate, fold, future))
+            broken = False
+            for candidate, fold, future in futures:
+                try:
+                    result = dict(future.result(), error=None)
+                except Exception as error:
+                    result = dict(auc=np.nan, error=repr(error))
+                    broken |= isinstance(error, BrokenProcessPool)
+                trials.append(
+                    dict(
+                        rung=rung,
+                        n_samples=n_samples,
+                        candidate=candidate,
+                        fold=fold,
+                        **candidates[candidate],
+                        **result,
+                    )
+                )
+            if broken:
+                # A worker died, e.g. killed for lack of memory, and every fit
+                # left in the pool failed with it.
+                executor.shutdown()
+                executor = new_executor()
+            if len(remaining) == 1 or n_samples == len(labels):
+                break
+            scores = pd.DataFrame(trials[-len(futures) :]).groupby("candidate")["auc"]
+            # A candidate with a failed fit has no mean AUC, sorted last.
+            best = scores.agg(lambda auc: auc.mean(skipna=False)).sort_values(
+                ascending=False, kind="mergesort"
+            )
+            remaining = list(best.index[: max(1, len(remaining) // factor)])
+    finally:
+        executor.shutdown()
+    return pd.DataFrame(trials)
+
+
+def default_worker_memory_mb(n_workers: int) -> int:
+    """Returns the RAM of the machine divided between the workers, in MB."""
+    ram = os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+    return ram // n_workers // 2 ** 20
+
+
+def sample_candidates(n_candidates: int, random_state: int = 42) -> List[dict]:
+    """Returns parameters of the classifier drawn from PARAM_DISTRIBUTIONS,
+    as plain Python numbers."""
+    sampler = ParameterSampler(
+        PARAM_DISTRIBUTIONS, n_candidates, random_state=random_state
+    )
+    return [
+        {name: np.asarray(value).item() for name, value in params.items()}
+        for params in sampler
+    ]
+
+
+def best_candidate(trials: pd.DataFrame, candidates: List[dict]) -> dict:
+    """Returns the candidate with the best mean AUC in the last rung, with
+    its parameters, AUC and the number of tweets it was evaluated on."""
+    last_rung = trials[trials["rung"] == trials["rung"].max()]
+    scores = last_rung.groupby("candidate")["auc"].agg(
+        lambda auc: auc.mean(skipna=False)
+    )
+    scores = scores.dropna()
+    if scores.empty:
+        raise ValueError(
+            f"Every fit of the last rung failed: {last_rung['error'].iloc[0]}"
+        )
+    candidate = int(scores.idxmax())
+    return dict(
+        params=candidates[candidate],
+        auc=float(scores[candidate]),
+        n_samples=int(last_rung["n_samples"].iloc[0]),
+    )
+
+
+def main():
+    """Search the parameters of the classifier on the features of the
+    training set"""
+    parser = argparse.ArgumentParser(description="Tune the classifier.")
+    parser.add_argument(
+        "store_dir", help="the feature store written by src/featurize.py"
+    )
+    parser.add_argument("trials_file")
+    parser.add_argument("params_file")
+    parser.add_argument("--candidates", type=int, default=27)
+    parser.add_argument("--factor", type=int, default=3)
+    parser.add_argument("--min-samples", type=int, default=2000)
+    parser.add_argument("--n-splits", type=int, default=3)
+    parser.add_argument("--threads-per-worker", type=int, default=1)
+    parser.add_argument(
+        "--workers",
+        type=int,
+        help="the number of worker processes, by default as many as fit the "
+        "CPUs with --threads-per-worker threads each",
+    )
+    parser.add_argument(
+        "--worker-memory-mb",
+        type=int,
+        help="the most memory a worker allocates, memory-mapped features "
+        "excluded, by default the RAM of the machine divided between the workers",
+    )
+    args = parser.parse_args()
+
+    if read_meta(args.store_dir)["featurizer"] != "spacy":
+        raise ValueError("Only the spaCy features of gradient boosting can be tuned.")
+    candidates = sample_candidates(args.candidates)
+    n_workers = args.workers or max(1, os.cpu_count() // args.threads_per_worker)
+    worker_memory_mb = args.worker_memory_mb or default_worker_memory_mb(n_workers)
+    # The spawned workers read their number of OpenMP threads from the
+    # environment when they start.
+    os.environ["OMP_NUM_THREADS"] = str(args.threads_per_worker)
+    start = perf_counter()
+    trials = successive_halving(
+        Path(args.store_dir) / "train",
+        candidates,
+        args.factor,
+        args.min_samples,
+        args.n_splits,
+        n_workers,
+        worker_memory_mb,
+    )
+    search_s = perf_counter() - start
+
+    best = best_candidate(trials, candidates)
+    results = dict(
+        best,
+        candidates=len(candidates),
+        fits=len(trials),
+        failed_fits=int(trials["error"].notna().sum()),
+        workers=n_workers,
+        worker_memory_mb=worker_memory_mb,
+        search_s=search_s,
+        total_fit_time_s=float(trials["fit_time_s"].sum()),
+    )
+    print(json.dumps(results, indent=4))
+    Path(args.trials_file).parent.mkdir(parents=True, exist_ok=True)
+    trials.to_csv(args.trials_file, index=False)
+    with open(args.params_file, "w") as file:
+        json.dump(results, file, ensure_ascii=False, indent=4)
+
+
+if __name__ == "__main__":
+    main()
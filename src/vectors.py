@@ -0,0 +1,266 @@
+"""Word vector tables for computing document vectors with NumPy.
+
+A table can be pruned to the words of a corpus and quantized, then saved
+to a directory holding ``meta.json`` and one ``.npy`` file per array, which
+are memory-mapped when the table is loaded, so worker processes share
+their pages.
+"""
+import hashlib
+import json
+from pathlib import Path
+from typing import Optional, Union
+
+import numpy as np
+
+PathLike = Union[str, Path]
+
+QUANTIZATIONS = ["float32", "float16", "int8"]
+_ARRAYS = ["keys", "rows", "data", "scales"]
+_NEAREST_BATCH = 1024
+
+
+class VectorTable:
+    """Word vectors as a contiguous matrix, looked up by the spaCy lexeme IDs
+    (ORTH) of the tokens.
+
+    The last row of the matrix is all zeros and stands for the words without
+    a vector, as spaCy does. The matrix is float32, float16, or int8 with a
+    float32 scale per row, the vectors being the rows times their scale.
+
+    Args:
+        keys (numpy array) : the lexeme IDs with a vector.
+        rows (numpy array) : the row of data holding the vector of each key.
+        data (numpy array) : the vectors, one row per distinct vector.
+        scales (numpy array) : the scale of each row of int8 data.
+
+    """
+
+    def __init__(
+        self,
+        keys: np.ndarray,
+        rows: np.ndarray,
+        data: np.ndarray,
+        scales: Optional[np.ndarray] = None,
+    ):
+        order = np.argsort(keys)
+        self.keys = np.ascontiguousarray(keys[order], dtype=np.uint64)
+        self.rows = np.ascontiguousarray(rows[order], dtype=np.int64)
+        dimension = data.shape[1]
+        dtype = data.dtype if data.dtype in (np.float16, np.int8) else np.float32
+        self.data = np.ascontiguousarray(
+            np.vstack([data, np.zeros((1, dimension), dtype=data.dtype)]), dtype=dtype
+        )
+        self.scales = None
+        if scales is not None:
+            self.scales = np.append(scales, 0).astype(np.float32)
+
+    @classmethod
+    def from_vocab(cls, vocab) -> "VectorTable":
+        """Returns the table of the vectors of a spaCy vocabulary."""
+        key2row = vocab.vectors.key2row
+        keys = np.fromiter(key2row.keys(), dtype=np.uint64, count=len(key2row))
+        rows = np.fromiter(key2row.values(), dtype=np.int64, count=len(key2row))
+        return cls(keys, rows, np.asarray(vocab.vectors.data))
+
+    @property
+    def dimension(self) -> int:
+        return self.data.shape[1]
+
+    @property
+    def oov_row(self) -> int:
+        return len(self.data) - 1
+
+    @property
+    def quantization(self) -> str:
+        return str(self.data.dtype)
+
+    @property
+    def nbytes(self) -> int:
+        """Returns the memory taken by the arrays of the table."""
+        return sum(
+            getattr(self, name).nbytes
+            for name in _ARRAYS
+            if getattr(self, name) is not None
+        )
+
+    def rows_of(self, keys: np.ndarray) -> np.ndarray:
+        """Returns the row of the vector of each lexeme ID, the all-zeros row
+        for the IDs without a vector."""
+        keys = np.asarray(keys, dtype=np.uint64)
+        if not len(self.keys):
+            return np.full(len(keys), self.oov_row, dtype=np.int64)
+        positions = np.minimum(np.searchsorted(self.keys, keys), len(self.keys) - 1)
+        return np.where(
+            self.keys[positions] == keys, self.rows[positions], self.oov_row
+        )
+
+    def vectors(self, rows: np.ndarray) -> np.ndarray:
+        """Returns the float32 vectors of rows of the table."""
+        vectors = self.data[rows].astype(np.float32)
+        if self.scales is not None:
+            vectors *= self.scales[rows, None]
+        return vectors
+
+    def mean_vectors(self, keys: np.ndarray, lengths: np.ndarray) -> np.ndarray:
+        """Returns the average vector of the tokens of each document, the way
+        spaCy computes doc.vector.
+
+        Args:
+            keys (numpy array) : the lexeme IDs of the tokens of all the
+            documents, one document after the other.
+            lengths (numpy array) : the number of tokens of each document.
+
+        Returns:
+            vectors (numpy array) : float32 matrix with one row per document,
+            zero for the documents without tokens.
+
+        """
+        return mean_rows(self.data, self.rows_of(keys), lengths, self.scales)
+
+    def prune(self, keep_keys: np.ndarray, fallback: bool = True) -> "VectorTable":
+        """Returns the table holding only the vectors of some words.
+
+        Args:
+            keep_keys (numpy array) : the lexeme IDs of the words to keep,
+            e.g. those of a corpus.
+            fallback (bool) : whether the words not kept still have a
+            vector: the kept vector nearest to theirs, by cosine similarity.
+            Otherwise they have none.
+
+        Returns:
+            table (VectorTable) : the pruned table.
+
+        """
+        kept_rows = np.unique(self.rows_of(keep_keys))
+        kept_rows = kept_rows[kept_rows != self.oov_row]
+        new_rows = np.full(self.oov_row, -1, dtype=np.int64)
+        new_rows[kept_rows] = np.arange(len(kept_rows))
+        if fallback and len(kept_rows):
+            dropped = np.setdiff1d(self.rows, kept_rows)
+            new_rows[dropped] = self._nearest(dropped, kept_rows)
+        rows = new_rows[self.rows]
+        has_vector = rows >= 0
+        scales = None if self.scales is None else self.scales[kept_rows]
+        return VectorTable(
+            self.keys[has_vector], rows[has_vector], self.data[kept_rows], scales
+        )
+
+    def _nearest(self, rows: np.ndarray, candidates: np.ndarray) -> np.ndarray:
+        """Returns the position in candidates of the row nearest to each row,
+        by cosine similarity."""
+        candidate_vectors = _normalized(self.vectors(candidates))
+        nearest = np.empty(len(rows), dtype=np.int64)
+        for start in range(0, len(rows), _NEAREST_BATCH):
+            batch = _normalized(self.vectors(rows[start : start + _NEAREST_BATCH]))
+            nearest[start : start + len(batch)] = np.argmax(
+                batch @ candidate_vectors.T, axis=1
+            )
+        return nearest
+
+    def quantize(self, quantization: str) -> "VectorTable":
+        """Returns the table with its vectors stored as float32, float16, or
+        int8 with a scale per row, mapping the largest absolute value of the
+        row to 127."""
+        if quantization not in QUANTIZATIONS:
+            raise ValueError(
+                f"Unknown quantization {quantization!r}, expected one of "
+                f"{QUANTIZATIONS}."
+            )
+        vectors = self.vectors(np.arange(self.oov_row))
+        scales = None
+        if quantization == "int8":
+            scales = np.abs(vectors).max(axis=1) / 127
+            divisors = np.where(scales > 0, scales, 1)[:, None]
+            data = np.round(vectors / divisors).astype(np.int8)
+        else:
+            data = vectors.astype(quantization)
+        return VectorTable(self.keys, self.rows, data, scales)
+
+    def checksum(self) -> str:
+        """Returns the MD5 checksum of the arrays of the table."""
+        checksum = hashlib.md5()
+        for name in _ARRAYS:
+            array = getattr(self, name)
+            if array is not None:
+                checksum.update(np.ascontiguousarray(array))
+        return checksum.hexdigest()
+
+    def save(self, directory: PathLike, **meta):
+        """Writes the table to a directory, with meta in meta.json."""
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        for name in _ARRAYS:
+            array = getattr(self, name)
+            if array is not None:
+                np.save(directory / f"{name}.npy", array)
+        meta = dict(meta, quantization=self.quantization, checksum=self.checksum())
+        with open(directory / "meta.json", "w") as file:
+            json.dump(meta, file, indent=4)
+
+    @classmethod
+    def load(cls, directory: PathLike) -> "VectorTable":
+        """Returns the table saved in a directory, its arrays memory-mapped."""
+        directory = Path(directory)
+        table = cls.__new__(cls)
+        for name in _ARRAYS:
+            path = directory / f"{name}.npy"
+            array = np.load(path, mmap_mode="r") if path.exists() else None
+            # Plain arrays over the mapped files index faster than np.memmap.
+            setattr(table, name, None if array is None else np.asarray(array))
+        return table
+
+
+def _normalized(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms > 0, norms, 1)
+
+
+def mean_rows(
+    data: np.ndarray,
+    rows: np.ndarray,
+    lengths: np.ndarray,
+    scales: Optional[np.ndarray] = None,
+) -> np.ndarray:
+    """Returns the average of the rows of data of each document, summed token
+    after token as spaCy does, so that the result is the same to the bit.
+
+    Args:
+        data (numpy array) : the vectors.
+        rows (numpy array) : the row of data of each token of all the
+        documents, one document after the other.
+        lengths (numpy array) : the number of tokens of each document.
+        scales (numpy array) : the scale of each row of int8 data.
+
+    Returns:
+        vectors (numpy array) : float32 matrix with one row per document,
+        zero for the documents without tokens.
+
+    """
+    lengths = np.asarray(lengths, dtype=np.int64)
+    vectors = np.zeros((len(lengths), data.shape[1]), dtype=np.float32)
+    if not len(lengths):
+        return vectors
+    token_vectors = data[rows].astype(np.float32, copy=False)
+    if scales is not None:
+        token_vectors *= scales[rows, None]
+    if len(lengths) == 1:
+        # A single document, e.g. when serving, is summed in one operation:
+        # cumsum adds its tokens in order.
+        if len(token_vectors):
+            vectors[0] = np.cumsum(token_vectors, axis=0)[-1]
+    else:
+        starts = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+        # With the longest documents first, those with an i-th token are the
+        # first ones.
+        order = np.argsort(-lengths, kind="stable")
+        starts, sorted_lengths = starts[order], lengths[order]
+        n_documents = np.searchsorted(-sorted_lengths, -np.arange(sorted_lengths[0]))
+        sums = np.zeros_like(vectors)
+        # Adding the i-th token of every document at once keeps the order of
+        # the sum within a document, unlike np.add.reduceat.
+        for position, count in enumerate(n_documents):
+            sums[:count] += token_vectors[starts[:count] + position]
+        vectors[order] = sums
+    non_empty = lengths > 0
+    vectors[non_empty] /= lengths[non_empty, None].astype(np.float32)
+    return vectors
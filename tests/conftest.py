@@ -1,8 +1,13 @@
+import numpy as np
 import pandas as pd
 import pytest
+import spacy
 
 from src.text.utils import contractions
-from tests.domain_objects_for_testing import create_dataframe_of_labeled_tweets
+from tests.domain_objects_for_testing import (
+    create_dataframe_of_labeled_tweets,
+    language_model_words,
+)
 
 
 @pytest.fixture
@@ -18,3 +23,21 @@ def contractions_mapping() -> pd.DataFrame:
 @pytest.fixture
 def labeled_tweets() -> pd.DataFrame:
     return create_dataframe_of_labeled_tweets()
+
+
+@pytest.fixture
+def language_model(tmp_path) -> str:
+    """A blank English spaCy model with random vectors for a few words and
+    a sentencizer, saved in a temporary directory, which SpacyTransformer
+    takes as model_name."""
+    nlp = spacy.blank("en")
+    try:
+        nlp.add_pipe("sentencizer")
+    except ValueError:
+        # spaCy 2 takes the component itself.
+        nlp.add_pipe(nlp.create_pipe("sentencizer"))
+    random = np.random.RandomState(0)
+    for word in language_model_words():
+        nlp.vocab.set_vector(word, random.normal(size=8).astype(np.float32))
+    nlp.to_disk(tmp_path / "language-model")
+    return str(tmp_path / "language-model")
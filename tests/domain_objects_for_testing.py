@@ -1,4 +1,4 @@
-from typing import Dict
+from typing import Dict, List
 
 import pandas as pd
 
@@ -80,3 +80,8 @@ def create_dataframe_of_labeled_tweets() -> pd.DataFrame:
             "label": pd.Series([1 if number % 2 == 0 else 0 for number in range(0, 4)]),
         }
     )
+
+
+def language_model_words() -> List[str]:
+    """The words given a vector by the language_model fixture."""
+    return "women kitchen bitch game great friends lovely the a".split()
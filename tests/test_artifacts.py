@@ -0,0 +1,56 @@
+import pickle
+
+import numpy as np
+import pytest
+import spacy
+from sklearn.linear_model import LogisticRegression
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import StandardScaler
+
+from src import transformers
+from src.artifacts import load_model, save_model
+from src.transformers import SpacyTransformer
+
+
+def test_save_and_load_model_round_trip(tmp_path):
+    x, y = np.array([[0.0], [1.0], [2.0], [3.0]]), np.array([0, 0, 1, 1])
+    pipeline = Pipeline(
+        [("scaler", StandardScaler()), ("classifier", LogisticRegression())]
+    ).fit(x, y)
+    path = tmp_path / "model.pkl"
+
+    save_model(pipeline, path)
+    loaded = load_model(path)
+
+    assert np.allclose(loaded.predict_proba(x), pipeline.predict_proba(x))
+
+
+def test_load_model_rejects_bare_pickles(tmp_path):
+    path = tmp_path / "model.pkl"
+    with open(path, "wb") as handler:
+        pickle.dump(LogisticRegression(), handler)
+
+    with pytest.raises(ValueError, match="not a misog-model artifact"):
+        load_model(path)
+
+
+def test_spacy_transformer_is_pickled_without_its_language_model(language_model):
+    transformer = SpacyTransformer(model_name=language_model).fit(["the women"], None)
+
+    unpickled = pickle.loads(pickle.dumps(transformer))
+
+    assert "nlp_" in transformer.__dict__
+    assert "nlp_" not in unpickled.__dict__
+    assert unpickled.language_model_ == transformer.language_model_
+
+
+def test_load_language_model_rejects_other_vectors(language_model, monkeypatch):
+    transformer = SpacyTransformer(model_name=language_model).fit(["the women"], None)
+    unpickled = pickle.loads(pickle.dumps(transformer))
+    nlp = spacy.load(language_model)
+    nlp.vocab.set_vector("women", np.ones(8, dtype=np.float32))
+    nlp.to_disk(language_model)
+    monkeypatch.setattr(transformers, "_language_models", {})
+
+    with pytest.raises(ValueError, match="is installed"):
+        unpickled.load_language_model()
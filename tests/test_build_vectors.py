@@ -0,0 +1,59 @@
+import pickle
+
+import numpy as np
+import pandas as pd
+import pytest
+import spacy
+
+from src.build_vectors import build_vectors
+from src.transformers import SpacyTransformer
+from tests.domain_objects_for_testing import language_model_words
+
+WORDS = language_model_words()
+TEXTS = pd.Series(["the women kitchen", "a great game @user", "lovely friends!"])
+
+
+def test_transformer_with_pruned_vectors_matches_language_model(
+    tmp_path, language_model
+):
+    nlp = spacy.load(language_model)
+    summary = build_vectors(nlp, language_model, TEXTS, tmp_path / "vectors")
+    transformer = SpacyTransformer(model_name=language_model).fit(TEXTS, None)
+
+    pruned = transformer.with_vectors(str(tmp_path / "vectors"))
+    table = pruned.vector_table()
+    unpickled = pickle.loads(pickle.dumps(pruned))
+
+    assert summary["keys"] == dict(before=len(WORDS), after=len(WORDS))
+    assert summary["vectors"] == dict(before=len(WORDS), after=len(WORDS) - 1)
+    expected = transformer.transform(TEXTS)
+    assert np.array_equal(pruned.transform(TEXTS), expected)
+    assert np.array_equal(unpickled.transform(TEXTS), expected)
+    assert pruned.language_model_["source"] == transformer.language_model_
+    assert table.checksum() == pruned.language_model_["vectors_checksum"]
+
+
+def test_words_dropped_get_the_nearest_kept_vector(tmp_path, language_model):
+    nlp = spacy.load(language_model)
+    build_vectors(nlp, language_model, TEXTS[:1], tmp_path / "vectors", "int8")
+    transformer = SpacyTransformer(
+        vectors_dir=str(tmp_path / "vectors"), cache_dir=str(tmp_path / "cache")
+    )
+
+    features = transformer.fit(TEXTS, None).transform(["game"])
+
+    kept = np.array([nlp.vocab.get_vector(word) for word in ["the", "women", "kitchen"]])
+    game = nlp.vocab.get_vector("game")
+    similarities = kept @ game / np.linalg.norm(kept, axis=1)
+    nearest = kept[np.argmax(similarities)]
+    assert np.allclose(features[0], nearest, atol=0.02 * np.abs(nearest).max())
+
+
+def test_modified_vectors_are_rejected(tmp_path, language_model):
+    nlp = spacy.load(language_model)
+    build_vectors(nlp, language_model, TEXTS, tmp_path / "vectors")
+    data = np.load(tmp_path / "vectors" / "data.npy")
+    np.save(tmp_path / "vectors" / "data.npy", data * 2)
+
+    with pytest.raises(ValueError, match="checksum"):
+        SpacyTransformer(vectors_dir=str(tmp_path / "vectors")).fit(TEXTS, None)
@@ -0,0 +1,111 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.dataset import (
+    HashSplitter,
+    TableWriter,
+    _read_arrow_batches,
+    hash_split,
+    read_chunks,
+    read_table,
+    write_table,
+)
+
+
+def make_labeled_dataframe(rows, rare_every):
+    return pd.DataFrame(
+        {
+            "text": [f"tweet {i}" for i in range(rows)],
+            "label": [int(i % rare_every == 0) for i in range(rows)],
+        }
+    )
+
+
+def test_hash_split_is_deterministic():
+    dataframe = make_labeled_dataframe(1000, rare_every=3)
+
+    is_train = hash_split(dataframe)
+
+    assert np.array_equal(hash_split(dataframe), is_train)
+    assert is_train.sum() == 800
+
+
+def test_rare_label_splits_at_train_size_whatever_the_chunks():
+    dataframe = make_labeled_dataframe(1003, rare_every=50)
+    whole = hash_split(dataframe)
+
+    for chunksize in (1, 97, 500):
+        splitter = HashSplitter(train_size=0.8)
+        chunks = [
+            dataframe.iloc[start : start + chunksize]
+            for start in range(0, 1003, chunksize)
+        ]
+        is_train = np.concatenate([splitter.split(chunk) for chunk in chunks])
+
+        assert np.array_equal(is_train, whole)
+    for label in (0, 1):
+        of_label = (dataframe["label"] == label).to_numpy()
+        assert abs(whole[of_label].sum() - 0.8 * of_label.sum()) <= 1
+    assert splitter.label_counts == {0: 982, 1: 21}
+
+
+def test_rows_follow_their_hash_unless_the_split_drifts():
+    dataframe = make_labeled_dataframe(2000, rare_every=2)
+    by_hash = HashSplitter(max_deviation=np.inf).split(dataframe)
+    shuffled = HashSplitter(max_deviation=np.inf).split(dataframe.iloc[::-1])
+
+    is_train = hash_split(dataframe)
+
+    assert np.array_equal(shuffled[::-1], by_hash)
+    assert (is_train == by_hash).mean() > 0.8
+
+
+def test_rows_without_label_are_split_too():
+    dataframe = make_labeled_dataframe(100, rare_every=3)
+    dataframe["label"] = dataframe["label"].astype(float)
+    dataframe.loc[::2, "label"] = np.nan
+
+    is_train = hash_split(dataframe)
+
+    missing = dataframe["label"].isna().to_numpy()
+    assert abs(is_train[missing].sum() - 0.8 * missing.sum()) <= 1
+
+
+@pytest.mark.parametrize("extension", [".csv", ".parquet", ".feather"])
+def test_table_round_trips(tmp_path, labeled_tweets, extension):
+    path = tmp_path / f"tweets{extension}"
+
+    write_table(labeled_tweets, path)
+
+    assert read_table(path).equals(labeled_tweets)
+    assert list(read_table(path, columns=["label"]).columns) == ["label"]
+
+
+@pytest.mark.parametrize("extension", [".csv", ".parquet", ".feather"])
+def test_table_writer_round_trips_chunks(tmp_path, labeled_tweets, extension):
+    path = tmp_path / f"tweets{extension}"
+    write_table(labeled_tweets, tmp_path / f"input{extension}")
+
+    with TableWriter(path) as writer:
+        for chunk in read_chunks(tmp_path / f"input{extension}", chunksize=3):
+            writer.write(chunk)
+
+    assert writer.rows_written == len(labeled_tweets)
+    assert read_table(path).equals(labeled_tweets)
+
+
+def test_read_table_rejects_unknown_extension(tmp_path):
+    with pytest.raises(ValueError):
+        read_table(tmp_path / "tweets.xlsx")
+
+
+@pytest.mark.parametrize("extension", [".parquet", ".feather"])
+def test_written_tables_stream_in_row_groups(tmp_path, extension):
+    dataframe = make_labeled_dataframe(25, rare_every=3)
+    path = tmp_path / f"tweets{extension}"
+
+    write_table(dataframe, path, row_group_size=10)
+
+    batches = list(_read_arrow_batches(path, extension[1:], None))
+    assert [batch.num_rows for batch in batches] == [10, 10, 5]
@@ -0,0 +1,90 @@
+import numpy as np
+
+from src.text.embeddings import EmbeddingStore
+from src.text.utils import get_embedding_matrix, get_embeddings, init_embeddings
+
+GLOVE = "the 0.1 0.2 0.3\ncat 1 2 3\n. . . 4 5 6\nthe 7 8 9\n"
+
+
+def write_glove(tmp_path, content=GLOVE):
+    path = tmp_path / "glove.3d.txt"
+    path.write_text(content, encoding="utf-8")
+    return path
+
+
+def test_store_looks_words_up_like_a_dictionary(tmp_path):
+    store = EmbeddingStore.convert(write_glove(tmp_path), tmp_path / "glove.store")
+
+    assert len(store) == 3
+    assert store.dimension == 3
+    assert list(store["cat"]) == [1, 2, 3]
+    # The last vector of a repeated word wins, as in a dictionary.
+    assert list(store.get("the")) == [7, 8, 9]
+    assert list(store[". . ."]) == [4, 5, 6]
+    assert "dog" not in store
+    assert store.get("dog") is None
+    assert list(store.rows_of(["cat", "dog", "the"])) == [1, -1, 3]
+    assert list(store.words()) == ["the", "cat", ". . .", "the"]
+
+
+def test_store_skips_word2vec_header(tmp_path):
+    path = write_glove(tmp_path, "2 3\ncat 1 2 3\ndog 4 5 6\n")
+
+    store = EmbeddingStore.convert(path, tmp_path / "glove.store")
+
+    assert len(store) == 2
+    assert list(store["dog"]) == [4, 5, 6]
+
+
+def test_store_reads_one_dimensional_vectors(tmp_path):
+    path = write_glove(tmp_path, "cat 1.5\n2 0.5\n")
+
+    store = EmbeddingStore.convert(path, tmp_path / "glove.store")
+
+    assert store.dimension == 1
+    assert list(store["cat"]) == [1.5]
+    assert list(store["2"]) == [0.5]
+
+
+def test_get_embeddings_converts_once(tmp_path):
+    path = write_glove(tmp_path)
+
+    first = get_embeddings(path)
+    vectors_file = tmp_path / "glove.3d.store" / "vectors.f32"
+    converted_at = vectors_file.stat().st_mtime_ns
+    second = get_embeddings(path)
+
+    assert isinstance(second.vectors, np.memmap)
+    assert vectors_file.stat().st_mtime_ns == converted_at
+    assert first.identity == second.identity
+
+
+def test_init_embeddings_caches_per_word_index(tmp_path):
+    path = write_glove(tmp_path)
+    cache_dir = tmp_path / "matrices"
+
+    matrix = init_embeddings({"cat": 1, "dog": 2}, 10, 3, path, cache_dir)
+    other = init_embeddings({"the": 1}, 10, 3, path, cache_dir)
+    cached = init_embeddings({"cat": 1, "dog": 2}, 10, 3, path, cache_dir)
+
+    assert len(list(cache_dir.iterdir())) == 2
+    assert np.array_equal(matrix, cached)
+    assert np.array_equal(
+        matrix, get_embedding_matrix(get_embeddings(path), {"cat": 1, "dog": 2}, 10, 3)
+    )
+    assert list(other[1]) == [7, 8, 9]
+
+
+def test_embedding_matrix_from_store_and_dictionary(tmp_path):
+    store = get_embeddings(write_glove(tmp_path))
+    dictionary = {"the": np.array([7, 8, 9]), "cat": np.array([1, 2, 3])}
+    word_index = {"the": 1, "dog": 2, "cat": 3, "rare": 4}
+
+    matrix, coverage = get_embedding_matrix(
+        store, word_index, 3, 3, dtype=np.float32, return_coverage=True
+    )
+
+    assert matrix.dtype == np.float32
+    assert matrix.tolist() == [[0, 0, 0], [7, 8, 9], [0, 0, 0], [1, 2, 3]]
+    assert coverage == dict(words=3, found=2, missing=1, null_rows=2)
+    assert np.array_equal(get_embedding_matrix(dictionary, word_index, 3, 3), matrix)
@@ -1,4 +1,9 @@
+import numpy as np
+import pandas as pd
+
 from src.text.utils import (
+    curse_words,
+    curse_word_densities,
     density_of_curse_words_in_sentence,
     density_of_curse_words_in_corpus,
     create_ngrams,
@@ -28,6 +33,34 @@ def test_calculates_density_of_curse_words_in_corpus(labeled_tweets):
     assert sum(density_of_curse_words_in_corpus(labeled_tweets).values()) == 0.0
 
 
+def test_curse_word_densities_match_sentence_densities(labeled_tweets):
+    tweets = list(labeled_tweets["text"]) + [
+        "fuck shit\tfucks  ASS hell, tits",
+        "",
+        "\tdamn\n cum cums",
+        "nul\x00 fuck",
+    ]
+
+    densities = curse_word_densities(tweets, chunksize=3)
+
+    assert densities.shape == (len(tweets), len(curse_words()))
+    assert densities.tolist() == [
+        list(density_of_curse_words_in_sentence(tweet).values()) for tweet in tweets
+    ]
+
+
+def test_density_of_curse_words_in_corpus_per_tweet():
+    dataframe = pd.DataFrame({"text": ["fuck you", "hell no hell", "nothing"]})
+
+    count, densities = density_of_curse_words_in_corpus(
+        dataframe, return_per_tweet=True
+    )
+
+    assert count["fuck"] == 0.5 / 3
+    assert np.isclose(count["hell"], (2 / 3) / 3)
+    assert densities[1, curse_words().index("hell")] == 2 / 3
+
+
 def test_create_ngrams(labeled_tweets):
     unigrams = create_ngrams(labeled_tweets.loc[0, "text"], 1)
     bigrams = create_ngrams(labeled_tweets.loc[0, "text"], 2)
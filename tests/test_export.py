@@ -0,0 +1,80 @@
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.experimental import enable_hist_gradient_boosting  # noqa
+from sklearn.ensemble import HistGradientBoostingClassifier
+from sklearn.linear_model import LogisticRegression
+from sklearn.pipeline import make_pipeline
+
+from src.export import ExportedModel, export_model
+from src.transformers import SpacyTransformer
+from tests.domain_objects_for_testing import language_model_words
+
+WORDS = language_model_words()
+
+
+def make_tweets():
+    random = np.random.RandomState(1)
+    labels = random.randint(2, size=60)
+    texts = [
+        " ".join(random.choice(WORDS[3 * (1 - label) :], size=random.randint(1, 9)))
+        + " @user!"
+        for label in labels
+    ]
+    return pd.Series(texts), labels
+
+
+def test_exported_model_matches_pipeline(tmp_path, language_model):
+    texts, labels = make_tweets()
+    pipeline = make_pipeline(
+        SpacyTransformer(model_name=language_model),
+        HistGradientBoostingClassifier(max_iter=10, min_samples_leaf=5),
+    ).fit(texts, labels)
+    nlp = pipeline[0].load_language_model()
+
+    summary = export_model(pipeline, texts, tmp_path / "export.npz")
+    exported = ExportedModel(tmp_path / "export.npz")
+    token_lists = [[token.text for token in nlp.tokenizer(text)] for text in texts]
+
+    assert summary["words"] == len(WORDS)
+    assert np.array_equal(
+        exported.predict_proba(token_lists), pipeline.predict_proba(texts)
+    )
+
+
+def test_exported_model_scores_raw_text(tmp_path, language_model):
+    texts, labels = make_tweets()
+    pipeline = make_pipeline(
+        SpacyTransformer(model_name=language_model),
+        HistGradientBoostingClassifier(max_iter=10, min_samples_leaf=5),
+    ).fit(texts, labels)
+    export_model(pipeline, texts, tmp_path / "export.npz")
+    exported = ExportedModel(tmp_path / "export.npz")
+
+    assert exported.tokenize("I don't think she's right!!! #tag @user :)") == [
+        "I",
+        "do",
+        "n't",
+        "think",
+        "she",
+        "'s",
+        "right",
+        "!",
+        "!",
+        "!",
+        "#",
+        "tag",
+        "@user",
+        ":)",
+    ]
+    assert np.array_equal(
+        exported.predict_proba_texts(texts), pipeline.predict_proba(texts)
+    )
+
+
+def test_export_rejects_other_pipelines(tmp_path):
+    texts, labels = make_tweets()
+    pipeline = make_pipeline(LogisticRegression())
+
+    with pytest.raises(ValueError, match="can be exported"):
+        export_model(pipeline, texts, tmp_path / "export.npz")
@@ -0,0 +1,69 @@
+import numpy as np
+
+from src.feature_cache import DocVectorCache
+
+
+def vectors_of(texts):
+    return np.array([[len(text), index, 1.0] for index, text in enumerate(texts)])
+
+
+def test_cache_returns_stored_vectors_after_reopening(tmp_path):
+    texts = ["a tweet", "another tweet"]
+    cache = DocVectorCache(tmp_path, "model-1", 3)
+    cache.put_many(texts, vectors_of(texts))
+    cache.flush()
+
+    vectors, found = DocVectorCache(tmp_path, "model-1", 3).get_many(
+        ["another tweet", "unseen", "a tweet"]
+    )
+
+    assert list(found) == [True, False, True]
+    assert np.array_equal(vectors[0], vectors_of(texts)[1])
+    assert np.array_equal(vectors[1], np.zeros(3))
+    assert vectors.dtype == np.float32
+
+
+def test_cache_counts_hits_and_misses(tmp_path):
+    cache = DocVectorCache(tmp_path, "model-1", 3)
+    cache.put_many(["a"], vectors_of(["a"]))
+    cache.flush()
+
+    cache.get_many(["a", "b", "a"])
+
+    assert (cache.stats.hits, cache.stats.misses) == (2, 1)
+    assert cache.stats.hit_rate == 2 / 3
+
+
+def test_cache_is_emptied_when_the_model_changes(tmp_path):
+    cache = DocVectorCache(tmp_path, "model-1", 3)
+    cache.put_many(["a"], vectors_of(["a"]))
+    cache.flush()
+
+    _, found = DocVectorCache(tmp_path, "model-2", 3).get_many(["a"])
+
+    assert not found.any()
+
+
+def test_cache_evicts_least_recently_used_vectors(tmp_path):
+    cache = DocVectorCache(tmp_path, "model-1", 3, max_entries=3)
+    cache.put_many(["a", "b", "c"], vectors_of(["a", "b", "c"]))
+    cache.flush()
+    cache.get_many(["a", "c"])
+
+    cache.put_many(["d"], vectors_of(["d"]))
+    cache.flush()
+
+    _, found = cache.get_many(["a", "b", "c", "d"])
+    assert cache.stats.evictions == 2
+    assert len(cache) == 2
+    assert list(found) == [False, False, True, True]
+
+
+def test_cache_ignores_texts_put_twice(tmp_path):
+    cache = DocVectorCache(tmp_path, "model-1", 3)
+    cache.put_many(["a", "a"], vectors_of(["a", "a"]))
+    cache.flush()
+    cache.put_many(["a"], vectors_of(["a"]))
+    cache.flush()
+
+    assert len(cache) == 1
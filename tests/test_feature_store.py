@@ -0,0 +1,148 @@
+import functools
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.linear_model import LogisticRegression
+from sklearn.pipeline import make_pipeline
+
+from src import featurizers, train
+from src.artifacts import language_model_references, load_model
+from src.dataset import write_table
+from src.evaluate import measure_model, stored_test_features
+from src.feature_store import load_features, load_featurizer, read_meta, save_features
+from src.featurize import featurize
+from src.transformers import SpacyTransformer
+from tests.domain_objects_for_testing import language_model_words
+
+
+@pytest.fixture
+def spacy_datasets(tmp_path, monkeypatch, language_model):
+    """Training and test sets of the words of the blank language model,
+    which train.py featurizes with instead of en_core_web_md."""
+    monkeypatch.setattr(
+        featurizers,
+        "SpacyTransformer",
+        functools.partial(SpacyTransformer, model_name=language_model),
+    )
+    random = np.random.RandomState(0)
+    for name, rows in [("train", 60), ("test", 20)]:
+        texts = [
+            " ".join(random.choice(language_model_words(), size=random.randint(1, 6)))
+            for _ in range(rows)
+        ]
+        labels = [int("kitchen" in text) for text in texts]
+        write_table(
+            pd.DataFrame(dict(text=texts, label=labels)), tmp_path / f"{name}.csv"
+        )
+    return tmp_path / "train.csv", tmp_path / "test.csv"
+
+
+def test_featurized_sets_match_the_featurizer(tmp_path, labeled_tweets):
+    write_table(labeled_tweets, tmp_path / "train.csv")
+    write_table(labeled_tweets.iloc[::-1], tmp_path / "test.csv")
+
+    featurize(
+        tmp_path / "train.csv",
+        tmp_path / "test.csv",
+        tmp_path / "features",
+        featurizer_name="hashing",
+        chunksize=2,
+    )
+    featurizer = load_featurizer(tmp_path / "features")
+    features, labels = load_features(tmp_path / "features", "test")
+
+    assert read_meta(tmp_path / "features")["test"]["rows"] == len(labeled_tweets)
+    assert np.array_equal(labels, labeled_tweets["label"].to_numpy()[::-1])
+    expected = featurizer.transform(labeled_tweets["text"].iloc[::-1])
+    assert abs(features - expected).max() < 1e-6
+
+
+def test_dense_features_are_memory_mapped(tmp_path):
+    features = np.arange(12, dtype=np.float32).reshape(4, 3)
+
+    save_features(features, np.array([0, 1, 1, 0]), tmp_path / "train")
+    loaded, labels = load_features(tmp_path, "train")
+
+    assert isinstance(loaded, np.memmap)
+    assert np.array_equal(loaded, features)
+    assert list(labels) == [0, 1, 1, 0]
+
+
+def test_spacy_features_are_those_of_the_language_model(tmp_path, spacy_datasets):
+    train_set_file, test_set_file = spacy_datasets
+
+    meta = featurize(train_set_file, test_set_file, tmp_path / "features", chunksize=7)
+    featurizer = load_featurizer(tmp_path / "features")
+    features, _ = load_features(tmp_path / "features", "train")
+
+    texts = pd.read_csv(train_set_file)["text"]
+    assert meta["language_models"] == [featurizer.language_model_]
+    assert np.array_equal(features, featurizer.transform(texts))
+
+
+def test_training_on_the_store_matches_training_on_the_dataset(
+    tmp_path, monkeypatch, spacy_datasets
+):
+    train_set_file, test_set_file = spacy_datasets
+    featurize(train_set_file, test_set_file, tmp_path / "features")
+    for input_file, output_file in [
+        (train_set_file, tmp_path / "from-dataset.pkl"),
+        (tmp_path / "features", tmp_path / "from-store.pkl"),
+    ]:
+        monkeypatch.setattr(sys, "argv", ["train.py", str(input_file), str(output_file)])
+        train.main()
+
+    from_dataset = load_model(tmp_path / "from-dataset.pkl")
+    from_store = load_model(tmp_path / "from-store.pkl")
+
+    texts = pd.read_csv(test_set_file)["text"]
+    assert from_store[0].get_params() == from_dataset[0].get_params()
+    assert from_store[-1].get_params() == from_dataset[-1].get_params()
+    assert language_model_references(from_store) == language_model_references(
+        from_dataset
+    )
+    probabilities = from_store.predict_proba(texts)
+    assert np.array_equal(probabilities, from_dataset.predict_proba(texts))
+    assert len(np.unique(probabilities[:, 1])) > 1
+
+
+def test_stored_test_features_must_match_the_test_set_and_model(
+    tmp_path, spacy_datasets
+):
+    train_set_file, test_set_file = spacy_datasets
+    featurize(train_set_file, test_set_file, tmp_path / "features")
+    model = make_pipeline(load_featurizer(tmp_path / "features"))
+    test_data = pd.read_csv(test_set_file)
+
+    features = stored_test_features(model, tmp_path / "features", test_data)
+
+    assert np.array_equal(features, model.transform(test_data["text"]))
+    with pytest.raises(ValueError, match="not those of the test set"):
+        stored_test_features(model, tmp_path / "features", test_data.iloc[::-1])
+    model[0].language_model_ = dict(model[0].language_model_, version="other")
+    with pytest.raises(ValueError, match="language models"):
+        stored_test_features(model, tmp_path / "features", test_data)
+
+
+def test_models_are_timed_from_text_even_with_stored_features(
+    tmp_path, spacy_datasets
+):
+    train_set_file, test_set_file = spacy_datasets
+    featurize(train_set_file, test_set_file, tmp_path / "features")
+    model = make_pipeline(load_featurizer(tmp_path / "features"), LogisticRegression())
+    train_features, train_labels = load_features(tmp_path / "features", "train")
+    model[-1].fit(train_features, train_labels)
+    test_data = pd.read_csv(test_set_file)
+    features = stored_test_features(model, tmp_path / "features", test_data)
+
+    _, from_text = measure_model(model, test_data, latency_samples=2)
+    y_prob, from_store = measure_model(
+        model, test_data, latency_samples=2, features=features
+    )
+
+    assert "classify_ms_per_tweet" not in from_text
+    assert from_store["batch_ms_per_tweet"] > 0
+    assert from_store["classify_ms_per_tweet"] > 0
+    assert np.array_equal(y_prob, model[-1].predict_proba(features))
@@ -0,0 +1,81 @@
+import collections
+
+from src.text.ngrams import NgramCounter, count_ngrams, _tweets_per_task
+from src.text.utils import create_ngrams
+
+TWEETS = [
+    "The big cat sat on the mat!",
+    "the BIG cat... sat\ton the mat",
+    "big cat, big cat",
+    "",
+    "a\x00b big cat",
+]
+
+
+def exact_counts(tweets, ngram_number):
+    return collections.Counter(
+        ngram for tweet in tweets for ngram in create_ngrams(tweet, ngram_number)
+    )
+
+
+def test_counts_are_exact_within_capacity(labeled_tweets):
+    tweets = list(labeled_tweets["text"]) + TWEETS
+    for ngram_number in (1, 2, 3):
+        expected = exact_counts(tweets, ngram_number)
+
+        counter = NgramCounter(ngram_number, capacity=1000, chunksize=3)
+        counter.update(tweets)
+
+        assert dict(counter.most_common(len(expected))) == expected
+        assert counter.total == sum(expected.values())
+        assert all(counter.count(ngram) == count for ngram, count in expected.items())
+
+
+def test_heavy_hitters_are_found_in_bounded_memory():
+    tweets = [f"rare{i} words{i} here" for i in range(500)] + ["big cat"] * 100
+
+    counter = count_ngrams(tweets, 2, capacity=20, chunksize=50)
+
+    assert len(counter.heavy_hitters.keys) == 20
+    assert len(counter.strings) == 20
+    ngram, count = counter.most_common(1)[0]
+    assert ngram == "big cat"
+    assert count == 100
+
+
+def test_counters_of_workers_merge(labeled_tweets):
+    tweets = list(labeled_tweets["text"]) + TWEETS
+    whole = NgramCounter(2).update(tweets)
+
+    merged = NgramCounter(2).update(tweets[:4]).merge(NgramCounter(2).update(tweets[4:]))
+    parallel = count_ngrams(tweets, 2, n_jobs=2, chunksize=1)
+
+    assert merged.most_common(20) == whole.most_common(20)
+    assert parallel.most_common(20) == whole.most_common(20)
+
+
+def test_parallel_counts_are_exact_over_many_chunks(labeled_tweets):
+    # More chunks than the workers are given at a time.
+    tweets = (list(labeled_tweets["text"]) + TWEETS) * 20
+    expected = exact_counts(tweets, 2)
+
+    counter = count_ngrams(tweets, 2, capacity=1000, n_jobs=2, chunksize=1)
+
+    assert dict(counter.most_common(len(expected))) == expected
+    assert counter.total == sum(expected.values())
+
+
+def test_small_corpora_are_shared_between_the_workers():
+    assert _tweets_per_task(["a tweet"] * 1000, n_jobs=4, chunksize=10000) == 250
+    assert _tweets_per_task(["a tweet"] * 10**6, n_jobs=4, chunksize=100) == 1600
+    assert _tweets_per_task(iter(["a tweet"] * 1000), n_jobs=4, chunksize=10) == 160
+    assert _tweets_per_task([], n_jobs=4, chunksize=10) == 1
+
+
+def test_parallel_counts_are_exact_whatever_the_tweets_per_task(labeled_tweets):
+    tweets = list(labeled_tweets["text"]) + TWEETS
+    expected = exact_counts(tweets, 2)
+
+    counter = count_ngrams(tweets, 2, capacity=1000, n_jobs=2, tweets_per_task=3)
+
+    assert dict(counter.most_common(len(expected))) == expected
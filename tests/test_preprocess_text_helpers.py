@@ -1,8 +1,18 @@
+import pandas as pd
+
 from src.text.utils import (
+    clean_tweet,
+    clean_tweet_batch,
     contractions_unpacker,
     tokenizer,
     punctuation_cleaner,
     lowercase,
+    remove_stopwords,
+    get_social_tokenizer,
+    contractions_unpacker_batch,
+    punctuation_cleaner_batch,
+    lowercase_batch,
+    _process_wide,
 )
 
 
@@ -19,6 +29,16 @@ def test_contraction_unpack_case_agnostic():
     assert contractions_unpacker("I'm") == "I am"
 
 
+def test_contraction_unpack_prefers_longest_contraction():
+    assert contractions_unpacker("I can't've") == "I cannot have"
+    assert contractions_unpacker("Y'all'd've known") == "you all would have known"
+
+
+def test_contraction_unpack_matches_whole_words_only():
+    assert contractions_unpacker("Cantwell isn't here") == "Cantwell is not here"
+    assert contractions_unpacker("shell's edge") == "shell's edge"
+
+
 def test_social_tokenizer():
     tweet1 = "@badwhore Sunday,paul :)tweet? :) whore...?"
     tweet2 = "LIKE 14:40@Reni__Rinse who's f****N"
@@ -46,3 +66,52 @@ def test_punctuation_cleaner_removes_colon():
 
 def test_lowercase():
     assert lowercase("LIKEWISE 14:40 @Reni__Rinse") == "likewise 14:40 @reni__rinse"
+
+
+def test_remove_stopwords():
+    assert remove_stopwords("she said that you are my hero") == "said hero"
+
+
+def test_social_tokenizer_is_shared():
+    assert get_social_tokenizer() is get_social_tokenizer()
+
+
+def test_process_wide_factories_can_use_other_resources():
+    inner = _process_wide(lambda: "inner")
+    outer = _process_wide(lambda: inner() + " in outer")
+
+    assert outer() == "inner in outer"
+    assert outer() is outer()
+
+
+def test_batch_helpers_match_single_tweet_helpers():
+    tweets = pd.Series(["I'm OK :) .", "  Sunday ,paul  ", "", "who ' s\x00 it'll"])
+
+    assert list(contractions_unpacker_batch(tweets)) == [
+        contractions_unpacker(tweet) for tweet in tweets
+    ]
+    assert list(punctuation_cleaner_batch(tweets)) == [
+        punctuation_cleaner(tweet) for tweet in tweets
+    ]
+    assert list(lowercase_batch(tweets)) == [lowercase(tweet) for tweet in tweets]
+
+
+def chained_clean(tweet):
+    tweet = tokenizer(contractions_unpacker(tweet))
+    return lowercase(remove_stopwords(punctuation_cleaner(tweet)))
+
+
+def test_clean_tweet_matches_chained_processors(labeled_tweets):
+    tweets = list(labeled_tweets["text"]) + [
+        "",
+        "The end !! :) ... .hi , 'quoted' C'mon",
+        "I can't've GONE\tto the  PARK.\nOK ?",
+        "İstanbul 'S o'clock ! . : , '",
+    ]
+
+    assert [clean_tweet(tweet) for tweet in tweets] == [
+        chained_clean(tweet) for tweet in tweets
+    ]
+    assert list(clean_tweet_batch(pd.Series(tweets))) == [
+        chained_clean(tweet) for tweet in tweets
+    ]
@@ -1,4 +1,12 @@
-from src.text.pipelines import clean, normalize, tokenize
+import cProfile
+import sys
+import types
+
+import pytest
+
+from src.text import profiling
+from src.text.pipelines import clean, normalize, tokenize, get_pipeline
+from src.text.profiling import ProfileReport, profiler
 
 
 def test_normalize(labeled_tweets):
@@ -65,3 +73,126 @@ def test_tokenize(labeled_tweets):
         "#feminazi #gamergate & @momsagainstwwe "
         "#paranoidparent http://t.câ€¦"
     )
+
+
+def test_get_pipeline_returns_shared_instance():
+    assert get_pipeline("clean") is get_pipeline("clean")
+    assert get_pipeline("clean") is not get_pipeline("tokenize")
+
+
+def test_get_pipeline_rejects_unknown_name():
+    with pytest.raises(ValueError):
+        get_pipeline("stem")
+
+
+@pytest.mark.parametrize("name", ["clean", "tokenize"])
+def test_process_batch_matches_process_text(labeled_tweets, name):
+    pipeline = get_pipeline(name)
+    texts = labeled_tweets["text"]
+
+    processed = pipeline.process_batch(texts)
+
+    assert list(processed.index) == list(texts.index)
+    assert list(processed) == [pipeline.process_text(text) for text in texts]
+
+
+def test_process_batch_accepts_any_iterable():
+    processed = get_pipeline("tokenize").process_batch(iter(["I'm HERE", "  A\tb "]))
+
+    assert list(processed) == ["i am here", "a b"]
+
+
+@pytest.mark.parametrize("n_jobs", [2, -1])
+def test_process_batch_in_parallel_matches_serial(labeled_tweets, n_jobs):
+    pipeline = get_pipeline("clean")
+    texts = labeled_tweets["text"].sample(frac=1, random_state=0)
+
+    processed = pipeline.process_batch(texts, n_jobs=n_jobs, chunksize=1)
+
+    assert processed.equals(pipeline.process_batch(texts))
+
+
+def test_clean_in_parallel(labeled_tweets):
+    expected = clean(labeled_tweets.copy())["cleaned"]
+
+    assert clean(labeled_tweets, n_jobs=2)["cleaned"].equals(expected)
+
+
+def test_process_batch_rejects_invalid_n_jobs():
+    with pytest.raises(ValueError):
+        get_pipeline("clean").process_batch(["a", "b"], n_jobs=0)
+
+
+@pytest.mark.parametrize("n_jobs", [1, 2])
+def test_process_batch_reports_each_processor(labeled_tweets, n_jobs):
+    pipeline = get_pipeline("tokenize")
+    texts = labeled_tweets["text"]
+    report = ProfileReport()
+
+    processed = pipeline.process_batch(texts, n_jobs=n_jobs, chunksize=2, report=report)
+
+    assert processed.equals(pipeline.process_batch(texts))
+    assert list(report.processors) == [
+        "contractions_unpacker",
+        "tokenizer",
+        "lowercase",
+    ]
+    contractions = report.processors["contractions_unpacker"]
+    assert contractions.texts == len(texts)
+    assert contractions.characters == texts.str.len().sum()
+    assert all(stats.seconds >= 0 for stats in report.processors.values())
+
+
+def test_profiled_runs_time_each_stage_of_fused_processors(labeled_tweets):
+    pipeline = get_pipeline("clean")
+    texts = labeled_tweets["text"]
+    report = ProfileReport()
+
+    processed = pipeline.process_batch(texts, report=report)
+
+    assert processed.equals(pipeline.process_batch(texts))
+    assert list(report.processors) == [
+        "contractions_unpacker",
+        "tokenizer",
+        "punctuation_cleaner",
+        "remove_stopwords",
+        "lowercase",
+    ]
+
+
+def test_process_text_reports_each_processor():
+    pipeline = get_pipeline("tokenize")
+    report = ProfileReport()
+
+    for _ in range(3):
+        processed = pipeline.process_text("I'm HERE", report=report)
+
+    assert processed == pipeline.process_text("I'm HERE")
+    stats = report.processors["contractions_unpacker"]
+    assert (stats.calls, stats.texts, stats.characters) == (3, 3, 24)
+    assert "tokenizer" in str(report)
+
+
+def test_profiler_prefers_pyinstrument_when_installed(monkeypatch):
+    class Profiler:
+        def start(self):
+            pass
+
+        def stop(self):
+            pass
+
+        def output_text(self, unicode):
+            return "pyinstrument report"
+
+    monkeypatch.setattr(profiling, "_pyinstrument_installed", lambda: False)
+    with profiler() as profile:
+        pass
+    assert isinstance(profile, cProfile.Profile)
+
+    monkeypatch.setattr(profiling, "_pyinstrument_installed", lambda: True)
+    monkeypatch.setitem(
+        sys.modules, "pyinstrument", types.SimpleNamespace(Profiler=Profiler)
+    )
+    with profiler() as profile:
+        pass
+    assert isinstance(profile, Profiler)
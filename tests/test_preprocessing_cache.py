@@ -0,0 +1,59 @@
+import pandas as pd
+
+from src.text.cache import PreprocessingCache
+from src.text.pipelines import TextPreProcessingPipeline, get_pipeline
+
+
+def test_process_batch_only_processes_texts_not_cached(tmp_path, labeled_tweets):
+    pipeline = get_pipeline("clean")
+    texts = labeled_tweets["text"]
+    expected = pipeline.process_batch(texts)
+
+    with PreprocessingCache(tmp_path / "cache.sqlite") as cache:
+        first = pipeline.process_batch(texts.iloc[:2], cache=cache)
+        second = pipeline.process_batch(texts, cache=cache)
+
+        assert first.equals(expected.iloc[:2])
+        assert second.equals(expected)
+        assert (cache.stats.hits, cache.stats.misses) == (2, len(texts))
+        assert len(cache) == len(texts)
+
+
+def test_cache_persists_between_runs(tmp_path):
+    pipeline = get_pipeline("tokenize")
+    texts = pd.Series(["I'm HERE", "You ARE"], index=[5, 7])
+    with PreprocessingCache(tmp_path / "cache.sqlite") as cache:
+        pipeline.process_batch(texts, cache=cache)
+
+    with PreprocessingCache(tmp_path / "cache.sqlite") as cache:
+        processed = pipeline.process_batch(texts, cache=cache)
+
+        assert cache.stats.hit_rate == 1.0
+    assert list(processed.index) == [5, 7]
+    assert list(processed) == ["i am here", "you are"]
+
+
+def test_pipelines_do_not_share_entries(tmp_path):
+    upper = TextPreProcessingPipeline()
+    upper.register_processor(str.upper)
+    lower = TextPreProcessingPipeline()
+    lower.register_processor(str.lower)
+    texts = pd.Series(["Mixed Case"])
+
+    with PreprocessingCache(tmp_path / "cache.sqlite") as cache:
+        assert list(upper.process_batch(texts, cache=cache)) == ["MIXED CASE"]
+        assert list(lower.process_batch(texts, cache=cache)) == ["mixed case"]
+        assert upper.fingerprint() != lower.fingerprint()
+
+
+def test_collect_garbage_removes_entries_of_removed_rows(tmp_path):
+    pipeline = get_pipeline("tokenize")
+    with PreprocessingCache(tmp_path / "cache.sqlite") as cache:
+        pipeline.process_batch(pd.Series(["kept", "removed"]), cache=cache)
+        cache.put_many("outdated", ["kept"], ["KEPT"])
+
+        removed = cache.collect_garbage(["kept"], [pipeline.fingerprint()])
+
+        assert removed == 2
+        assert cache.pipelines() == {pipeline.fingerprint(): 1}
+        assert cache.stats.evictions == 2
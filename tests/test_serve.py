@@ -0,0 +1,136 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from src.serve import HTTPError, InferenceServer, MicroBatcher, _parse_texts
+
+
+async def send(port, request):
+    """Returns the status and body of the response to a raw request."""
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(request)
+    response = await reader.read()
+    writer.close()
+    head, _, body = response.partition(b"\r\n\r\n")
+    return int(head.split()[1]), body
+
+
+class LengthModel:
+    """Stands for a pipeline, remembering the batches it predicted."""
+
+    def __init__(self):
+        self.batches = []
+
+    def predict_proba(self, texts):
+        self.batches.append(list(texts))
+        positive = np.array([len(text) / 100 for text in texts])
+        return np.column_stack([1 - positive, positive])
+
+
+def test_micro_batcher_predicts_concurrent_requests_together():
+    model = LengthModel()
+
+    async def predict_concurrently():
+        batcher = MicroBatcher(model, max_batch_size=64, max_wait=0.05)
+        batcher.start()
+        results = await asyncio.gather(
+            batcher.predict(["a"]), batcher.predict(["bb", "ccc"]), batcher.predict([""])
+        )
+        await batcher.stop()
+        return results
+
+    results = asyncio.run(predict_concurrently())
+
+    assert model.batches == [["a", "bb", "ccc", ""]]
+    assert [list(result) for result in results] == [[0.01], [0.02, 0.03], [0.0]]
+
+
+def test_micro_batcher_closes_full_batches():
+    model = LengthModel()
+
+    async def predict_concurrently():
+        batcher = MicroBatcher(model, max_batch_size=2, max_wait=0.05)
+        batcher.start()
+        await asyncio.gather(*(batcher.predict([text]) for text in "abcde"))
+        await batcher.stop()
+
+    asyncio.run(predict_concurrently())
+
+    assert [len(batch) for batch in model.batches] == [2, 2, 1]
+
+
+def test_server_answers_single_and_batched_predictions():
+    async def query():
+        server = InferenceServer(LengthModel(), max_wait=0.001)
+        await server.start(port=0)
+        port = server._server.sockets[0].getsockname()[1]
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        responses = []
+        for body in [b'{"text": "abcd"}', b'{"texts": ["a", "ab"]}', b"[]"]:
+            writer.write(
+                b"POST /predict HTTP/1.1\r\nContent-Length: %d\r\n\r\n%s"
+                % (len(body), body)
+            )
+            status = (await reader.readline()).split()[1]
+            headers = await reader.readuntil(b"\r\n\r\n")
+            length = int(headers.split(b"Content-Length: ")[1].split(b"\r\n")[0])
+            responses.append((int(status), await reader.readexactly(length)))
+        writer.close()
+        metrics = server.metrics()
+        await server.stop()
+        return responses, metrics
+
+    responses, metrics = asyncio.run(query())
+
+    assert responses[0] == (200, b'{"probability": 0.04}')
+    assert responses[1] == (200, b'{"probabilities": [0.01, 0.02]}')
+    assert responses[2][0] == 400
+    assert metrics["requests"] == 3
+    assert metrics["errors"] == 1
+    assert metrics["tweets"] == 3
+
+
+def test_parse_texts_rejects_invalid_bodies():
+    assert _parse_texts(b'{"texts": ["a", "b"]}') == (["a", "b"], False)
+    for body in [b"not json", b'{"texts": []}', b'{"texts": [1]}', b'{"txt": "a"}']:
+        with pytest.raises(HTTPError):
+            _parse_texts(body)
+
+
+def test_server_rejects_invalid_content_lengths():
+    async def query():
+        server = InferenceServer(LengthModel(), max_wait=0.001)
+        await server.start(port=0)
+        port = server._server.sockets[0].getsockname()[1]
+        responses = [
+            await send(
+                port, b"POST /predict HTTP/1.1\r\nContent-Length: %s\r\n\r\n{}" % length
+            )
+            for length in [b"abc", b"-1", b"1.5", b"\xb2"]
+        ]
+        await server.stop()
+        return responses
+
+    responses = asyncio.run(query())
+
+    assert [status for status, _ in responses] == [400] * 4
+    assert all(b"Content-Length" in body for _, body in responses)
+
+
+def test_server_rejects_lines_over_the_stream_limit():
+    async def query():
+        server = InferenceServer(LengthModel(), max_wait=0.001)
+        await server.start(port=0)
+        port = server._server.sockets[0].getsockname()[1]
+        long_path = b"/predict?" + b"a" * 2 ** 17
+        responses = [
+            await send(port, b"POST %s HTTP/1.1\r\n\r\n" % long_path),
+            await send(port, b"GET /health HTTP/1.1\r\nX: %s\r\n\r\n" % long_path),
+        ]
+        await server.stop()
+        return responses
+
+    responses = asyncio.run(query())
+
+    assert [status for status, _ in responses] == [431, 431]
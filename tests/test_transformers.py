@@ -0,0 +1,118 @@
+import pickle
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from sklearn.linear_model import LogisticRegression
+from sklearn.pipeline import make_pipeline
+
+from src.transformers import HashingTextTransformer, SpacyTransformer
+
+
+def test_hashing_features_are_sparse_and_normalized(labeled_tweets):
+    transformer = HashingTextTransformer(n_features=2 ** 10)
+
+    features = transformer.fit(labeled_tweets["text"]).transform(
+        labeled_tweets["text"]
+    )
+
+    assert sp.isspmatrix_csr(features)
+    assert features.shape == (len(labeled_tweets), 2 ** 11)
+    assert np.allclose(features.multiply(features).sum(axis=1), 1)
+
+
+def test_small_and_large_batches_get_the_same_features(labeled_tweets):
+    texts = pd.Series(list(labeled_tweets["text"]) * 10)
+    transformer = HashingTextTransformer().fit(texts)
+
+    batch = transformer.transform(texts)
+    single = sp.vstack([transformer.transform(texts.iloc[[row]]) for row in range(4)])
+
+    assert abs(batch[:4] - single).max() < 1e-6
+
+
+def test_partial_fit_matches_fit(labeled_tweets):
+    texts = labeled_tweets["text"]
+    fitted = HashingTextTransformer(preprocessing=None).fit(texts)
+
+    partially_fitted = HashingTextTransformer(preprocessing=None)
+    partially_fitted.partial_fit(texts.iloc[:2]).partial_fit(texts.iloc[2:])
+
+    assert partially_fitted.n_documents_ == len(texts)
+    assert np.array_equal(partially_fitted.idf_, fitted.idf_)
+
+
+def test_fit_transform_counts_the_texts_once(labeled_tweets, monkeypatch):
+    texts = labeled_tweets["text"]
+    expected = HashingTextTransformer().fit(texts).transform(texts)
+    transformer = HashingTextTransformer()
+    counts = transformer._counts
+    calls = []
+    monkeypatch.setattr(transformer, "_counts", lambda X: calls.append(X) or counts(X))
+
+    features = transformer.fit_transform(texts)
+
+    assert len(calls) == 1
+    assert abs(features - expected).max() == 0
+    assert transformer.n_documents_ == len(texts)
+
+
+def test_linear_model_on_hashed_ngrams_pickles(labeled_tweets):
+    model = make_pipeline(
+        HashingTextTransformer(char_ngram_range=None), LogisticRegression()
+    ).fit(labeled_tweets["text"], labeled_tweets["label"])
+
+    loaded = pickle.loads(pickle.dumps(model))
+
+    assert np.allclose(
+        loaded.predict_proba(labeled_tweets["text"]),
+        model.predict_proba(labeled_tweets["text"]),
+    )
+
+
+def test_cache_keeps_the_texts_found_by_the_previous_transform(
+    tmp_path, language_model
+):
+    texts = ["the women", "a game", "lovely friends"]
+    transformer = SpacyTransformer(
+        model_name=language_model, cache_dir=str(tmp_path / "cache"), cache_size=3
+    ).fit(texts, None)
+    transformer.transform(texts)
+    transformer.transform(["the women", "a game"])
+
+    # Evicts all but the two most recently used texts.
+    transformer.transform(["great kitchen"])
+    transformer.transform(["lovely friends"])
+
+    assert transformer.cache_stats_.hits == 0
+
+
+def test_disabled_components_and_batch_size_keep_the_features(language_model):
+    texts = ["the women kitchen", "a great game @user", "lovely friends!", ""]
+    disabled, full_pipeline, small_batches = (
+        SpacyTransformer(model_name=language_model, **params).fit(texts, None)
+        for params in [
+            dict(disable=("sentencizer",)),
+            dict(disable=()),
+            dict(disable=("sentencizer",), batch_size=2),
+        ]
+    )
+
+    expected = disabled.transform(texts)
+
+    assert "sentencizer" not in disabled.nlp_.pipe_names
+    assert "sentencizer" in full_pipeline.nlp_.pipe_names
+    assert np.any(expected)
+    assert np.array_equal(full_pipeline.transform(texts), expected)
+    assert np.array_equal(small_batches.transform(texts), expected)
+
+
+def test_fast_vectors_are_averaged_batch_by_batch(language_model):
+    texts = ["the women kitchen", "", "a great game @user", "lovely friends!", "a"]
+    spacy_vectors = SpacyTransformer(model_name=language_model).fit(texts, None)
+    fast = SpacyTransformer(model_name=language_model, fast_vectors=True, batch_size=2)
+
+    features = fast.fit(texts, None).transform(texts)
+
+    assert features.dtype == np.float32
+    assert np.array_equal(features, spacy_vectors.transform(texts))
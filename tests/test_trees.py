@@ -0,0 +1,82 @@
+import numpy as np
+import pytest
+from sklearn.base import clone
+from sklearn.experimental import enable_hist_gradient_boosting  # noqa
+from sklearn.ensemble import HistGradientBoostingClassifier
+from sklearn.linear_model import LogisticRegression
+from sklearn.pipeline import make_pipeline
+from sklearn.preprocessing import StandardScaler
+
+from src.trees import FlatTreeClassifier, flatten_pipeline
+
+
+@pytest.fixture
+def classification():
+    random = np.random.RandomState(0)
+    features = random.normal(size=(300, 4))
+    labels = np.where(features[:, 0] + features[:, 1] ** 2 > 0.5, "yes", "no")
+    return features, labels
+
+
+def test_flat_trees_predict_identical_probabilities(classification):
+    features, labels = classification
+    features[np.random.RandomState(1).rand(*features.shape) < 0.1] = np.nan
+    classifier = HistGradientBoostingClassifier(max_iter=20).fit(features, labels)
+
+    flat = FlatTreeClassifier.from_classifier(classifier)
+
+    assert np.array_equal(
+        flat.predict_proba(features), classifier.predict_proba(features)
+    )
+    assert np.array_equal(
+        flat.predict_proba(features[7:8]), classifier.predict_proba(features[7:8])
+    )
+    assert list(flat.predict(features)) == list(classifier.predict(features))
+
+
+def test_flatten_pipeline_replaces_the_classifier(classification):
+    features, labels = classification
+    pipeline = make_pipeline(
+        StandardScaler(), HistGradientBoostingClassifier(max_iter=5)
+    ).fit(features, labels)
+    linear = make_pipeline(LogisticRegression()).fit(features, labels)
+
+    flattened = flatten_pipeline(pipeline)
+
+    assert isinstance(flattened[-1], FlatTreeClassifier)
+    assert isinstance(pipeline[-1], HistGradientBoostingClassifier)
+    assert np.array_equal(
+        flattened.predict_proba(features), pipeline.predict_proba(features)
+    )
+    assert flatten_pipeline(linear) is linear
+
+
+def test_flat_trees_are_built_from_a_classifier_not_fitted(classification):
+    features, labels = classification
+    classifier = HistGradientBoostingClassifier(max_iter=5).fit(features, labels)
+    flat = FlatTreeClassifier.from_classifier(classifier)
+
+    copied = clone(flat)
+
+    assert sorted(vars(copied)) == ["classes", "classifier", "max_rows", "trees"]
+    assert np.array_equal(copied.predict_proba(features), flat.predict_proba(features))
+    with pytest.raises(TypeError, match="from_classifier"):
+        copied.fit(features, labels)
+
+
+def test_large_batches_are_left_to_the_classifier(classification):
+    features, labels = classification
+    pipeline = make_pipeline(HistGradientBoostingClassifier(max_iter=5)).fit(
+        features, labels
+    )
+    flat = FlatTreeClassifier.from_classifier(pipeline[-1])
+    flat.set_params(classifier=pipeline[-1], max_rows=8)
+
+    flattened = flatten_pipeline(pipeline, measure=True)
+
+    assert isinstance(flattened[-1], FlatTreeClassifier)
+    for rows in (features[:8], features):
+        assert np.array_equal(flat.predict_proba(rows), pipeline.predict_proba(rows))
+        assert np.array_equal(
+            flattened.predict_proba(rows), pipeline.predict_proba(rows)
+        )
@@ -0,0 +1,72 @@
+import numpy as np
+
+from src import tune
+from src.tune import (
+    best_candidate,
+    default_worker_memory_mb,
+    sample_candidates,
+    successive_halving,
+)
+
+
+def write_features(directory):
+    random = np.random.RandomState(0)
+    labels = random.randint(2, size=600)
+    features = random.normal(size=(600, 4)) + labels[:, None]
+    np.save(directory / "features.npy", features.astype(np.float32))
+    np.save(directory / "labels.npy", labels)
+
+
+def test_successive_halving_keeps_the_best_candidates(tmp_path):
+    write_features(tmp_path)
+    candidates = [
+        dict(params, max_iter=10) for params in sample_candidates(4, random_state=0)
+    ]
+
+    trials = successive_halving(
+        tmp_path, candidates, factor=2, min_samples=150, n_splits=2, n_workers=2
+    )
+    best = best_candidate(trials, candidates)
+
+    assert list(trials.groupby("rung")["n_samples"].first()) == [150, 300, 600]
+    assert list(trials.groupby("rung")["candidate"].nunique()) == [4, 2, 1]
+    assert (trials["fit_time_s"] > 0).all()
+    assert best["params"] == candidates[trials["candidate"].iloc[-1]]
+    assert best["n_samples"] == 600
+    assert 0.5 < best["auc"] <= 1
+    assert trials["error"].isna().all()
+
+
+def test_failed_fits_are_recorded_and_ranked_last(tmp_path):
+    write_features(tmp_path)
+    candidates = [
+        dict(params, max_iter=10) for params in sample_candidates(3, random_state=0)
+    ]
+    candidates[0]["max_iter"] = -1
+
+    trials = successive_halving(
+        tmp_path, candidates, factor=2, min_samples=300, n_splits=2, n_workers=1
+    )
+
+    first_rung = trials[trials["rung"] == 0].set_index(["candidate", "fold"])
+    assert first_rung.loc[0, "auc"].isna().all()
+    assert first_rung.loc[0, "error"].str.contains("max_iter").all()
+    assert first_rung.loc[[1, 2], "error"].isna().all()
+    assert 0 not in set(trials[trials["rung"] == 1]["candidate"])
+    assert best_candidate(trials, candidates)["params"] != candidates[0]
+
+
+def test_fitted_rows_are_gathered_as_float64(monkeypatch):
+    features = np.arange(20, dtype=np.float32).reshape(10, 2)
+    monkeypatch.setattr(tune, "_features", features)
+    monkeypatch.setattr(tune, "_GATHER_ROWS", 3)
+    rows = np.array([9, 0, 4, 4, 7])
+
+    gathered = tune._gather_rows(rows)
+
+    assert gathered.dtype == np.float64
+    assert np.array_equal(gathered, features[rows])
+
+
+def test_workers_share_the_memory_by_default():
+    assert 0 < 4 * default_worker_memory_mb(4) <= default_worker_memory_mb(1)
@@ -0,0 +1,97 @@
+import numpy as np
+
+from src.vectors import VectorTable, mean_rows
+
+
+def make_table():
+    # Keys 10 and 30 share a vector, as words do in spaCy vector tables.
+    data = np.array([[1.0, 2.0], [3.0, 5.0]], dtype=np.float32)
+    return VectorTable(np.array([30, 10, 20]), np.array([0, 0, 1]), data)
+
+
+def test_rows_of_maps_unknown_keys_to_zero_vector():
+    table = make_table()
+
+    rows = table.rows_of(np.array([10, 20, 99, 30]))
+
+    assert list(rows) == [0, 1, table.oov_row, 0]
+    assert not table.data[table.oov_row].any()
+
+
+def test_mean_vectors_averages_tokens_of_each_document():
+    table = make_table()
+    keys = np.array([10, 20, 99, 20])
+    lengths = np.array([3, 0, 1])
+
+    vectors = table.mean_vectors(keys, lengths)
+
+    expected = np.array([[4.0 / 3, 7.0 / 3], [0.0, 0.0], [3.0, 5.0]])
+    assert vectors.dtype == np.float32
+    assert np.allclose(vectors, expected)
+
+
+def test_mean_vectors_of_empty_documents():
+    vectors = make_table().mean_vectors(np.array([], dtype=np.uint64), [0, 0])
+
+    assert vectors.shape == (2, 2)
+    assert not vectors.any()
+
+
+def test_mean_rows_sums_tokens_in_order():
+    random = np.random.RandomState(0)
+    data = random.normal(size=(50, 300)).astype(np.float32)
+    rows = random.randint(50, size=60)
+    lengths = np.array([17, 0, 43])
+
+    vectors = mean_rows(data, rows, lengths)
+
+    assert np.array_equal(vectors[0], sum(data[row] for row in rows[:17]) / 17)
+    assert not vectors[1].any()
+    assert np.array_equal(vectors[2], sum(data[row] for row in rows[17:]) / 43)
+    assert np.array_equal(mean_rows(data, rows[:17], [17]), vectors[:1])
+
+
+def test_prune_keeps_words_and_maps_others_to_nearest_vector():
+    data = np.array([[1.0, 0.0], [0.0, 1.0], [0.9, 0.1]], dtype=np.float32)
+    table = VectorTable(np.array([10, 20, 30, 40]), np.array([0, 1, 2, 0]), data)
+
+    pruned = table.prune(np.array([10, 20, 99]))
+    without_fallback = table.prune(np.array([10, 20]), fallback=False)
+
+    assert pruned.oov_row == 2
+    rows = pruned.rows_of(np.array([10, 20, 30, 40, 99]))
+    assert np.array_equal(pruned.data[rows[:4]], data[[0, 1, 0, 0]])
+    assert rows[4] == pruned.oov_row
+    assert list(without_fallback.rows_of(np.array([30]))) == [without_fallback.oov_row]
+    assert np.array_equal(without_fallback.rows_of(np.array([40])), rows[[3]])
+
+
+def test_quantize_stores_smaller_vectors_close_to_originals():
+    random = np.random.RandomState(0)
+    data = random.normal(size=(20, 16)).astype(np.float32)
+    table = VectorTable(np.arange(20), np.arange(20), data)
+
+    for quantization, tolerance in [("float16", 1e-3), ("int8", 2e-2)]:
+        quantized = table.quantize(quantization)
+
+        assert quantized.quantization == quantization
+        assert quantized.nbytes < table.nbytes
+        vectors = quantized.vectors(np.arange(20))
+        assert np.abs(vectors - data).max() < tolerance * np.abs(data).max()
+        assert np.allclose(
+            quantized.mean_vectors(np.array([3, 5]), [2]), vectors[[3, 5]].mean(axis=0)
+        )
+
+
+def test_saved_table_is_loaded_memory_mapped(tmp_path):
+    table = make_table().quantize("int8")
+
+    table.save(tmp_path / "vectors", lang="en")
+    loaded = VectorTable.load(tmp_path / "vectors")
+
+    assert isinstance(loaded.data.base, np.memmap)
+    assert loaded.checksum() == table.checksum()
+    keys = np.array([10, 20, 99])
+    assert np.array_equal(
+        loaded.mean_vectors(keys, [2, 1]), table.mean_vectors(keys, [2, 1])
+    )